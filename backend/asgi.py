@@ -0,0 +1,70 @@
+import json
+
+from serving import BIND, THREADS, WORKERS, load_app, warm_app
+from database.aio import AsyncDatabase
+from database.connection import get_pool
+
+# ASGI entry point: python asgi.py, or uvicorn asgi:application --workers 4
+#
+# The event loop holds idle and slow connections cheaply; the Flask routes run on a
+# bounded pool of WEB_THREADS threads, and /healthz is answered natively through the
+# async data layer without occupying one of them.
+
+app = load_app()
+db = AsyncDatabase(get_pool(app), max_workers=2)
+
+
+def _wsgi_adapter(wsgi_app):
+    try:
+        from a2wsgi import WSGIMiddleware  # Preferred: bounded thread pool, streams bodies
+        return WSGIMiddleware(wsgi_app, workers=THREADS)
+    except ImportError:
+        from asgiref.wsgi import WsgiToAsgi  # Either a2wsgi or asgiref is needed for ASGI mode
+        return WsgiToAsgi(wsgi_app)
+
+
+flask_app = _wsgi_adapter(app)
+
+
+async def _healthz(send):
+    try:
+        await db.fetchone('SELECT 1')
+        status, body = 200, {"status": "ok"}
+    except Exception as e:
+        status, body = 503, {"status": "error", "error": str(e)}
+
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'cache-control', b'no-store')]
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            warm_app(app)  # Before the server accepts connections (PREWARM=true)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            db.close()
+            get_pool(app).close_all()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+    elif scope['type'] == 'http' and scope['path'] == '/healthz':
+        await _healthz(send)
+    else:
+        await flask_app(scope, receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    host, _, port = BIND.rpartition(':')
+    uvicorn.run('asgi:application', host=host or '0.0.0.0', port=int(port), workers=WORKERS)
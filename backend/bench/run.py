@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from bench.seed import BENCH_PASSWORD, SCALES, scale_sizes, seed
+
+# Drives the real routes through the Flask test client and a multi-threaded HTTP load
+# generator, and writes latency percentiles, throughput and SQLite query counts as JSON.
+# The app runs with METRICS_ENABLED so each response reports its query count.
+#
+#   python -m bench.run --scale 100k --output bench-100k.json
+#   python -m bench.run --scale 100k --baseline bench-100k.json --threshold 0.2
+
+# Query counts come from the Server-Timing header added by the SQL instrumentation
+SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def query_count(headers):
+    match = SERVER_TIMING_QUERIES.search(headers.get('Server-Timing') or '')
+    return int(match.group(1)) if match else 0
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed, queries=None):
+    summary = {
+        "requests": len(latencies),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+    if queries is not None:
+        summary["queries_per_request"] = round(statistics.mean(queries), 2)
+    return summary
+
+
+def build_app(db_path, cache):
+    from index import create_app
+
+    return create_app({
+        'DATABASE': db_path,
+        'CACHE_BACKEND': 'memory' if cache else 'none',
+        'METRICS_ENABLED': True,
+        'RATE_LIMIT_BACKEND': 'none',  # The login phase measures hashing, not the limiter
+    })
+
+
+def endpoints(titles, post_ids, rng):
+    # (name, method, path factory, json body factory)
+    return [
+        ('login', 'POST', lambda: '/user/login', lambda: {'username': 'bench0', 'password': BENCH_PASSWORD}),
+        ('feed', 'GET', lambda: '/posts/all', None),
+        ('post_detail', 'GET', lambda: f'/posts/{rng.choice(titles)}', None),
+        ('review', 'PUT', lambda: f'/posts/review/{rng.choice(post_ids)}',
+         lambda: {'rating': rng.randint(1, 5), 'content': 'bench'}),
+        ('profile', 'GET', lambda: '/user/profile', None),
+    ]
+
+
+def run_client(app, token, targets, requests):
+    client = app.test_client()
+    client.set_cookie('authCookie', token)
+    results = {}
+
+    for name, method, path, body in targets:
+        latencies, queries = [], []
+        started = time.perf_counter()
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            response = client.open(path(), method=method, json=body() if body else None)
+            latencies.append(time.perf_counter() - t0)
+            queries.append(query_count(response.headers))
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name}: {response.status_code} {response.get_data(as_text=True)[:200]}")
+        results[name] = summarize(latencies, time.perf_counter() - started, queries)
+
+    return results
+
+
+def run_http(app, token, targets, requests, concurrency):
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    results = {}
+
+    try:
+        for name, method, path, body in targets:
+            def one(_):
+                data = json.dumps(body()).encode() if body else None
+                request = urllib.request.Request(base + urllib.request.quote(path()), data=data, method=method)
+                request.add_header('Cookie', f'authCookie={token}')
+                if data is not None:
+                    request.add_header('Content-Type', 'application/json')
+                t0 = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(request) as response:
+                        response.read()
+                        headers = response.headers
+                    ok = True
+                except urllib.error.HTTPError as e:
+                    headers = e.headers
+                    ok = False
+                return time.perf_counter() - t0, ok, query_count(headers)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as executor:
+                samples = list(executor.map(one, range(requests)))
+            elapsed = time.perf_counter() - started
+
+            results[name] = summarize(
+                [latency for latency, _, _ in samples], elapsed, [queries for _, _, queries in samples]
+            )
+            results[name]["errors"] = sum(1 for _, ok, _ in samples if not ok)
+    finally:
+        server.shutdown()
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    # Returns human-readable regressions: p95 slower or throughput lower by more than threshold
+    regressions = []
+    for phase in ('client', 'http'):
+        for name, current in results.get(phase, {}).items():
+            previous = baseline.get(phase, {}).get(name)
+            if not previous:
+                continue
+            if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+                regressions.append(f"{phase}/{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+            if previous.get('rps') and current['rps'] < previous['rps'] * (1 - threshold):
+                regressions.append(f"{phase}/{name}: rps {previous['rps']} -> {current['rps']}")
+            if current.get('queries_per_request', 0) > previous.get('queries_per_request', float('inf')):
+                regressions.append(
+                    f"{phase}/{name}: queries {previous['queries_per_request']} -> {current['queries_per_request']}"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backend routes.")
+    parser.add_argument('--db', default='database/bench.db')
+    parser.add_argument('--scale', choices=SCALES, default='1k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reseed', action='store_true', help="Recreate the database even if it exists.")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint and phase.")
+    parser.add_argument('--concurrency', type=int, default=16, help="HTTP load generator threads.")
+    parser.add_argument('--no-http', action='store_true', help="Only run the test-client phase.")
+    parser.add_argument('--cache', action='store_true', help="Keep the response cache enabled.")
+    parser.add_argument('--output', help="Write results as JSON to this file.")
+    parser.add_argument('--baseline', help="Compare against a previous results file.")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed relative regression.")
+    args = parser.parse_args()
+
+    if args.reseed or not os.path.exists(args.db):
+        seed(args.db, args.scale, args.seed)
+
+    app = build_app(args.db, args.cache)
+    conn = sqlite3.connect(args.db)
+    titles = [row[0] for row in conn.execute('SELECT title FROM posts ORDER BY random() LIMIT 1000')]
+    post_ids = [row[0] for row in conn.execute('SELECT id FROM posts ORDER BY random() LIMIT 1000')]
+    conn.close()
+
+    client = app.test_client()
+    login = client.post('/user/login', json={'username': 'bench0', 'password': BENCH_PASSWORD})
+    token = login.get_json()['token']
+
+    rng = random.Random(args.seed)
+    targets = endpoints(titles, post_ids, rng)
+    users, posts, reviews = scale_sizes(SCALES[args.scale])
+    results = {
+        "meta": {
+            "scale": args.scale,
+            "users": users,
+            "posts": posts,
+            "reviews": reviews,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "cache": args.cache,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "timestamp": datetime.utcnow().isoformat(),
+        },
+        "client": run_client(app, token, targets, args.requests),
+    }
+    if not args.no_http:
+        results["http"] = run_http(app, token, targets, args.requests, args.concurrency)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
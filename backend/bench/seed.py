@@ -0,0 +1,132 @@
+import argparse
+import os
+import random
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from database.migrations import apply_migrations
+from database.stats import rebuild_stats
+
+# Synthetic data for benchmarks. Sizes are driven by the number of reviews;
+# users and posts scale with it so the review distribution stays realistic.
+
+SCALES = {
+    '1k': 1_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+BENCH_PASSWORD = 'bench-password'
+LOCATIONS = ['Tel Aviv', 'Jerusalem', 'Haifa', 'Eilat', 'Nazareth', 'Beersheba', 'Akko', 'Tiberias']
+WORDS = ['coffee', 'falafel', 'sunset', 'beach', 'market', 'museum', 'hummus', 'view', 'quiet', 'busy', 'cozy', 'old']
+BATCH_SIZE = 10_000
+
+
+def scale_sizes(reviews):
+    users = max(10, reviews // 50)
+    posts = max(10, reviews // 10)
+    return users, posts, reviews
+
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(path, scale='1k', seed=42):
+    # Creates a fresh database at path; returns (users, posts, reviews) counts
+    rng = random.Random(seed)
+    n_users, n_posts, n_reviews = scale_sizes(SCALES[scale])
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')  # Throwaway data: durability does not matter while seeding
+    apply_migrations(conn)
+
+    # One hash shared by every user: hashing per user would dominate seeding time
+    password = generate_password_hash(BENCH_PASSWORD)
+    user_ids = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(n_users)]
+    start = datetime(2024, 1, 1)
+
+    conn.execute('BEGIN')
+    conn.executemany(
+        'INSERT INTO users (id, username, password) VALUES (?, ?, ?)',
+        ((user_id, f'bench{i}', password) for i, user_id in enumerate(user_ids))
+    )
+
+    def posts():
+        for i in range(n_posts):
+            words = rng.sample(WORDS, 4)
+            yield (
+                rng.choice(user_ids),
+                f'{words[0].title()} {words[1]} {i}',
+                ' '.join(rng.choices(WORDS, k=12)),
+                (start + timedelta(seconds=i * 37)).isoformat(),
+                f'https://picsum.photos/seed/{i}/800/600',
+                rng.choice(LOCATIONS)
+            )
+
+    for batch in _batches(posts()):
+        conn.executemany(
+            'INSERT INTO posts (userId, title, description, createdAt, photo, location) VALUES (?, ?, ?, ?, ?, ?)',
+            batch
+        )
+
+    # (user, post) pairs are unique: review r goes to post r % P from user (r // P + offset) % U
+    offsets = [rng.randrange(n_users) for _ in range(n_posts)]
+
+    def reviews():
+        for r in range(n_reviews):
+            post = r % n_posts
+            user = (r // n_posts + offsets[post]) % n_users
+            yield (
+                user_ids[user],
+                post + 1,
+                rng.randint(1, 5),
+                ' '.join(rng.choices(WORDS, k=6)),
+                (start + timedelta(seconds=post * 37 + r)).isoformat()
+            )
+
+    for batch in _batches(reviews()):
+        conn.executemany(
+            'INSERT INTO reviews (userId, postId, rating, content, createdAt) VALUES (?, ?, ?, ?, ?)',
+            batch
+        )
+
+    rebuild_stats(conn)
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+    return n_users, n_posts, n_reviews
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a benchmark database with synthetic data.")
+    parser.add_argument('--db', default='database/bench.db')
+    parser.add_argument('--scale', choices=SCALES, default='1k')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    users, posts, reviews = seed(args.db, args.scale, args.seed)
+    print(f"Seeded {args.db}: {users} users, {posts} posts, {reviews} reviews "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
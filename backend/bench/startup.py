@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from bench.seed import SCALES, seed
+
+# Cold-start benchmark: time from launching a fresh interpreter to its first served
+# request, split into phases, with and without the pre-warm step (serving.warm_app).
+# Each run is a new process, as an autoscaled worker would be.
+#
+#   python -m bench.startup --runs 10 --output startup.json
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process; prints the phase durations (ms) as JSON
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+from index import create_app
+imported = time.perf_counter()
+from serving import warm_app
+app = create_app(json.loads(sys.argv[1]))
+created = time.perf_counter()
+warm_app(app)
+warmed = time.perf_counter()
+client = app.test_client()
+import jwt
+client.set_cookie('authCookie', jwt.encode({'user_id': 'bench', 'exp': time.time() + 60},
+                                           app.config['SECRET_KEY'], algorithm=app.config['ALGORITHM']))
+timings = {}
+for path in sys.argv[2:]:
+    before = time.perf_counter()
+    status = client.get(path).status_code
+    timings[path] = [status, (time.perf_counter() - before) * 1000]
+print(json.dumps({
+    "launched_at": time.time() - (time.perf_counter() - started),
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "prewarm_ms": (warmed - created) * 1000,
+    "first_requests": timings,
+    "served_at": time.time(),
+}))
+'''
+
+
+def run_once(db_path, prewarm, paths):
+    config = {
+        'DATABASE': db_path,
+        'PREWARM': prewarm,
+        'PREWARM_PATHS': paths,
+        'RATE_LIMIT_BACKEND': 'none',
+        'THUMBNAIL_PREFETCH': False,
+    }
+    env = dict(os.environ, SECRET_KEY=os.getenv('SECRET_KEY', 'bench-secret-key-' + 'x' * 16),
+               ALGORITHM=os.getenv('ALGORITHM', 'HS256'))
+    launched = time.time()
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, json.dumps(config), *paths],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["interpreter_ms"] = (result.pop("launched_at") - launched) * 1000
+    result["to_first_request_ms"] = (result.pop("served_at") - launched) * 1000
+    return result
+
+
+def summarize(runs, paths):
+    def median(values):
+        return round(statistics.median(values), 2)
+
+    summary = {name: median([run[name] for run in runs])
+               for name in ('interpreter_ms', 'import_ms', 'create_app_ms', 'prewarm_ms', 'to_first_request_ms')}
+    summary["first_request_ms"] = {path: median([run["first_requests"][path][1] for run in runs]) for path in paths}
+    summary["statuses"] = sorted({status for run in runs for status, _ in run["first_requests"].values()})
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark process start-up to the first served request.")
+    parser.add_argument('--db', default='database/bench.db')
+    parser.add_argument('--scale', choices=SCALES, default='1k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--runs', type=int, default=10, help="Fresh processes per variant.")
+    parser.add_argument('--path', action='append', help="Request to time (repeatable).")
+    parser.add_argument('--output', help="Write results as JSON to this file.")
+    args = parser.parse_args()
+
+    db_path = os.path.abspath(args.db)
+    if not os.path.exists(db_path):
+        seed(db_path, args.scale, args.seed)
+    paths = args.path or ['/posts/all', '/posts/top']
+
+    run_once(db_path, False, paths)  # Migrations, .pyc files and the OS file cache are not what is measured
+    results = {
+        "meta": {
+            "runs": args.runs,
+            "paths": paths,
+            "python": platform.python_version(),
+            "timestamp": datetime.utcnow().isoformat(),
+        },
+    }
+    for name, prewarm in (('cold', False), ('prewarmed', True)):
+        results[name] = summarize([run_once(db_path, prewarm, paths) for _ in range(args.runs)], paths)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import os
+
+from services.passwords import DEFAULT_METHOD
+
+# Settings for create_app(), read from the environment once per process. A .env file at
+# the repository root is loaded first (variables already set in the environment win);
+# anything passed to create_app(config) overrides what is read here.
+
+ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.env')
+
+_env_loaded = False
+
+
+def load_env():
+    global _env_loaded
+    if _env_loaded:
+        return
+    if os.path.exists(ENV_FILE):
+        from dotenv import load_dotenv
+
+        load_dotenv(dotenv_path=ENV_FILE)
+    _env_loaded = True
+
+
+def _flag(name, default):
+    return os.getenv(name, default).lower() == 'true'
+
+
+def load_config():
+    load_env()
+    config = {}
+
+    # Auth tokens (HS256 etc.) and the verified-token cache
+    config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    config['ALGORITHM'] = os.getenv('ALGORITHM')
+    config['TOKEN_CACHE_SIZE'] = int(os.getenv('TOKEN_CACHE_SIZE', 4096))
+
+    # Database (pooled connections shared by all blueprints)
+    config['DATABASE'] = os.getenv('DATABASE_PATH', 'database/app.db')
+    config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 8))
+    config['DB_BUSY_TIMEOUT'] = int(os.getenv('DB_BUSY_TIMEOUT', 5000))
+    config['DB_MMAP_SIZE'] = int(os.getenv('DB_MMAP_SIZE', 256 * 1024 * 1024))
+    config['DB_MIGRATE_ON_START'] = _flag('DB_MIGRATE_ON_START', 'true')
+    # Read-only handlers: 'shared' pool, read-only 'wal' snapshot connections, or a 'replica' file
+    config['DB_READ_MODE'] = os.getenv('DB_READ_MODE', 'shared')
+    config['DB_READ_POOL_SIZE'] = int(os.getenv('DB_READ_POOL_SIZE', 8))
+    config['DB_REPLICA_PATH'] = os.getenv('DB_REPLICA_PATH')
+    config['DB_REPLICA_INTERVAL'] = float(os.getenv('DB_REPLICA_INTERVAL', 5))
+
+    # Writes go through one writer thread that group-commits concurrent operations
+    config['DB_WRITE_QUEUE'] = _flag('DB_WRITE_QUEUE', 'true')
+    config['DB_WRITE_BATCH'] = int(os.getenv('DB_WRITE_BATCH', 64))
+    config['DB_WRITE_DELAY'] = float(os.getenv('DB_WRITE_DELAY', 0.0))
+    config['DB_WRITE_MAX_PENDING'] = int(os.getenv('DB_WRITE_MAX_PENDING', 1024))
+    config['DB_WRITE_TIMEOUT'] = float(os.getenv('DB_WRITE_TIMEOUT', 30))
+
+    # Per-request SQL counts/timings, Server-Timing headers and /metrics (off by default)
+    config['METRICS_ENABLED'] = _flag('METRICS_ENABLED', 'false')
+    config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', 100))
+
+    # Response cache for the feed and post detail ('memory', 'redis' or 'none')
+    config['CACHE_BACKEND'] = os.getenv('CACHE_BACKEND', 'memory')
+    config['CACHE_MAX_ENTRIES'] = int(os.getenv('CACHE_MAX_ENTRIES', 1024))
+    config['CACHE_TTL'] = int(os.getenv('CACHE_TTL', 30))
+    config['CACHE_REDIS_URL'] = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+    # Password hashing in a process pool (0 workers = hash on the request thread)
+    config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+    config['PASSWORD_WORKERS'] = int(os.getenv('PASSWORD_WORKERS', 2))
+    config['PASSWORD_MAX_PENDING'] = int(os.getenv('PASSWORD_MAX_PENDING', 64))
+
+    # Login rate limits as 'attempts/seconds' token buckets ('memory', 'redis' or 'none')
+    config['RATE_LIMIT_BACKEND'] = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+    config['RATE_LIMIT_REDIS_URL'] = os.getenv('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+    config['LOGIN_RATE_PER_IP'] = os.getenv('LOGIN_RATE_PER_IP', '20/60')
+    config['LOGIN_RATE_PER_USERNAME'] = os.getenv('LOGIN_RATE_PER_USERNAME', '5/60')
+
+    # Post photo thumbnails (needs Pillow; without it thumbnail URLs redirect to the originals)
+    config['THUMBNAIL_DIR'] = os.getenv('THUMBNAIL_DIR', 'media/thumbnails')
+    config['THUMBNAIL_CACHE_BYTES'] = int(os.getenv('THUMBNAIL_CACHE_BYTES', 512 * 1024 * 1024))
+    config['THUMBNAIL_SIZE'] = int(os.getenv('THUMBNAIL_SIZE', 400))
+    config['THUMBNAIL_PREFETCH'] = _flag('THUMBNAIL_PREFETCH', 'true')
+    config['IMAGE_FETCH_TIMEOUT'] = float(os.getenv('IMAGE_FETCH_TIMEOUT', 5))
+    config['IMAGE_ALLOW_PRIVATE_HOSTS'] = _flag('IMAGE_ALLOW_PRIVATE_HOSTS', 'false')
+
+    # gzip / brotli response compression, negotiated from Accept-Encoding
+    config['COMPRESSION_ENABLED'] = _flag('COMPRESSION_ENABLED', 'true')
+    config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    config['GZIP_LEVEL'] = int(os.getenv('GZIP_LEVEL', 6))
+    config['BROTLI_QUALITY'] = int(os.getenv('BROTLI_QUALITY', 5))
+
+    # Live feed updates over Server-Sent Events ('memory', 'redis' for several workers, or 'none')
+    config['EVENTS_BACKEND'] = os.getenv('EVENTS_BACKEND', 'memory')
+    config['EVENTS_REDIS_URL'] = os.getenv('EVENTS_REDIS_URL', 'redis://localhost:6379/0')
+    config['EVENTS_HISTORY'] = int(os.getenv('EVENTS_HISTORY', 1000))
+    config['EVENTS_MAX_PENDING'] = int(os.getenv('EVENTS_MAX_PENDING', 256))
+    config['EVENTS_MAX_SUBSCRIBERS'] = int(os.getenv('EVENTS_MAX_SUBSCRIBERS', 8))
+    config['EVENTS_HEARTBEAT'] = float(os.getenv('EVENTS_HEARTBEAT', 15))
+    config['EVENTS_MAX_AGE'] = float(os.getenv('EVENTS_MAX_AGE', 300))
+
+    # Background maintenance (ANALYZE, incremental vacuum, WAL checkpoints, rating aggregate
+    # sweep); each job runs once per interval across all workers, 0 disables it
+    config['MAINTENANCE_ENABLED'] = _flag('MAINTENANCE_ENABLED', 'true')
+    config['MAINTENANCE_WORKERS'] = int(os.getenv('MAINTENANCE_WORKERS', 2))
+    config['MAINTENANCE_JITTER'] = float(os.getenv('MAINTENANCE_JITTER', 0.2))
+    config['MAINTENANCE_LOCK_TIMEOUT'] = float(os.getenv('MAINTENANCE_LOCK_TIMEOUT', 600))
+    config['MAINTENANCE_OPTIMIZE_INTERVAL'] = float(os.getenv('MAINTENANCE_OPTIMIZE_INTERVAL', 3600))
+    config['MAINTENANCE_VACUUM_INTERVAL'] = float(os.getenv('MAINTENANCE_VACUUM_INTERVAL', 900))
+    config['MAINTENANCE_VACUUM_PAGES'] = int(os.getenv('MAINTENANCE_VACUUM_PAGES', 2000))
+    config['MAINTENANCE_CHECKPOINT_INTERVAL'] = float(os.getenv('MAINTENANCE_CHECKPOINT_INTERVAL', 300))
+    config['MAINTENANCE_CHECKPOINT_MODE'] = os.getenv('MAINTENANCE_CHECKPOINT_MODE', 'PASSIVE').upper()
+    config['MAINTENANCE_STATS_INTERVAL'] = float(os.getenv('MAINTENANCE_STATS_INTERVAL', 6 * 3600))
+
+    # Pre-warm each serving process before it takes traffic (see serving.warm_app)
+    config['PREWARM'] = _flag('PREWARM', 'false')
+    config['PREWARM_PATHS'] = [path for path in os.getenv('PREWARM_PATHS', '/posts/all,/posts/top').split(',') if path]
+
+    return config
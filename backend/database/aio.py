@@ -0,0 +1,34 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Async access to the pooled connections for code running on an event loop. Every call
+# borrows a connection inside a worker thread, so SQLite I/O never blocks the loop.
+# Reads only: writes go through the writer queue (database.writer.write).
+
+
+class AsyncDatabase:
+    def __init__(self, pool, max_workers=None):
+        self.pool = pool
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or pool.size, thread_name_prefix='aio-db')
+
+    def _call(self, func, args):
+        conn = self.pool.acquire()
+        try:
+            return func(conn, *args)
+        finally:
+            self.pool.release(conn)
+
+    async def run(self, func, *args):
+        # func(conn, *args) runs in the thread pool with a pooled connection
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(self._call, func, args))
+
+    async def fetchall(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def fetchone(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone())
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,242 @@
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import click
+
+from database.stats import rebuild_rankings, rebuild_stats
+
+# Bulk NDJSON/CSV import and export for users, posts and reviews.
+#
+#   flask data import reviews reviews.ndjson
+#   flask data export posts posts.csv
+#
+# An import runs in a single transaction: secondary indexes and triggers on the target
+# table are dropped first and recreated once at the end, rows go in through executemany
+# in batches, then rating aggregates, per-post versions, rankings and the FTS index are rebuilt.
+# DDL is transactional in SQLite, so a failed import leaves the schema untouched.
+
+BATCH_SIZE = 50_000
+
+# Columns exchanged per table; (column, required). Ids may be omitted on import.
+TABLES = {
+    'users': [('id', False), ('username', True), ('password', True)],
+    'posts': [('id', False), ('userId', True), ('title', True), ('description', True),
+              ('createdAt', False), ('photo', True), ('location', True)],
+    'reviews': [('id', False), ('userId', True), ('postId', True), ('rating', True),
+                ('content', False), ('createdAt', False)],
+}
+
+CONFLICT_CLAUSES = {'abort': 'INSERT', 'ignore': 'INSERT OR IGNORE', 'replace': 'INSERT OR REPLACE'}
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def open_stream(path, mode):
+    # '-' is stdin/stdout; newline='' as the csv module expects
+    if path == '-':
+        stream = sys.stdin if mode == 'r' else sys.stdout
+        return open(stream.fileno(), mode, encoding='utf-8', newline='', closefd=False)
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def read_records(stream, fmt):
+    # Yields (line number, dict); CSV empty cells count as missing
+    if fmt == 'csv':
+        for line, record in enumerate(csv.DictReader(stream), start=2):
+            yield line, {key: value for key, value in record.items() if value != ''}
+    else:
+        for line, text in enumerate(stream, start=1):
+            if text.strip():
+                try:
+                    yield line, json.loads(text)
+                except json.JSONDecodeError as e:
+                    raise click.ClickException(f"Line {line}: invalid JSON ({e.msg})")
+
+
+def _rows(table, records):
+    columns = TABLES[table]
+    now = datetime.utcnow().isoformat()
+
+    for line, record in records:
+        row = []
+        for column, required in columns:
+            value = record.get(column)
+            if value is None:
+                if required:
+                    raise click.ClickException(f"Line {line}: missing '{column}'")
+                if column == 'id' and table == 'users':
+                    value = str(uuid.uuid4())
+                elif column == 'createdAt':
+                    value = now
+                elif column == 'content':
+                    value = ''
+            row.append(value)
+
+        if table == 'reviews':
+            rating = row[3]
+            if isinstance(rating, str) and rating.strip().isdigit():
+                rating = int(rating)  # CSV cells are strings
+            if not isinstance(rating, int) or isinstance(rating, bool) or not 1 <= rating <= 5:
+                raise click.ClickException(f"Line {line}: rating must be an integer between 1 and 5")
+            row[3] = rating
+
+        yield row
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _deferred_objects(conn, table):
+    # Secondary indexes and triggers of a table as (type, name, sql); autoindexes (UNIQUE) have no sql
+    return conn.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,)
+    ).fetchall()
+
+
+def bump_versions(conn):
+    # Invalidates the ETags the (dropped) triggers would have bumped row by row
+    conn.execute('UPDATE posts SET version = version + 1')
+    conn.execute(
+        "UPDATE data_versions SET version = version + 1, updatedAt = CAST(strftime('%s', 'now') AS INTEGER) WHERE scope = 'posts'"
+    )
+
+
+def import_records(conn, table, records, on_conflict='abort', batch_size=BATCH_SIZE):
+    # Loads records ((line, dict) pairs) into table; returns the number of rows inserted
+    columns = [column for column, _ in TABLES[table]]
+    sql = (f"{CONFLICT_CLAUSES[on_conflict]} INTO {table} ({', '.join(columns)}) "
+           f"VALUES ({', '.join('?' * len(columns))})")
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        deferred = _deferred_objects(conn, table)
+        for kind, name, _ in deferred:
+            conn.execute(f'DROP {kind.upper()} {name}')
+
+        before = conn.total_changes
+        for batch in _batches(_rows(table, records), batch_size):
+            conn.executemany(sql, batch)
+        inserted = conn.total_changes - before
+
+        # Indexes first, so the rebuilds below can use them; triggers last, so they don't fire
+        for kind, _, create_sql in deferred:
+            if kind == 'index':
+                conn.execute(create_sql)
+
+        if table in ('posts', 'reviews'):
+            orphans = conn.execute(
+                'SELECT COUNT(*) FROM reviews WHERE postId NOT IN (SELECT id FROM posts)'
+            ).fetchone()[0]
+            if orphans:
+                raise click.ClickException(f"{orphans} reviews reference posts that do not exist")
+            rebuild_stats(conn)
+            bump_versions(conn)
+        if table == 'posts':
+            conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+            rebuild_rankings(conn)
+
+        for kind, _, create_sql in deferred:
+            if kind == 'trigger':
+                conn.execute(create_sql)
+
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    conn.execute('ANALYZE')
+    return inserted
+
+
+def export_rows(conn, table, stream, fmt, batch_size=BATCH_SIZE):
+    # Streams a table with a single cursor; returns the number of rows written
+    columns = [column for column, _ in TABLES[table]]
+    cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY rowid")
+
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(columns)
+
+    count = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return count
+        if writer is not None:
+            writer.writerows(tuple(row) for row in rows)
+        else:
+            stream.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows)
+        count += len(rows)
+
+
+@click.group('data')
+def data_cli():
+    """Bulk import and export of users, posts and reviews."""
+
+
+@data_cli.command('import')
+@click.argument('table', type=click.Choice(list(TABLES)))
+@click.argument('source', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']), help="Defaults to the file extension.")
+@click.option('--on-conflict', type=click.Choice(list(CONFLICT_CLAUSES)), default='abort', show_default=True)
+@click.option('--batch-size', type=int, default=BATCH_SIZE, show_default=True)
+def import_command(table, source, fmt, on_conflict, batch_size):
+    """Load NDJSON or CSV records into TABLE (users need already-hashed passwords)."""
+    from flask import current_app
+
+    fmt = detect_format(source, fmt)
+    pool = current_app.extensions['db_pool']
+    conn = pool.acquire()
+    started = time.perf_counter()
+    try:
+        conn.execute('PRAGMA cache_size=-262144')  # 256MB page cache while building indexes
+        with open_stream(source, 'r') as stream:
+            inserted = import_records(conn, table, read_records(stream, fmt), on_conflict, batch_size)
+    except sqlite3.IntegrityError as e:
+        raise click.ClickException(f"{e} (nothing was imported; see --on-conflict)")
+    finally:
+        conn.execute('PRAGMA cache_size=-2000')
+        pool.release(conn)
+
+    click.echo(f"Imported {inserted} {table} in {time.perf_counter() - started:.1f}s")
+
+
+@data_cli.command('export')
+@click.argument('table', type=click.Choice(list(TABLES)))
+@click.argument('target', default='-', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']), help="Defaults to the file extension.")
+def export_command(table, target, fmt):
+    """Write TABLE as NDJSON or CSV to TARGET (default: stdout)."""
+    from flask import current_app
+
+    fmt = detect_format(target, fmt)
+    pool = current_app.extensions['db_pool']
+    conn = pool.acquire()
+    try:
+        with open_stream(target, 'w') as stream:
+            count = export_rows(conn, table, stream, fmt)
+    finally:
+        pool.release(conn)
+
+    if target != '-':
+        click.echo(f"Exported {count} {table} to {os.path.basename(target)}")
@@ -0,0 +1,219 @@
+import queue
+import sqlite3
+import threading
+import urllib.parse
+
+from flask import current_app, g
+
+# Shared data-access layer: every blueprint borrows a pooled connection through get_db()
+# and it is handed back to the pool when the app context is torn down.
+
+DEFAULT_DATABASE = 'database/app.db'
+
+
+class ConnectionPool:
+    def __init__(self, path, size=8, busy_timeout=5000, mmap_size=256 * 1024 * 1024, cached_statements=256,
+                 readonly=False):
+        self.path = path
+        self.size = size
+        self.readonly = readonly
+        self.busy_timeout = busy_timeout
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+
+        # LIFO keeps the most recently used (warm) connections in rotation
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._connections = []
+        self._retired = set()  # ids of busy connections to close on release (see recycle)
+        self.factory = sqlite3.Connection  # Connection class; instrumentation can substitute a subclass
+
+    def _connect(self):
+        if self.readonly:
+            # Read-only at the file level (mode=ro) and at the connection level (query_only)
+            database, uri = f'file:{urllib.parse.quote(self.path)}?mode=ro', True
+        else:
+            database, uri = self.path, False
+
+        conn = sqlite3.connect(
+            database,
+            timeout=self.busy_timeout / 1000,
+            check_same_thread=False,  # A connection is only ever used by one request at a time
+            cached_statements=self.cached_statements,
+            factory=self.factory,
+            uri=uri
+        )
+        conn.row_factory = sqlite3.Row
+
+        # Configured once per connection instead of once per request
+        if self.readonly:
+            conn.execute('PRAGMA query_only=1')
+        else:
+            # Only takes effect in a new, empty database (see `flask jobs enable-incremental-vacuum`)
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout)}')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def acquire(self, timeout=None):
+        if timeout is None:
+            timeout = self.busy_timeout / 1000
+        if not self._slots.acquire(timeout=timeout):
+            raise sqlite3.OperationalError("Connection pool exhausted")
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        try:
+            # Never hand out a connection with a half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+        else:
+            if id(conn) in self._retired:
+                self._discard(conn)
+            else:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def _discard(self, conn):
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+            self._retired.discard(id(conn))
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def warm(self):
+        # Opens the pool's connections up front, so no request pays for _connect()
+        connections = []
+        try:
+            while len(connections) < self.size:
+                connections.append(self.acquire())
+        finally:
+            for conn in connections:
+                self.release(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def recycle(self):
+        # Replaces every connection: idle ones are closed now, busy ones when released.
+        # Used after the file behind the pool was swapped (see database/replica.py).
+        with self._lock:
+            self._retired.update(id(conn) for conn in self._connections)
+        self.close_all()
+
+    def recycling(self):
+        # True while connections retired by recycle() are still out on requests
+        with self._lock:
+            return bool(self._retired)
+
+
+def get_pool(app=None):
+    app = app or current_app
+    return app.extensions['db_pool']
+
+
+def get_db():
+    # One connection per app context (i.e. per request), borrowed lazily from the pool
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+
+def get_read_db():
+    # Connection for read-only handlers. With DB_READ_MODE 'wal' or 'replica' it comes from a
+    # separate read-only pool, so reads never queue behind writers for a connection;
+    # otherwise it is the request's regular connection.
+    app = current_app
+    read_pool = app.extensions.get('db_read_pool')
+    if read_pool is None:
+        return get_db()
+
+    if 'read_db' in g:
+        return g.read_db
+    if g.get('read_primary'):
+        return get_db()
+
+    replica = app.extensions.get('db_replica')
+    if replica is not None and not replica.ready(timeout=0):
+        # No replica copy yet: the whole request reads the primary, so validators match the body
+        g.read_primary = True
+        return get_db()
+
+    g.read_db = read_pool.acquire()
+    return g.read_db
+
+
+def close_db(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().release(conn)
+
+    read_conn = g.pop('read_db', None)
+    if read_conn is not None:
+        current_app.extensions['db_read_pool'].release(read_conn)
+
+
+def init_app(app):
+    database = app.config.get('DATABASE', DEFAULT_DATABASE)
+    busy_timeout = app.config.get('DB_BUSY_TIMEOUT', 5000)
+    mmap_size = app.config.get('DB_MMAP_SIZE', 256 * 1024 * 1024)
+
+    app.extensions['db_pool'] = ConnectionPool(
+        database,
+        size=app.config.get('DB_POOL_SIZE', 8),
+        busy_timeout=busy_timeout,
+        mmap_size=mmap_size
+    )
+
+    # Read routing: 'shared' (reads use the regular pool), 'wal' (read-only connections to the
+    # same file, each reading a WAL snapshot) or 'replica' (read-only connections to a copy
+    # refreshed with the backup API)
+    read_mode = app.config.get('DB_READ_MODE', 'shared')
+    if read_mode in ('wal', 'replica'):
+        read_path = database
+        if read_mode == 'replica':
+            read_path = app.config.get('DB_REPLICA_PATH') or f'{database}.replica'
+
+        read_pool = app.extensions['db_read_pool'] = ConnectionPool(
+            read_path,
+            size=app.config.get('DB_READ_POOL_SIZE', 8),
+            busy_timeout=busy_timeout,
+            mmap_size=mmap_size,
+            readonly=True
+        )
+        if read_mode == 'replica':
+            from database.replica import ReadReplica
+
+            app.extensions['db_replica'] = ReadReplica(
+                database, read_pool, interval=app.config.get('DB_REPLICA_INTERVAL', 5)
+            )
+    elif read_mode != 'shared':
+        raise ValueError(f"Unknown DB_READ_MODE: {read_mode}")
+
+    app.teardown_appcontext(close_db)
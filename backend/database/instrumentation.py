@@ -0,0 +1,123 @@
+import logging
+import sqlite3
+import time
+
+from flask import g, has_request_context, request
+
+from services.metrics import request_db_time, request_duration, request_queries
+
+# Per-request SQL instrumentation. When enabled, the pool opens InstrumentedConnection
+# objects, which count and time every statement (execute and fetches) and log slow ones
+# with their query plan. When disabled nothing is installed, so there is no overhead.
+
+logger = logging.getLogger('maseixame.sql')
+
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    slow_query_ms = 100.0
+
+    _sql = None
+    _parameters = ()
+    _elapsed = 0.0
+    _logged = False
+
+    def execute(self, sql, parameters=()):
+        self._sql, self._parameters, self._elapsed, self._logged = sql, parameters, 0.0, False
+        _count_query()
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._sql, self._parameters, self._elapsed, self._logged = sql, None, 0.0, False
+        _count_query()
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        return self._timed(super().fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed(super().fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return self._timed(super().fetchall)
+
+    def _timed(self, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._elapsed += elapsed
+            if has_request_context() and 'db_time' in g:
+                g.db_time += elapsed
+            if not self._logged and self._elapsed * 1000 >= self.slow_query_ms:
+                self._logged = True
+                self._log_slow()
+
+    def _log_slow(self):
+        sql = ' '.join(self._sql.split())
+        plan = ''
+        if self._parameters is not None and sql.upper().startswith(EXPLAINABLE):
+            try:
+                # The base class' execute is not instrumented, so this is not counted or timed
+                rows = sqlite3.Connection.execute(self.connection, f'EXPLAIN QUERY PLAN {self._sql}', self._parameters)
+                plan = '; '.join(row[3] for row in rows.fetchall())
+            except sqlite3.Error as e:
+                plan = f'unavailable ({e})'
+        logger.warning("Slow query (%.1f ms): %s | plan: %s", self._elapsed * 1000, sql, plan)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    def execute(self, sql, parameters=()):
+        return self.cursor(InstrumentedCursor).execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor(InstrumentedCursor).executemany(sql, seq_of_parameters)
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+
+def _count_query():
+    if has_request_context() and 'db_queries' in g:
+        g.db_queries += 1
+
+
+def _start_request():
+    g.db_queries = 0
+    g.db_time = 0.0
+    g.request_started = time.perf_counter()
+
+
+def _finish_request(response):
+    if 'request_started' not in g:
+        return response
+
+    total = time.perf_counter() - g.request_started
+    response.headers.add(
+        'Server-Timing',
+        f'db;dur={g.db_time * 1000:.3f};desc="{g.db_queries} queries", total;dur={total * 1000:.3f}'
+    )
+
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_duration.observe(total, route, request.method)
+    request_queries.observe(g.db_queries, route, request.method)
+    request_db_time.observe(g.db_time, route, request.method)
+    return response
+
+
+def init_app(app):
+    if not app.config.get('METRICS_ENABLED', False):
+        return
+
+    InstrumentedCursor.slow_query_ms = app.config.get('SLOW_QUERY_MS', 100.0)
+    app.extensions['db_pool'].factory = InstrumentedConnection
+    for name in ('db_read_pool', 'db_write_pool'):
+        if name in app.extensions:
+            app.extensions[name].factory = InstrumentedConnection
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+    from routes.metricsRouter import metrics_bp
+    app.register_blueprint(metrics_bp)
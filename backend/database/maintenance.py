@@ -0,0 +1,312 @@
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import click
+from flask import current_app
+
+from database.connection import get_db, get_read_db
+from database.stats import find_mismatches, rebuild_stats
+from database.writer import write
+from services.metrics import job_duration
+
+# Background database maintenance, run by every serving process.
+#
+# Each job runs at most once per interval across all workers: a process that finds a job
+# due tries to claim its row in job_locks, and only the claim that succeeds runs it. The
+# claim is a lease (MAINTENANCE_LOCK_TIMEOUT), so a worker that dies mid-job does not
+# block the job forever. Checks are spread with random jitter, so workers started together
+# don't all try at the same moment. Writing jobs go through the writer queue like any
+# other write and hold the write lock for a bounded amount of work.
+#
+# A job is a function () -> number of items it handled (pages, posts), run in an app context.
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+VACUUM_STEP = 100  # Pages freed per write operation
+
+
+def optimize():
+    # Refreshes the planner statistics; analysis_limit bounds the rows sampled per index
+    write(_analyze, current_app.config.get('MAINTENANCE_ANALYSIS_LIMIT', 1000))
+    return 0
+
+
+def _analyze(conn, limit):
+    conn.execute(f'PRAGMA analysis_limit={int(limit)}')
+    try:
+        if sqlite3.sqlite_version_info >= (3, 46, 0):
+            conn.execute('PRAGMA optimize=0x10002')  # Every table, but only where statistics are stale
+        else:
+            conn.execute('ANALYZE')
+    finally:
+        conn.execute('PRAGMA analysis_limit=0')
+
+
+def incremental_vacuum():
+    # Returns free pages to the file system, at most MAINTENANCE_VACUUM_PAGES per run. Moving
+    # pages is slow, so it goes in small steps that queued writes from requests can run between.
+    limit = current_app.config.get('MAINTENANCE_VACUUM_PAGES', 2000)
+    freed = 0
+    while freed < limit:
+        pages = write(_vacuum_pages, min(VACUUM_STEP, limit - freed))
+        if not pages:
+            break
+        freed += pages
+    return freed
+
+
+def _vacuum_pages(conn, limit):
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        return 0  # Not an incremental database (see `flask jobs enable-incremental-vacuum`)
+    pages = min(limit, conn.execute('PRAGMA freelist_count').fetchone()[0])
+    for _ in range(pages):
+        # One page per statement: the sqlite3 module steps a pragma only once, so a larger
+        # argument would still free a single page
+        conn.execute('PRAGMA incremental_vacuum(1)')
+    return pages
+
+
+def checkpoint_wal():
+    # Copies the WAL back into the database off the request path, keeping the WAL short for readers
+    mode = current_app.config.get('MAINTENANCE_CHECKPOINT_MODE', 'PASSIVE')
+    busy, log, checkpointed = get_db().execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+    return max(checkpointed, 0)
+
+
+def sweep_rating_stats():
+    # Repairs posts whose rating aggregates disagree with their reviews (see `flask rating-stats`)
+    post_ids = [row['id'] for row in find_mismatches(get_read_db())]
+    if post_ids:
+        current_app.logger.warning("Repairing rating aggregates of %d posts", len(post_ids))
+        write(rebuild_stats, post_ids)
+    return len(post_ids)
+
+
+# (name, interval config key, default interval in seconds, job); an interval of 0 disables the job
+JOBS = [
+    ('optimize', 'MAINTENANCE_OPTIMIZE_INTERVAL', 3600, optimize),
+    ('incremental-vacuum', 'MAINTENANCE_VACUUM_INTERVAL', 900, incremental_vacuum),
+    ('wal-checkpoint', 'MAINTENANCE_CHECKPOINT_INTERVAL', 300, checkpoint_wal),
+    ('rating-stats', 'MAINTENANCE_STATS_INTERVAL', 6 * 3600, sweep_rating_stats),
+]
+
+
+def job_due(conn, name, interval):
+    # Read-only pre-check, so checking a job that is not due costs no write
+    row = conn.execute('SELECT lockedUntil, lastStartedAt FROM job_locks WHERE name = ?', (name,)).fetchone()
+    now = time.time()
+    return row is None or ((row['lockedUntil'] or 0) < now and (row['lastStartedAt'] or 0) <= now - interval)
+
+
+def claim_job(conn, name, owner, interval, lease):
+    # True if this owner may run the job now: nobody holds it and it last started an interval ago
+    now = time.time()
+    conn.execute('INSERT OR IGNORE INTO job_locks (name) VALUES (?)', (name,))
+    return conn.execute('''
+        UPDATE job_locks SET owner = ?, lockedUntil = ?, lastStartedAt = ?
+        WHERE name = ?
+          AND (lockedUntil IS NULL OR lockedUntil < ?)
+          AND (lastStartedAt IS NULL OR lastStartedAt <= ?)
+    ''', (owner, now + lease, now, name, now, now - interval)).rowcount == 1
+
+
+def release_job(conn, name, owner, status, duration):
+    conn.execute('''
+        UPDATE job_locks SET owner = NULL, lockedUntil = NULL, lastFinishedAt = ?, lastStatus = ?, lastDuration = ?
+        WHERE name = ? AND owner = ?
+    ''', (time.time(), status, duration, name, owner))
+
+
+class Scheduler:
+    def __init__(self, app, jobs, workers=2, poll=60, jitter=0.2, lease=600):
+        self.app = app
+        self.jobs = jobs  # [(name, interval, job)]
+        self.workers = workers
+        self.poll = poll
+        self.jitter = jitter
+        self.lease = lease
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'  # Recorded in job_locks while running a job
+
+        self._pid = None
+        self._started = threading.Lock()
+        self._lock = threading.Lock()
+        self._running = set()
+        self._stats = {}  # name -> {'runs', 'failures', 'items', 'last_success'}, this process only
+
+    def start(self):
+        # Starts this process's scheduler thread (after any fork by the server); cheap once running
+        if self._pid != os.getpid():
+            with self._started:
+                if self._pid != os.getpid():
+                    self.owner = f'{socket.gethostname()}:{os.getpid()}'
+                    self._running = set()
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='maintenance')
+                    threading.Thread(target=self._run, name='maintenance', daemon=True).start()
+                    self._pid = os.getpid()
+
+    def _delay(self, seconds):
+        return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _run(self):
+        # A job is checked every min(interval, poll) seconds, first at a random point of that
+        # period; whether it is actually due is decided by its row in job_locks
+        checks = {name: min(interval, self.poll) for name, interval, _ in self.jobs}
+        due = {name: time.monotonic() + random.uniform(0, check) for name, check in checks.items()}
+        while True:
+            now = time.monotonic()
+            for name, interval, job in self.jobs:
+                if due[name] <= now:
+                    due[name] = now + self._delay(checks[name])
+                    self.submit(name, interval, job)
+            time.sleep(max(0.0, min(due.values()) - time.monotonic()))
+
+    def submit(self, name, interval, job):
+        with self._lock:
+            if name in self._running:
+                return None
+            self._running.add(name)
+        return self._executor.submit(self.run, name, interval, job)
+
+    def run(self, name, interval, job):
+        # Runs the job if this process wins its claim; returns the items handled, or None if skipped
+        try:
+            with self.app.app_context():
+                try:
+                    if not job_due(get_db(), name, interval) or not write(claim_job, name, self.owner, interval, self.lease):
+                        return None
+                except sqlite3.Error as e:
+                    self.app.logger.warning("Could not claim maintenance job %s: %s", name, e)
+                    return None
+
+                started = time.perf_counter()
+                status, items = 'ok', None
+                try:
+                    items = job()
+                except Exception:
+                    status = 'error'
+                    self.app.logger.exception("Maintenance job %s failed", name)
+                duration = time.perf_counter() - started
+
+                self._record(name, status, duration, items)
+                try:
+                    write(release_job, name, self.owner, status, duration)
+                except sqlite3.Error as e:
+                    self.app.logger.warning("Could not release maintenance job %s: %s", name, e)  # The lease expires
+                return items
+        finally:
+            with self._lock:
+                self._running.discard(name)
+
+    def _record(self, name, status, duration, items):
+        job_duration.observe(duration, name, status)
+        with self._lock:
+            stats = self._stats.setdefault(name, {'runs': 0, 'failures': 0, 'items': 0, 'last_success': 0})
+            stats['runs'] += 1
+            if status == 'ok':
+                stats['items'] += items or 0
+                stats['last_success'] = time.time()
+            else:
+                stats['failures'] += 1
+
+    def metric_lines(self):
+        # Counters of this process's runs, in the Prometheus text format (see routes/metricsRouter.py)
+        with self._lock:
+            stats = sorted((name, dict(values)) for name, values in self._stats.items())
+        lines = []
+        for metric, help_text, key in (
+            ('maintenance_job_runs_total', "Maintenance job runs in this process.", 'runs'),
+            ('maintenance_job_failures_total', "Maintenance job runs that failed.", 'failures'),
+            ('maintenance_job_items_total', "Pages vacuumed or checkpointed, or posts repaired.", 'items'),
+            ('maintenance_job_last_success_timestamp_seconds', "When the job last succeeded here.", 'last_success'),
+        ):
+            kind = 'gauge' if key == 'last_success' else 'counter'
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}']
+            lines += [f'{metric}{{job="{name}"}} {values[key]}' for name, values in stats]
+        return lines
+
+
+def get_scheduler():
+    return current_app.extensions.get('maintenance')
+
+
+def _job(name):
+    for job_name, _, _, job in JOBS:
+        if job_name == name:
+            return job
+    raise click.ClickException(f"Unknown job {name}; one of: {', '.join(job[0] for job in JOBS)}")
+
+
+@click.group('jobs')
+def jobs_cli():
+    """Background database maintenance jobs."""
+
+
+@jobs_cli.command('list')
+def list_command():
+    """Show when each maintenance job last ran, in any process."""
+    rows = {row['name']: row for row in get_db().execute('SELECT * FROM job_locks')}
+    for name, key, default, _ in JOBS:
+        interval = current_app.config.get(key, default)
+        row = rows.get(name)
+        if row is None or row['lastFinishedAt'] is None:
+            last = "never"
+        else:
+            finished = datetime.fromtimestamp(row['lastFinishedAt']).isoformat(timespec='seconds')
+            last = f"{row['lastStatus']} at {finished} ({row['lastDuration']:.2f}s)"
+        held = f", running in {row['owner']}" if row is not None and row['owner'] else ""
+        click.echo(f"{name}: every {interval:g}s, last {last}{held}" if interval else f"{name}: disabled")
+
+
+@jobs_cli.command('run')
+@click.argument('name')
+def run_command(name):
+    """Run job NAME now, unless another process is running it."""
+    scheduler = Scheduler(current_app._get_current_object(), [], lease=current_app.config.get('MAINTENANCE_LOCK_TIMEOUT', 600))
+    items = scheduler.run(name, 0, _job(name))
+    if items is None:
+        raise click.ClickException(f"{name} did not run (another process holds it, or it failed; see the log)")
+    click.echo(f"{name}: {items} items")
+
+
+@jobs_cli.command('enable-incremental-vacuum')
+def enable_incremental_vacuum_command():
+    """Switch the database to incremental auto-vacuum. Rewrites the whole file: writes wait until it is done."""
+    conn = get_db()
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        click.echo("Incremental auto-vacuum is already enabled")
+        return
+    started = time.perf_counter()
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('VACUUM')
+    click.echo(f"Incremental auto-vacuum enabled in {time.perf_counter() - started:.1f}s")
+
+
+def init_app(app):
+    app.cli.add_command(jobs_cli)
+
+    mode = app.config.get('MAINTENANCE_CHECKPOINT_MODE', 'PASSIVE')
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f"Unknown MAINTENANCE_CHECKPOINT_MODE: {mode}")
+    if not app.config.get('MAINTENANCE_ENABLED', True):
+        return
+
+    jobs = [(name, app.config.get(key, default), job) for name, key, default, job in JOBS]
+    jobs = [(name, interval, job) for name, interval, job in jobs if interval > 0]
+    if not jobs:
+        return
+
+    scheduler = app.extensions['maintenance'] = Scheduler(
+        app,
+        jobs,
+        workers=app.config.get('MAINTENANCE_WORKERS', 2),
+        poll=app.config.get('MAINTENANCE_POLL', 60),
+        jitter=app.config.get('MAINTENANCE_JITTER', 0.2),
+        lease=app.config.get('MAINTENANCE_LOCK_TIMEOUT', 600)
+    )
+    # Started by the first request, i.e. in each serving process, never in the CLI or a preloading master
+    app.before_request(scheduler.start)
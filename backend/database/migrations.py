@@ -0,0 +1,419 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import click
+
+from database.stats import location_key_sql, ranking_score_sql
+
+# Versioned schema migrations. Applied versions are recorded in schema_migrations,
+# so every migration runs exactly once per database, in order.
+# A migration is either a list of SQL statements or a function taking the connection.
+
+
+def _base_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            password TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            userId TEXT NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
+            photo TEXT NOT NULL,
+            location TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reviews (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            userId TEXT NOT NULL,
+            postId INTEGER NOT NULL,
+            rating INTEGER NOT NULL,
+            content TEXT DEFAULT '',
+            createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(userId, postId)
+        )
+    ''')
+
+    # Older databases were patched by hand (see fix.py) and may miss these columns
+    columns = [col['name'] for col in conn.execute('PRAGMA table_info(reviews)').fetchall()]
+    if 'rating' not in columns:
+        conn.execute('ALTER TABLE reviews ADD COLUMN rating INTEGER NOT NULL DEFAULT 3')
+    if 'content' not in columns:
+        conn.execute("ALTER TABLE reviews ADD COLUMN content TEXT DEFAULT ''")
+
+
+def _unique_review_per_user(conn):
+    # The batch endpoint upserts ON CONFLICT(userId, postId), which needs a unique index on exactly
+    # those columns; reviews tables created before the UNIQUE constraint lack it
+    for index in conn.execute('PRAGMA index_list(reviews)').fetchall():
+        columns = {col['name'] for col in conn.execute(f"PRAGMA index_info('{index['name']}')").fetchall()}
+        if index['unique'] and not index['partial'] and columns == {'userId', 'postId'}:
+            return
+
+    # Keep each user's latest review of a post, then fix the aggregates of the posts involved
+    conn.execute('''
+        CREATE TEMP TABLE duplicate_review_posts AS
+        SELECT DISTINCT postId FROM reviews
+        WHERE id NOT IN (SELECT MAX(id) FROM reviews GROUP BY userId, postId)
+    ''')
+    conn.execute('DELETE FROM reviews WHERE id NOT IN (SELECT MAX(id) FROM reviews GROUP BY userId, postId)')
+    conn.execute('''
+        UPDATE posts SET
+            rating_sum = (SELECT COALESCE(SUM(r.rating), 0) FROM reviews r WHERE r.postId = posts.id),
+            rating_count = (SELECT COUNT(*) FROM reviews r WHERE r.postId = posts.id)
+        WHERE id IN (SELECT postId FROM duplicate_review_posts)
+    ''')
+    conn.execute('DROP TABLE duplicate_review_posts')
+    conn.execute('CREATE UNIQUE INDEX idx_reviews_user_post ON reviews(userId, postId)')
+
+
+# Definitions the rebuild below gives posts and reviews; {name} is the table being created
+POSTS_TABLE = '''
+    CREATE TABLE {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        userId TEXT NOT NULL,
+        title TEXT NOT NULL,
+        description TEXT NOT NULL,
+        createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
+        photo TEXT NOT NULL,
+        location TEXT NOT NULL,
+        rating_sum INTEGER NOT NULL DEFAULT 0,
+        rating_count INTEGER NOT NULL DEFAULT 0,
+        rating_avg REAL GENERATED ALWAYS AS (
+            CASE WHEN rating_count > 0 THEN CAST(rating_sum AS REAL) / rating_count ELSE 0 END
+        ) VIRTUAL,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+'''
+REVIEWS_TABLE = '''
+    CREATE TABLE {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        userId TEXT NOT NULL,
+        postId INTEGER NOT NULL,
+        rating INTEGER NOT NULL,
+        content TEXT DEFAULT '',
+        createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(userId, postId)
+    )
+'''
+
+
+def _rebuild_table(conn, table, definition, columns):
+    # SQLite's way to change a column's type: create the new table, copy the rows, drop the old
+    # one, rename, then recreate the old table's indexes and triggers (dropped along with it).
+    # columns maps each copied column to the expression that reads it from the old table.
+    dependents = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,)
+    )]
+    sequence = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+
+    conn.execute(definition.format(name=f'{table}_rebuilt'))
+    conn.execute(
+        f"INSERT INTO {table}_rebuilt ({', '.join(columns)}) SELECT {', '.join(columns.values())} FROM {table}"
+    )
+    conn.execute(f'DROP TABLE {table}')
+    # Triggers of other tables mention this table, which does not exist between the DROP and the
+    # RENAME; legacy renaming leaves them alone instead of failing to rewrite them
+    conn.execute('PRAGMA legacy_alter_table=ON')
+    try:
+        conn.execute(f'ALTER TABLE {table}_rebuilt RENAME TO {table}')
+    finally:
+        conn.execute('PRAGMA legacy_alter_table=OFF')
+    for sql in dependents:
+        conn.execute(sql)
+
+    # Ids of deleted rows must not be handed out again
+    if sequence is not None:
+        conn.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (sequence[0], table))
+
+
+def _text_user_ids(conn):
+    # Databases created before the migrations (and patched by fix.py) declare posts.userId and
+    # reviews.userId INTEGER while users.id is TEXT: with the mismatched affinity, joins to users
+    # cannot use its primary key. posts also still has the unused JSON reviews column.
+    def column_types(table):
+        return {col['name']: col['type'].upper() for col in conn.execute(f'PRAGMA table_info({table})')}
+
+    posts = column_types('posts')
+    if posts['userId'] != 'TEXT' or 'reviews' in posts:
+        _rebuild_table(conn, 'posts', POSTS_TABLE, {
+            'id': 'id',
+            'userId': 'CAST(userId AS TEXT)',
+            'title': 'title',
+            'description': 'description',
+            'createdAt': 'createdAt',
+            'photo': "COALESCE(photo, '')",
+            'location': 'location',
+            'rating_sum': 'rating_sum',
+            'rating_count': 'rating_count',
+            'version': 'version',
+        })
+
+    if column_types('reviews')['userId'] != 'TEXT':
+        _rebuild_table(conn, 'reviews', REVIEWS_TABLE, {
+            'id': 'id',
+            'userId': 'CAST(userId AS TEXT)',
+            'postId': 'postId',
+            'rating': 'rating',
+            'content': "COALESCE(content, '')",
+            'createdAt': 'createdAt',
+        })
+
+
+MIGRATIONS = [
+    (1, 'base schema', _base_schema),
+    (2, 'indexes for hot query paths', [
+        # get_post_by_title
+        'CREATE INDEX IF NOT EXISTS idx_posts_title ON posts(title)',
+        # Feed keyset pagination (newest first)
+        'CREATE INDEX IF NOT EXISTS idx_posts_created ON posts(createdAt, id)',
+        # Profile: a user's posts, newest first
+        'CREATE INDEX IF NOT EXISTS idx_posts_user_created ON posts(userId, createdAt, id)',
+        # Batched review loading; covers the AVG/COUNT aggregate and the join to users
+        'CREATE INDEX IF NOT EXISTS idx_reviews_post ON reviews(postId, userId, rating)',
+        # Register / login lookups
+        'CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)',
+    ]),
+    (3, 'denormalized rating aggregates', [
+        'ALTER TABLE posts ADD COLUMN rating_sum INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE posts ADD COLUMN rating_count INTEGER NOT NULL DEFAULT 0',
+        '''ALTER TABLE posts ADD COLUMN rating_avg REAL GENERATED ALWAYS AS (
+            CASE WHEN rating_count > 0 THEN CAST(rating_sum AS REAL) / rating_count ELSE 0 END
+        ) VIRTUAL''',
+        # Backfill from the existing reviews
+        '''UPDATE posts SET
+            rating_sum = (SELECT COALESCE(SUM(r.rating), 0) FROM reviews r WHERE r.postId = posts.id),
+            rating_count = (SELECT COUNT(*) FROM reviews r WHERE r.postId = posts.id)''',
+        # Ranked feed sorts
+        'CREATE INDEX IF NOT EXISTS idx_posts_rating_avg ON posts(rating_avg, createdAt, id)',
+        'CREATE INDEX IF NOT EXISTS idx_posts_rating_count ON posts(rating_count, createdAt, id)',
+        # Reviews left behind by posts deleted before deletes removed them
+        'DELETE FROM reviews WHERE postId NOT IN (SELECT id FROM posts)',
+    ]),
+    (4, 'data versions for conditional requests', [
+        # Global version of everything the feed shows, bumped by triggers on every write
+        '''CREATE TABLE IF NOT EXISTS data_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updatedAt INTEGER NOT NULL
+        )''',
+        "INSERT OR IGNORE INTO data_versions (scope, version, updatedAt) VALUES ('posts', 0, CAST(strftime('%s', 'now') AS INTEGER))",
+        # Per-post version, bumped whenever one of its reviews changes
+        'ALTER TABLE posts ADD COLUMN version INTEGER NOT NULL DEFAULT 0',
+        '''CREATE TRIGGER IF NOT EXISTS trg_posts_version_insert AFTER INSERT ON posts BEGIN
+            UPDATE data_versions SET version = version + 1, updatedAt = CAST(strftime('%s', 'now') AS INTEGER) WHERE scope = 'posts';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_posts_version_delete AFTER DELETE ON posts BEGIN
+            UPDATE data_versions SET version = version + 1, updatedAt = CAST(strftime('%s', 'now') AS INTEGER) WHERE scope = 'posts';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_posts_version_update AFTER UPDATE OF userId, title, description, photo, location ON posts BEGIN
+            UPDATE posts SET version = version + 1 WHERE id = NEW.id;
+            UPDATE data_versions SET version = version + 1, updatedAt = CAST(strftime('%s', 'now') AS INTEGER) WHERE scope = 'posts';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_reviews_version_insert AFTER INSERT ON reviews BEGIN
+            UPDATE posts SET version = version + 1 WHERE id = NEW.postId;
+            UPDATE data_versions SET version = version + 1, updatedAt = CAST(strftime('%s', 'now') AS INTEGER) WHERE scope = 'posts';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_reviews_version_update AFTER UPDATE ON reviews BEGIN
+            UPDATE posts SET version = version + 1 WHERE id IN (OLD.postId, NEW.postId);
+            UPDATE data_versions SET version = version + 1, updatedAt = CAST(strftime('%s', 'now') AS INTEGER) WHERE scope = 'posts';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_reviews_version_delete AFTER DELETE ON reviews BEGIN
+            UPDATE posts SET version = version + 1 WHERE id = OLD.postId;
+            UPDATE data_versions SET version = version + 1, updatedAt = CAST(strftime('%s', 'now') AS INTEGER) WHERE scope = 'posts';
+        END''',
+    ]),
+    (5, 'full-text search over posts', [
+        # External-content FTS5 index: stores only the index, the text stays in posts
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+            title, description, location,
+            content='posts', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_posts_fts_insert AFTER INSERT ON posts BEGIN
+            INSERT INTO posts_fts (rowid, title, description, location)
+            VALUES (NEW.id, NEW.title, NEW.description, NEW.location);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_posts_fts_delete AFTER DELETE ON posts BEGIN
+            INSERT INTO posts_fts (posts_fts, rowid, title, description, location)
+            VALUES ('delete', OLD.id, OLD.title, OLD.description, OLD.location);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_posts_fts_update AFTER UPDATE OF title, description, location ON posts BEGIN
+            INSERT INTO posts_fts (posts_fts, rowid, title, description, location)
+            VALUES ('delete', OLD.id, OLD.title, OLD.description, OLD.location);
+            INSERT INTO posts_fts (rowid, title, description, location)
+            VALUES (NEW.id, NEW.title, NEW.description, NEW.location);
+        END''',
+        # Index the posts that already exist
+        "INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')",
+    ]),
+    (6, 'unique review per user and post', _unique_review_per_user),
+    (7, 'thumbnail cache index', [
+        # Source photo URL (hashed) -> content-addressed thumbnail file
+        '''CREATE TABLE IF NOT EXISTS image_cache (
+            sourceKey TEXT PRIMARY KEY,
+            digest TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            accessedAt INTEGER NOT NULL
+        )''',
+        # LRU eviction order, and the "is this file still referenced" check
+        'CREATE INDEX IF NOT EXISTS idx_image_cache_accessed ON image_cache(accessedAt)',
+        'CREATE INDEX IF NOT EXISTS idx_image_cache_digest ON image_cache(digest)',
+    ]),
+    (8, 'post rankings by location', [
+        # Materialized ranking score per post, ordered within each normalized location
+        '''CREATE TABLE IF NOT EXISTS post_rankings (
+            postId INTEGER PRIMARY KEY,
+            locationKey TEXT NOT NULL,
+            score REAL NOT NULL
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_post_rankings_location ON post_rankings(locationKey, score, postId)',
+        'CREATE INDEX IF NOT EXISTS idx_post_rankings_score ON post_rankings(score, postId)',
+        # Kept in step with the posts row: its location and the aggregates every review write adjusts
+        f'''CREATE TRIGGER IF NOT EXISTS trg_posts_ranking_insert AFTER INSERT ON posts BEGIN
+            INSERT INTO post_rankings (postId, locationKey, score)
+            VALUES (NEW.id, {location_key_sql('NEW.location')}, {ranking_score_sql('NEW')});
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_posts_ranking_update AFTER UPDATE OF location, rating_sum, rating_count ON posts BEGIN
+            UPDATE post_rankings SET locationKey = {location_key_sql('NEW.location')}, score = {ranking_score_sql('NEW')}
+            WHERE postId = NEW.id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_posts_ranking_delete AFTER DELETE ON posts BEGIN
+            DELETE FROM post_rankings WHERE postId = OLD.id;
+        END''',
+        # Rank the posts that already exist
+        f'''INSERT OR REPLACE INTO post_rankings (postId, locationKey, score)
+            SELECT id, {location_key_sql('location')}, {ranking_score_sql('posts')} FROM posts''',
+    ]),
+    (9, 'review pages per post', [
+        # /posts/<id>/reviews: a post's reviews newest first, keyset paginated
+        'CREATE INDEX IF NOT EXISTS idx_reviews_post_created ON reviews(postId, createdAt, id)',
+    ]),
+    (10, 'maintenance job locks', [
+        # One row per background job (database/maintenance.py): the worker holding it and its last run
+        '''CREATE TABLE IF NOT EXISTS job_locks (
+            name TEXT PRIMARY KEY,
+            owner TEXT,
+            lockedUntil REAL,
+            lastStartedAt REAL,
+            lastFinishedAt REAL,
+            lastStatus TEXT,
+            lastDuration REAL
+        )''',
+    ]),
+    (11, 'text user ids on posts and reviews', _text_user_ids),
+]
+
+
+def applied_versions(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            appliedAt TEXT NOT NULL
+        )
+    ''')
+    return {row[0] for row in conn.execute('SELECT version FROM schema_migrations')}
+
+
+def apply_migrations(conn):
+    # Returns the list of versions applied by this call
+    applied = []
+    done = applied_versions(conn)
+    if conn.in_transaction:
+        conn.commit()
+
+    for version, name, migration in MIGRATIONS:
+        if version in done:
+            continue
+
+        # IMMEDIATE takes the write lock up front, so concurrent workers starting together
+        # wait for each other and then see the version as already applied
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,)).fetchone():
+                conn.rollback()
+                continue
+
+            if callable(migration):
+                migration(conn)
+            else:
+                for statement in migration:
+                    conn.execute(statement)
+
+            conn.execute(
+                'INSERT INTO schema_migrations (version, name, appliedAt) VALUES (?, ?, ?)',
+                (version, name, datetime.utcnow().isoformat())
+            )
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+        applied.append(version)
+
+    return applied
+
+
+def migrate_app(app):
+    pool = app.extensions['db_pool']
+    conn = pool.acquire()
+    try:
+        return apply_migrations(conn)
+    finally:
+        pool.release(conn)
+
+
+@click.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations."""
+    from flask import current_app
+
+    applied = migrate_app(current_app)
+    if applied:
+        click.echo(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        click.echo("Database is up to date")
+
+
+@click.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any route query falls back to a full table scan."""
+    from flask import current_app
+    from database.queryPlans import check_query_plans, schema_copy
+
+    # Checked on a copy of the schema without planner statistics, so the result does not
+    # depend on the amount of data or on when ANALYZE last ran
+    pool = current_app.extensions['db_pool']
+    conn = pool.acquire()
+    try:
+        scratch = schema_copy(conn)
+    finally:
+        pool.release(conn)
+    try:
+        failures = check_query_plans(scratch)
+    finally:
+        scratch.close()
+
+    for name, detail in failures:
+        click.echo(f"SCAN in {name}: {detail}", err=True)
+    if failures:
+        raise click.ClickException(f"{len(failures)} route queries fall back to a table scan")
+    click.echo("All route queries use indexes")
+
+
+def init_app(app):
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(check_query_plans_command)
+
+    if app.config.get('DB_MIGRATE_ON_START', True):
+        migrate_app(app)
@@ -0,0 +1,48 @@
+import base64
+import json
+
+# Cursors are opaque to clients: base64url-encoded JSON of the sort name and the last row's key
+
+# Types a key value may decode to, per key column: timestamps are ISO strings, row ids
+# integers and rating or bm25 scores numbers (a whole-number score encodes as an int)
+TIMESTAMP = str
+ROW_ID = int
+SCORE = (int, float)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort, key):
+    raw = json.dumps([sort, *key], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor, sort, key_types):
+    # key_types holds the expected type(s) of each key value, e.g. (TIMESTAMP, ROW_ID)
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != len(key_types) + 1 or values[0] != sort:
+        raise InvalidCursor("Cursor does not match the requested sort")
+
+    key = tuple(values[1:])
+    for value, types in zip(key, key_types):
+        # The values are bound as query parameters; bool is an int subclass but never a key
+        if isinstance(value, bool) or not isinstance(value, types):
+            raise InvalidCursor("Invalid cursor")
+    return key
+
+
+def parse_limit(value, default=20, maximum=100):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, maximum))
@@ -0,0 +1,296 @@
+import html
+import re
+
+from database.pagination import ROW_ID, SCORE, TIMESTAMP
+from database.stats import location_key_sql, split_stats
+from services.images import thumbnail_url
+
+# Shared read queries used by the blueprints
+# Reviews are loaded for a whole page of posts at once instead of one query per post
+
+# SQLite caps the number of bound parameters per statement, so large id lists are chunked
+MAX_IN_PARAMS = 900
+
+# Rows fetched (and reviews batch-loaded) at a time when streaming
+STREAM_CHUNK = 500
+
+FEED_REVIEW_COLUMNS = 'r.rating, r.userId, u.username, r.content'
+DETAIL_REVIEW_COLUMNS = 'r.id, r.rating, r.userId, r.createdAt, u.username'
+PROFILE_REVIEW_COLUMNS = 'r.rating, r.userId, u.username'
+REVIEW_RESPONSE_COLUMNS = 'r.id, r.rating, r.userId, r.content, r.createdAt, u.username'
+
+
+# Feed sort orders: each maps to the leading ranking expression (None sorts by recency only).
+# Every order ends with (createdAt, id) so the keyset is unique and deep pages never use OFFSET.
+FEED_SORTS = {
+    'newest': None,
+    'top-rated': 'p.rating_avg',
+    'most-reviewed': 'p.rating_count',
+}
+
+# Top-level post fields a client may select with ?fields=
+POST_FIELDS = ('id', 'userId', 'username', 'title', 'description', 'createdAt', 'photo', 'thumbnail', 'location', 'reviews')
+
+
+POST_BY_TITLE_SQL = '''
+    SELECT p.*, u.username
+    FROM posts p
+    JOIN users u ON p.userId = u.id
+    WHERE p.title = ?
+    ORDER BY p.id
+'''
+
+def top_posts_sql(by_location=False):
+    # Reads the ranking index from the top down: LIMIT rows, however many posts there are.
+    # CROSS JOIN keeps post_rankings as the outer loop, whatever ANALYZE says about the tables.
+    where = f"WHERE r.locationKey = {location_key_sql('?')}" if by_location else ''
+    return f'''
+        SELECT p.*, u.username, round(r.score, 4) AS score
+        FROM post_rankings r
+        CROSS JOIN posts p ON p.id = r.postId
+        LEFT JOIN users u ON p.userId = u.id
+        {where}
+        ORDER BY r.score DESC, r.postId DESC
+        LIMIT ?
+    '''
+
+
+POST_BY_ID_SQL = '''
+    SELECT p.*, u.username
+    FROM posts p
+    LEFT JOIN users u ON p.userId = u.id
+    WHERE p.id = ?
+'''
+
+def profile_posts_sql(has_cursor=False):
+    # A user's posts, newest first, keyset paginated on (createdAt, id)
+    where = 'AND (p.createdAt, p.id) < (?, ?)' if has_cursor else ''
+    return f'''
+        SELECT p.*
+        FROM posts p
+        WHERE p.userId = ? {where}
+        ORDER BY p.createdAt DESC, p.id DESC
+        LIMIT ?
+    '''
+
+
+def post_reviews_sql(has_cursor=False):
+    # One post's reviews, newest first, keyset paginated on (createdAt, id)
+    where = 'AND (r.createdAt, r.id) < (?, ?)' if has_cursor else ''
+    return f'''
+        SELECT {REVIEW_RESPONSE_COLUMNS}
+        FROM reviews r
+        JOIN users u ON r.userId = u.id
+        WHERE r.postId = ? {where}
+        ORDER BY r.createdAt DESC, r.id DESC
+        LIMIT ?
+    '''
+
+
+# BM25 column weights for search: title, description, location
+SEARCH_WEIGHTS = (10.0, 1.0, 4.0)
+
+# Snippet markers are control characters so the text can be HTML-escaped before they become <mark>
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+
+
+def build_match_query(text):
+    # Turns free text into a safe FTS5 query: every word quoted, the last one as a prefix
+    words = re.findall(r'\w+', text)[:16]
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def highlight_snippet(snippet):
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>')
+
+
+def search_sql(has_cursor=False):
+    score = f"bm25(posts_fts, {', '.join(str(w) for w in SEARCH_WEIGHTS)})"
+    # Keyset on (score, id): scores ascend, the best match first
+    where = f'AND ({score}, p.id) > (?, ?)' if has_cursor else ''
+    return f'''
+        SELECT p.*, u.username, {score} AS score,
+               snippet(posts_fts, -1, '{SNIPPET_START}', '{SNIPPET_END}', '…', 12) AS snippet
+        FROM posts_fts
+        JOIN posts p ON p.id = posts_fts.rowid
+        LEFT JOIN users u ON p.userId = u.id
+        WHERE posts_fts MATCH ? {where}
+        ORDER BY score, p.id
+        LIMIT ?
+    '''
+
+
+def post_stats_sql(count):
+    return f'''
+        SELECT id AS postId, rating_avg AS average, rating_count AS count
+        FROM posts
+        WHERE id IN ({','.join('?' * count)})
+    '''
+
+
+# Batch review submission: one statement per item, either a new review or the user's update
+REVIEW_UPSERT_SQL = '''
+    INSERT INTO reviews (userId, postId, rating, content, createdAt) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(userId, postId) DO UPDATE SET rating = excluded.rating, content = excluded.content
+'''
+
+
+def posts_by_ids_sql(count):
+    return f"SELECT id, title FROM posts WHERE id IN ({','.join('?' * count)})"
+
+
+def user_ratings_sql(count):
+    # The user's current rating for each of the posts (first parameter is the user id)
+    return f"SELECT postId, rating FROM reviews WHERE userId = ? AND postId IN ({','.join('?' * count)})"
+
+
+def reviews_sql(columns, count):
+    return f'''
+        SELECT r.postId AS _postId, {columns}
+        FROM reviews r
+        JOIN users u ON r.userId = u.id
+        WHERE r.postId IN ({','.join('?' * count)})
+    '''
+
+
+def _chunks(ids):
+    for start in range(0, len(ids), MAX_IN_PARAMS):
+        yield ids[start:start + MAX_IN_PARAMS]
+
+
+def load_ratings(conn, post_ids, columns=FEED_REVIEW_COLUMNS):
+    # Returns {postId: [review, ...]} for every requested post
+    post_ids = list(dict.fromkeys(post_ids))
+    ratings = {post_id: [] for post_id in post_ids}
+
+    for chunk in _chunks(post_ids):
+        for row in conn.execute(reviews_sql(columns, len(chunk)), chunk).fetchall():
+            review = dict(row)
+            ratings[review.pop('_postId')].append(review)
+
+    return ratings
+
+
+def load_reviews(conn, post_ids, columns=FEED_REVIEW_COLUMNS):
+    # Returns {postId: {'ratings': [...], 'average': float, 'count': int}} for every requested post
+    ratings = load_ratings(conn, post_ids, columns)
+    reviews = {post_id: {'ratings': ratings[post_id], 'average': 0, 'count': 0} for post_id in ratings}
+
+    for chunk in _chunks(list(ratings)):
+        # Aggregates are maintained on the posts row by every review write
+        for row in conn.execute(post_stats_sql(len(chunk)), chunk).fetchall():
+            reviews[row['postId']]['average'] = row['average']
+            reviews[row['postId']]['count'] = row['count']
+
+    return reviews
+
+
+def attach_reviews(conn, posts, columns=FEED_REVIEW_COLUMNS, summary=False):
+    # Converts post rows (which carry the rating aggregates) to dicts with a 'reviews' entry;
+    # with summary=True only the aggregates are included and no reviews are read
+    posts_list = [dict(post) for post in posts]
+    ratings = None if summary else load_ratings(conn, [post['id'] for post in posts_list], columns)
+
+    for post_data in posts_list:
+        post_data.pop('version', None)  # Internal change counter, only used for ETags
+        thumbnail = thumbnail_url(post_data['id'], post_data['photo']) if post_data.get('photo') else None
+        if thumbnail is not None:
+            post_data['thumbnail'] = thumbnail
+        average, count = split_stats(post_data)
+        post_data['reviews'] = {'average': average, 'count': count}
+        if ratings is not None:
+            post_data['reviews']['ratings'] = ratings[post_data['id']]
+
+    return posts_list
+
+
+def parse_fields(value):
+    # ?fields=id,title,reviews -> tuple of field names (None = all); raises ValueError
+    if not value:
+        return None
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in POST_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Use any of: {', '.join(POST_FIELDS)}")
+    return fields
+
+
+def project(posts, fields):
+    if fields is None:
+        return posts
+    return [{field: post[field] for field in fields if field in post} for post in posts]
+
+
+def iter_posts(conn, cursor, columns=FEED_REVIEW_COLUMNS, drop=(), summary=False, fields=None):
+    # Lazily yields post dicts with reviews from an open cursor, one batched review load per chunk
+    while True:
+        rows = cursor.fetchmany(STREAM_CHUNK)
+        if not rows:
+            return
+        posts = [dict(row) for row in rows]
+        for post in posts:
+            for column in drop:
+                del post[column]
+        yield from project(attach_reviews(conn, posts, columns, summary), fields)
+
+
+def iter_feed(conn, sort='newest', after=None, summary=False, fields=None):
+    # The whole feed from the cursor position on, in feed order (LIMIT -1 means no limit)
+    key_length = feed_key_length(sort)
+    params = (*after, -1) if after is not None else (-1,)
+    cursor = conn.execute(feed_page_sql(sort, after is not None), params)
+    return iter_posts(conn, cursor, FEED_REVIEW_COLUMNS, [f'_key{i}' for i in range(key_length)], summary, fields)
+
+
+def feed_key_types(sort):
+    # Types of the feed keyset values, for decode_cursor
+    return (TIMESTAMP, ROW_ID) if FEED_SORTS[sort] is None else (SCORE, TIMESTAMP, ROW_ID)
+
+
+def feed_key_length(sort):
+    return len(feed_key_types(sort))
+
+
+def _feed_key_columns(sort):
+    rank = FEED_SORTS[sort]
+    return ['p.createdAt', 'p.id'] if rank is None else [rank, 'p.createdAt', 'p.id']
+
+
+def feed_page_sql(sort='newest', has_cursor=False):
+    key_columns = _feed_key_columns(sort)
+
+    where = ''
+    if has_cursor:
+        # Row-value comparison lets SQLite seek straight to the cursor position
+        where = f"WHERE ({', '.join(key_columns)}) < ({', '.join('?' * len(key_columns))})"
+
+    return f'''
+        SELECT p.*, u.username, {', '.join(f'{column} AS _key{i}' for i, column in enumerate(key_columns))}
+        FROM posts p
+        LEFT JOIN users u ON p.userId = u.id
+        {where}
+        ORDER BY {', '.join(f'{column} DESC' for column in key_columns)}
+        LIMIT ?
+    '''
+
+
+def fetch_feed_page(conn, sort='newest', limit=20, after=None):
+    # Returns (rows, keys) for one feed page; keys[i] is the keyset position of rows[i]
+    key_length = feed_key_length(sort)
+    params = (*after, limit) if after is not None else (limit,)
+    rows = conn.execute(feed_page_sql(sort, after is not None), params).fetchall()
+
+    keys = [tuple(row[f'_key{i}'] for i in range(key_length)) for row in rows]
+    posts = []
+    for row in rows:
+        post = dict(row)
+        for i in range(key_length):
+            del post[f'_key{i}']
+        posts.append(post)
+
+    return posts, keys
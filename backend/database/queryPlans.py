@@ -0,0 +1,85 @@
+import sqlite3
+
+from database.versions import POST_VERSION_BY_ID_SQL, POST_VERSION_BY_TITLE_SQL
+from database.queries import (
+    FEED_REVIEW_COLUMNS, POST_BY_ID_SQL, POST_BY_TITLE_SQL, REVIEW_UPSERT_SQL,
+    feed_page_sql, post_reviews_sql, post_stats_sql, profile_posts_sql, posts_by_ids_sql, reviews_sql, search_sql, top_posts_sql, user_ratings_sql
+)
+
+# EXPLAIN QUERY PLAN guard for the queries the routes run on every request.
+# A "SCAN" step that is not driven by an index means the query reads a whole table.
+
+ROUTE_QUERIES = [
+    ('feed newest (first page)', feed_page_sql('newest'), (20,)),
+    ('feed newest (cursor page)', feed_page_sql('newest', has_cursor=True), ('2024-01-01T00:00:00', 1, 20)),
+    ('feed top-rated (first page)', feed_page_sql('top-rated'), (20,)),
+    ('feed top-rated (cursor page)', feed_page_sql('top-rated', has_cursor=True), (4.5, '2024-01-01T00:00:00', 1, 20)),
+    ('feed most-reviewed (first page)', feed_page_sql('most-reviewed'), (20,)),
+    ('feed most-reviewed (cursor page)', feed_page_sql('most-reviewed', has_cursor=True), (3, '2024-01-01T00:00:00', 1, 20)),
+    ('post rating aggregates', post_stats_sql(3), (1, 2, 3)),
+    ('feed reviews', reviews_sql(FEED_REVIEW_COLUMNS, 3), (1, 2, 3)),
+    ('post by title', POST_BY_TITLE_SQL, ('title',)),
+    ('post by id (created event)', POST_BY_ID_SQL, (1,)),
+    ('top posts', top_posts_sql(), (20,)),
+    ('top posts by location', top_posts_sql(by_location=True), ('Tel Aviv', 20)),
+    ('search (first page)', search_sql(), ('"coffee"', 20)),
+    ('search (cursor page)', search_sql(has_cursor=True), ('"coffee"', -1.5, 1, 20)),
+    ('post version by title', POST_VERSION_BY_TITLE_SQL, ('title',)),
+    ('data version', 'SELECT version, updatedAt FROM data_versions WHERE scope = ?', ('posts',)),
+    ('profile user', 'SELECT id, username FROM users WHERE id = ?', ('user',)),
+    ('profile posts (first page)', profile_posts_sql(), ('user', 20)),
+    ('profile posts (cursor page)', profile_posts_sql(has_cursor=True), ('user', '2024-01-01T00:00:00', 1, 20)),
+    ('post reviews (first page)', post_reviews_sql(), (1, 20)),
+    ('post reviews (cursor page)', post_reviews_sql(has_cursor=True), (1, '2024-01-01T00:00:00', 1, 20)),
+    ('post version by id', POST_VERSION_BY_ID_SQL, (1,)),
+    ('login user', 'SELECT id, password FROM users WHERE username = ?', ('user',)),
+    ('register existing user', 'SELECT id FROM users WHERE username = ?', ('user',)),
+    ('review post exists', 'SELECT id, title FROM posts WHERE id = ?', (1,)),
+    ('review existing', 'SELECT id FROM reviews WHERE userId = ? AND postId = ?', ('user', 1)),
+    ('review batch posts', posts_by_ids_sql(3), (1, 2, 3)),
+    ('review batch existing', user_ratings_sql(3), ('user', 1, 2, 3)),
+    ('review batch upsert', REVIEW_UPSERT_SQL, ('user', 1, 5, '', '2024-01-01T00:00:00')),
+    ('thumbnail post photo', 'SELECT photo FROM posts WHERE id = ?', (1,)),
+    ('thumbnail lookup', 'SELECT digest, accessedAt FROM image_cache WHERE sourceKey = ?', ('key',)),
+    ('thumbnail still referenced', 'SELECT 1 FROM image_cache WHERE digest = ?', ('digest',)),
+    ('delete post lookup', 'SELECT title FROM posts WHERE id = ? AND userId = ?', (1, 'user')),
+    ('delete post', 'DELETE FROM posts WHERE id = ? AND userId = ?', (1, 'user')),
+    ('delete post reviews', 'DELETE FROM reviews WHERE postId = ?', (1,)),
+]
+
+
+def is_table_scan(detail):
+    # Virtual tables (FTS5) report their own index lookups as "SCAN ... VIRTUAL TABLE INDEX"
+    return detail.startswith('SCAN') and ' USING ' not in detail and ' VIRTUAL TABLE INDEX ' not in detail
+
+
+def explain(conn, sql, params=()):
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()]
+
+
+def schema_copy(conn):
+    # An empty in-memory database with conn's tables, indexes and triggers but none of its
+    # sqlite_stat1/sqlite_stat4 rows: after ANALYZE on a small database the planner rightly
+    # prefers scanning a few rows, so plans are checked against its default estimates instead
+    scratch = sqlite3.connect(':memory:')
+    rows = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+    ).fetchall()
+    for kind, name, sql in rows:
+        # A virtual table creates its own shadow tables, which are listed after it
+        if kind == 'table' and scratch.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone():
+            continue
+        scratch.execute(sql)
+    return scratch
+
+
+def check_query_plans(conn, queries=ROUTE_QUERIES):
+    # Returns [(query name, plan step)] for every step that scans a table without an index
+    failures = []
+    for name, sql, params in queries:
+        for detail in explain(conn, sql, params):
+            if is_table_scan(detail):
+                failures.append((name, detail))
+    return failures
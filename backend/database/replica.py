@@ -0,0 +1,134 @@
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: refreshes from several processes are not coordinated
+    fcntl = None
+
+# Read replica for DB_READ_MODE=replica: a copy of the database made with the SQLite backup
+# API and swapped in atomically, so feed reads never share pages or locks with writers.
+#
+# Each process runs one refresher thread (started on first use, i.e. after any fork). It
+# polls PRAGMA data_version on the primary and, once something was committed, copies the
+# database to a temporary file and renames it over the replica. With several workers, a
+# file lock lets one of them copy while the others just pick up the new file. Reads lag
+# writes by up to `interval` seconds.
+
+logger = logging.getLogger('maseixame.replica')
+
+
+class ReadReplica:
+    def __init__(self, source, pool, interval=5):
+        self.source = source
+        self.path = pool.path
+        self.pool = pool
+        self.interval = interval
+
+        self._inode = None
+        self._held = None  # Descriptor keeping the replica file in use alive (see _pick_up)
+        self._draining = []  # Descriptors of replaced files, closed once no connection uses them
+        self._pid = None
+        self._started = threading.Lock()
+        self._ready = threading.Event()
+
+    def ready(self, timeout=None):
+        # Starts the refresher in this process if needed; True once a replica file is in use
+        if self._pid != os.getpid():
+            with self._started:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._ready = threading.Event()
+                    threading.Thread(target=self._run, name='db-replica', daemon=True).start()
+        if timeout is None:
+            timeout = self.interval
+        return self._ready.wait(timeout)
+
+    def _run(self):
+        source = sqlite3.connect(self.source, check_same_thread=False)
+        last_version = None
+        pending_since = 0.0  # Oldest primary change not yet in the replica file
+        try:
+            while True:
+                # A failed tick (disk full, a locked primary...) must not end the thread, as
+                # nothing restarts it: it is logged, and pending_since is kept so the next retries
+                try:
+                    version = source.execute('PRAGMA data_version').fetchone()[0]
+                    if version != last_version:
+                        last_version = version
+                        if not pending_since:
+                            pending_since = time.time()
+
+                    if pending_since:
+                        if self._mtime() >= pending_since or self.refresh():
+                            pending_since = 0.0
+
+                    self._pick_up()
+                    if self._draining and not self.pool.recycling():
+                        for fd in self._draining:
+                            os.close(fd)
+                        self._draining = []
+                except Exception:
+                    logger.exception("Could not refresh the read replica %s", self.path)
+                time.sleep(self.interval)
+        finally:
+            source.close()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    def _pick_up(self):
+        # Re-opens the read connections once the replica file was replaced (by any process).
+        # Freeing a replaced file can stall for as long as the filesystem takes to flush the
+        # new copy, so this thread holds it open and lets go last, never a request closing
+        # its connection.
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return
+        inode = os.fstat(fd).st_ino
+        if inode == self._inode:
+            os.close(fd)
+        else:
+            if self._held is not None:
+                self._draining.append(self._held)
+                self.pool.recycle()
+            self._held, self._inode = fd, inode
+        self._ready.set()
+
+    def refresh(self):
+        # Copies the primary over the replica; returns False if another process is copying
+        lock_file = open(f'{self.path}.lock', 'a')
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+            os.close(fd)
+            try:
+                source = sqlite3.connect(self.source)
+                target = sqlite3.connect(tmp)
+                try:
+                    source.backup(target)  # One step: a consistent snapshot; WAL writers carry on
+                    target.execute('PRAGMA journal_mode=DELETE')  # Single file, readable with mode=ro
+                finally:
+                    target.close()
+                    source.close()
+                os.replace(tmp, self.path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            return True
+        finally:
+            lock_file.close()
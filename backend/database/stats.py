@@ -0,0 +1,129 @@
+import click
+
+# Denormalized rating aggregates on posts (rating_sum, rating_count, rating_avg).
+# They are adjusted in the same transaction as every review write, so reads never
+# have to aggregate the reviews table.
+
+STATS_COLUMNS = ('rating_sum', 'rating_count', 'rating_avg')
+
+# Ranking score for /posts/top: a Bayesian average that counts every post as having
+# RANKING_PRIOR_WEIGHT extra reviews of RANKING_PRIOR_MEAN stars, so one 5-star review
+# does not outrank fifty 4.8-star ones. Scores live in post_rankings, kept current by
+# triggers on posts; the triggers embed these values, so changing them takes a migration
+# that recreates the triggers and calls rebuild_rankings.
+RANKING_PRIOR_MEAN = 3.0
+RANKING_PRIOR_WEIGHT = 5
+
+
+def ranking_score_sql(row):
+    # Score expression over a posts row reference ('NEW', 'posts', ...)
+    return (f'(CAST({row}.rating_sum AS REAL) + {RANKING_PRIOR_WEIGHT} * {RANKING_PRIOR_MEAN}) '
+            f'/ ({row}.rating_count + {RANKING_PRIOR_WEIGHT})')
+
+
+def location_key_sql(value):
+    # Rankings are grouped by location compared case-insensitively (ASCII) and without outer spaces
+    return f'lower(trim({value}))'
+
+
+def apply_rating_change(conn, post_id, old_rating, new_rating):
+    # old_rating is None for a new review; must run inside the review write's transaction
+    if old_rating is None:
+        conn.execute(
+            'UPDATE posts SET rating_sum = rating_sum + ?, rating_count = rating_count + 1 WHERE id = ?',
+            (new_rating, post_id)
+        )
+    elif old_rating != new_rating:
+        conn.execute(
+            'UPDATE posts SET rating_sum = rating_sum + ? WHERE id = ?',
+            (new_rating - old_rating, post_id)
+        )
+
+
+def apply_rating_changes(conn, changes):
+    # Batched apply_rating_change for (post_id, old_rating, new_rating) triples, at most one per post
+    conn.executemany(
+        'UPDATE posts SET rating_sum = rating_sum + ?, rating_count = rating_count + ? WHERE id = ?',
+        [
+            (new_rating - (old_rating or 0), 1 if old_rating is None else 0, post_id)
+            for post_id, old_rating, new_rating in changes
+            if old_rating != new_rating
+        ]
+    )
+
+
+def rebuild_stats(conn, post_ids=None):
+    # Recomputes the aggregates from the raw reviews table (all posts, or only post_ids)
+    sql = '''
+        UPDATE posts SET
+            rating_sum = (SELECT COALESCE(SUM(r.rating), 0) FROM reviews r WHERE r.postId = posts.id),
+            rating_count = (SELECT COUNT(*) FROM reviews r WHERE r.postId = posts.id)
+    '''
+    if post_ids is None:
+        return conn.execute(sql).rowcount
+
+    post_ids = list(post_ids)
+    if not post_ids:
+        return 0
+    return conn.execute(f"{sql} WHERE id IN ({','.join('?' * len(post_ids))})", post_ids).rowcount
+
+
+def rebuild_rankings(conn):
+    # Recomputes post_rankings from the posts table (after bulk loads that bypass the triggers)
+    conn.execute('DELETE FROM post_rankings')
+    return conn.execute(f'''
+        INSERT INTO post_rankings (postId, locationKey, score)
+        SELECT id, {location_key_sql('location')}, {ranking_score_sql('posts')} FROM posts
+    ''').rowcount
+
+
+def find_mismatches(conn):
+    # Returns rows (id, rating_sum, rating_count, actual_sum, actual_count) that disagree with reviews
+    return conn.execute('''
+        SELECT p.id, p.rating_sum, p.rating_count,
+               COALESCE(s.total, 0) AS actual_sum, COALESCE(s.n, 0) AS actual_count
+        FROM posts p
+        LEFT JOIN (
+            SELECT postId, SUM(rating) AS total, COUNT(*) AS n
+            FROM reviews
+            GROUP BY postId
+        ) s ON s.postId = p.id
+        WHERE p.rating_sum != COALESCE(s.total, 0) OR p.rating_count != COALESCE(s.n, 0)
+    ''').fetchall()
+
+
+def split_stats(post_data):
+    # Moves the aggregate columns of a post row into the API's {'average', 'count'} shape
+    post_data.pop('rating_sum', None)
+    count = post_data.pop('rating_count', 0)
+    average = post_data.pop('rating_avg', 0)
+    return average, count
+
+
+@click.command('rating-stats')
+@click.option('--repair', is_flag=True, help="Rebuild the aggregates of posts that do not match.")
+def rating_stats_command(repair):
+    """Check the denormalized rating aggregates against the reviews table."""
+    from flask import current_app
+
+    pool = current_app.extensions['db_pool']
+    conn = pool.acquire()
+    try:
+        mismatches = find_mismatches(conn)
+        for row in mismatches:
+            click.echo(
+                f"Post {row['id']}: stored {row['rating_sum']}/{row['rating_count']}, "
+                f"actual {row['actual_sum']}/{row['actual_count']}"
+            )
+
+        if mismatches and repair:
+            conn.execute('BEGIN IMMEDIATE')
+            rebuild_stats(conn, [row['id'] for row in mismatches])
+            conn.commit()
+            click.echo(f"Repaired {len(mismatches)} posts")
+        elif mismatches:
+            raise click.ClickException(f"{len(mismatches)} posts have stale rating aggregates")
+        else:
+            click.echo("Rating aggregates are consistent")
+    finally:
+        pool.release(conn)
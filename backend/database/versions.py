@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+
+# Cheap change markers for conditional requests, maintained by triggers (migration 4)
+
+POST_VERSION_BY_TITLE_SQL = '''
+    SELECT p.id, p.version
+    FROM posts p
+    JOIN users u ON p.userId = u.id
+    WHERE p.title = ?
+    ORDER BY p.id
+    LIMIT 1
+'''
+
+POST_VERSION_BY_ID_SQL = 'SELECT version FROM posts WHERE id = ?'
+
+
+def get_data_version(conn, scope='posts'):
+    # Returns (version, last modified datetime) of everything in the scope
+    row = conn.execute('SELECT version, updatedAt FROM data_versions WHERE scope = ?', (scope,)).fetchone()
+    if row is None:
+        return 0, None
+    return row['version'], datetime.fromtimestamp(row['updatedAt'], timezone.utc)
+
+
+def get_post_version(conn, title):
+    # Returns (post id, version) of the post served for a title, or None
+    row = conn.execute(POST_VERSION_BY_TITLE_SQL, (title,)).fetchone()
+    if row is None:
+        return None
+    return row['id'], row['version']
+
+
+def get_post_version_by_id(conn, post_id):
+    # Returns the post's version, or None if it does not exist
+    row = conn.execute(POST_VERSION_BY_ID_SQL, (post_id,)).fetchone()
+    return None if row is None else row['version']
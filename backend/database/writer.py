@@ -0,0 +1,170 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from flask import current_app
+
+from database.connection import ConnectionPool, DEFAULT_DATABASE, get_db
+
+# Single-writer queue for the write endpoints.
+#
+# Instead of every request taking SQLite's write lock and committing on its own, write
+# operations are queued to one writer thread per process. It takes whatever queued up
+# while the previous batch was committing (at most DB_WRITE_BATCH operations, optionally
+# waiting DB_WRITE_DELAY seconds for more) and runs it as one transaction, so a burst of
+# writes pays for one commit instead of one each, and a lone write is not held back.
+# Every operation runs inside its own savepoint: one that fails is rolled back on its own
+# and its caller gets the exception, while the rest of the batch commits.
+#
+# An operation is a function (conn, *args) -> result. It runs on the writer's connection
+# and must not commit; whatever it returns is handed back to the request that queued it.
+
+
+class WriteQueue:
+    def __init__(self, pool, max_batch=64, max_delay=0.0, max_pending=1024, timeout=30):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._pid = None
+        self._started = threading.Lock()
+        self._queue = None
+
+    def _ensure_started(self):
+        # The writer thread (and its queue) belongs to the process that uses it, i.e. after any fork
+        if self._pid != os.getpid():
+            with self._started:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(self.max_pending)
+                    threading.Thread(target=self._run, args=(self._queue,), name='db-writer', daemon=True).start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def start(self):
+        # Starts this process's writer thread (and its connection) ahead of the first write
+        self._ensure_started()
+
+    def submit(self, operation, *args):
+        # Queues an operation; returns a Future for its result
+        future = Future()
+        try:
+            self._ensure_started().put_nowait((operation, args, future))
+        except queue.Full:
+            raise sqlite3.OperationalError("Write queue is full")
+        return future
+
+    def run(self, operation, *args):
+        # Queues an operation and waits for it to be committed
+        future = self.submit(operation, *args)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            raise sqlite3.OperationalError("Timed out waiting for the database writer")
+
+    def _run(self, pending):
+        conn = self.pool.acquire()
+        try:
+            while True:
+                self._commit_batch(conn, self._next_batch(pending))
+        finally:
+            self.pool.release(conn)
+
+    def _next_batch(self, pending):
+        # Blocks for the first operation, then takes what is already queued (or arrives within max_delay)
+        batch = [pending.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(pending.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit_batch(self, conn, batch):
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        results = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for operation, args, future in batch:
+                conn.execute('SAVEPOINT write_op')
+                try:
+                    result = operation(conn, *args)
+                except Exception as e:
+                    # Undo this operation only; if that fails the whole transaction is lost
+                    conn.execute('ROLLBACK TO write_op')
+                    conn.execute('RELEASE write_op')
+                    results.append((future, None, e))
+                else:
+                    conn.execute('RELEASE write_op')
+                    results.append((future, result, None))
+            conn.commit()
+        except Exception as e:
+            if conn.in_transaction:
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    pass
+            # Nothing in the batch was committed
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+def write(operation, *args):
+    # Runs a write operation through the app's writer queue, or directly when it is disabled
+    writer = current_app.extensions.get('db_writer')
+    if writer is not None:
+        return writer.run(operation, *args)
+
+    conn = get_db()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        result = operation(conn, *args)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return result
+
+
+def init_app(app):
+    if not app.config.get('DB_WRITE_QUEUE', True):
+        return
+
+    # The writer keeps its own connection, so it never waits on a pool slot held by a request
+    # that is itself waiting on the writer
+    pool = app.extensions['db_write_pool'] = ConnectionPool(
+        app.config.get('DATABASE', DEFAULT_DATABASE),
+        size=1,
+        busy_timeout=app.config.get('DB_BUSY_TIMEOUT', 5000),
+        mmap_size=app.config.get('DB_MMAP_SIZE', 256 * 1024 * 1024)
+    )
+    app.extensions['db_writer'] = WriteQueue(
+        pool,
+        max_batch=app.config.get('DB_WRITE_BATCH', 64),
+        max_delay=app.config.get('DB_WRITE_DELAY', 0.0),
+        max_pending=app.config.get('DB_WRITE_MAX_PENDING', 1024),
+        timeout=app.config.get('DB_WRITE_TIMEOUT', 30)
+    )
@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from serving import BIND, THREADS, WORKERS, warm_app
+
+# gunicorn -c gunicorn.conf.py
+
+wsgi_app = 'wsgi:app'
+bind = BIND
+
+# Threaded workers: a request waiting on SQLite or password hashing doesn't hold up the process
+worker_class = 'gthread'
+workers = WORKERS
+threads = THREADS
+
+# Import (and migrate) once in the master; workers are forked from it
+preload_app = True
+
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so slow leaks can't accumulate; jitter avoids restarting all at once
+max_requests = 10000
+max_requests_jitter = 1000
+
+
+def post_worker_init(worker):
+    # Runs in each worker after the fork, before it accepts connections (PREWARM=true)
+    warm_app(worker.wsgi)
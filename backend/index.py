@@ -1,29 +1,53 @@
-from flask import Flask, jsonify
+from flask import Flask
 from flask_cors import CORS
-import sqlite3
 
+from config import load_config
 from routes.userRouter import user_bp
 from routes.postsRouter import posts_bp
+from routes.imagesRouter import images_bp
+from database import connection, writer, migrations, stats, instrumentation, bulk, maintenance
+from services import responseCache, passwords, images, encoding, events
+from middleware import checkAuthentication, rateLimit
 
-app = Flask(__name__)
-CORS(
-    app,
-    origins=["http://localhost:3000"],
-    supports_credentials=True,
-    allow_headers=["Content-Type", "Authorization"],
-    expose_headers=["Set-Cookie"],
-    methods=["GET", "POST", "PUT", "DELETE"]
-)
 
-# Function to connect to the database
-def get_db_connection():
-    conn = sqlite3.connect('database/app.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+def create_app(config=None):
+    # Application factory: settings from load_config() (environment and .env), overridden
+    # by `config`. Used by `flask --app index`, serving.load_app() and the benchmarks.
+    app = Flask(__name__)
+    app.config.update(load_config())
+    app.config.update(config or {})
 
-app.register_blueprint(user_bp, url_prefix='/user')  # Correct blueprint registration
-app.register_blueprint(posts_bp, url_prefix='/posts')
+    CORS(
+        app,
+        origins=["http://localhost:3000"],
+        supports_credentials=True,
+        allow_headers=["Content-Type", "Authorization"],
+        expose_headers=["Set-Cookie"],
+        methods=["GET", "POST", "PUT", "DELETE"]
+    )
+
+    connection.init_app(app)  # Pooled connections shared by all blueprints
+    writer.init_app(app)  # Writes go through one writer thread that group-commits them
+    instrumentation.init_app(app)  # SQL timings, Server-Timing and /metrics (METRICS_ENABLED)
+
+    migrations.init_app(app)  # Schema migrations (also available as `flask migrate`)
+    app.cli.add_command(stats.rating_stats_command)  # `flask rating-stats [--repair]`
+    app.cli.add_command(bulk.data_cli)  # `flask data import|export <table> <file>`
+    maintenance.init_app(app)  # Background maintenance jobs (also `flask jobs list|run`)
+
+    responseCache.init_app(app)
+    passwords.init_app(app)
+    checkAuthentication.init_app(app)
+    rateLimit.init_app(app)
+    images.init_app(app)
+    encoding.init_app(app)
+    events.init_app(app)
+
+    app.register_blueprint(user_bp, url_prefix='/user')  # Correct blueprint registration
+    app.register_blueprint(posts_bp, url_prefix='/posts')
+    app.register_blueprint(images_bp, url_prefix='/images')
+    return app
 
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    create_app().run(debug=True, port=5000)
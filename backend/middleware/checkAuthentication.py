@@ -1,12 +1,58 @@
-from flask import request, jsonify
+from flask import current_app, request, jsonify, g
 from functools import wraps
+from collections import OrderedDict
+import hashlib
+import threading
+import time
 import jwt
-import os
-from dotenv import load_dotenv
 
-load_dotenv(dotenv_path='../.env')
-SECRET_KEY = os.getenv('SECRET_KEY')
-ALGORITHM = os.getenv('ALGORITHM')
+
+# Verified tokens, keyed by SHA-256 of the token and kept until the token's own expiry,
+# so repeat requests skip the HMAC verification
+class TokenCache:
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # digest -> (exp, claims)
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            exp, claims = entry
+            if exp <= time.time():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return claims
+
+    def set(self, digest, exp, claims):
+        with self._lock:
+            self._entries[digest] = (exp, claims)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def verify_token(token):
+    # Returns the token's claims; raises jwt.InvalidTokenError (or ExpiredSignatureError)
+    token_cache = current_app.extensions['token_cache']
+    digest = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(digest)
+    if claims is not None:
+        return claims
+
+    config = current_app.config
+    claims = jwt.decode(token, config['SECRET_KEY'], algorithms=[config['ALGORITHM']])
+    if isinstance(claims.get('exp'), (int, float)):
+        token_cache.set(digest, claims['exp'], claims)
+    return claims
+
+
+def current_user_id():
+    # User id of the request authenticated by check_authentication
+    return g.auth['user_id']
 
 
 def check_authentication(f):
@@ -18,12 +64,15 @@ def check_authentication(f):
             return jsonify({"error": "Authentication required. Token is missing"}), 401
         
         try:
-            payloadJWT = jwt.decode(token, SECRET_KEY,  algorithms=[ALGORITHM])
+            payloadJWT = verify_token(token)
             request.user_id = payloadJWT.get("user_id")
         
             # Check if user_id exists in the token
             if not request.user_id:
                 return jsonify({"error": "Invalid token format"}), 401
+
+            # Request-scoped auth context: route handlers read this instead of decoding again
+            g.auth = {"user_id": request.user_id, "claims": payloadJWT}
         # Catch    
         except jwt.ExpiredSignatureError:
             return jsonify({"error": "Authentication failed. Token has expired"}), 401
@@ -33,4 +82,7 @@ def check_authentication(f):
         return f(*args, **kwargs) # If everything is valid, proceed to the route function
     
     return decorated_function
-    
\ No newline at end of file
+
+
+def init_app(app):
+    app.extensions['token_cache'] = TokenCache(app.config.get('TOKEN_CACHE_SIZE', 4096))
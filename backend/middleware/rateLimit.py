@@ -0,0 +1,135 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+# Token-bucket rate limiting. Each bucket holds up to `capacity` tokens and refills at
+# `rate` tokens per second; a request spends one token or is answered 429 with Retry-After.
+
+
+class BucketStore:
+    # take() must refill and spend atomically; see MemoryStore and RedisStore
+
+    def take(self, key, capacity, rate, cost=1):
+        # Returns (allowed, seconds until `cost` tokens are available)
+        raise NotImplementedError
+
+
+class MemoryStore(BucketStore):
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at), least recently used first
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # A bucket that is evicted comes back full, which only errs on the lenient side
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        return allowed, 0 if allowed else (cost - tokens) / rate
+
+
+class RedisStore(BucketStore):
+    # Shares buckets between workers; the refill-and-spend runs as one Lua script
+    SCRIPT = """
+local capacity, rate, now, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+    def __init__(self, client, prefix='maseixame:rl:'):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate, cost=1):
+        allowed, tokens = self._script(keys=[self.prefix + key], args=[capacity, rate, time.time(), cost])
+        tokens = float(tokens)
+        return bool(allowed), 0 if allowed else (cost - tokens) / rate
+
+
+def parse_rate(value):
+    # '10/60' -> burst of 10, refilled at 10 per 60 seconds
+    count, _, period = str(value).partition('/')
+    count, period = float(count), float(period or 1)
+    return count, count / period
+
+
+def get_store():
+    return current_app.extensions.get('rate_limit_store')
+
+
+def rate_limit(name, key_func, config_key):
+    # Limits a view per key_func() value, e.g. client IP or submitted username; key_func may
+    # return None to skip the check. The limit is read from app.config[config_key].
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            store = get_store()
+            key = key_func()
+            if store is None or key is None:
+                return f(*args, **kwargs)
+
+            capacity, rate = parse_rate(current_app.config[config_key])
+            allowed, retry_after = store.take(f'{name}:{key}', capacity, rate)
+            if not allowed:
+                response = jsonify({"error": "Too many attempts. Try again later"})
+                response.headers['Retry-After'] = str(math.ceil(retry_after))
+                return response, 429
+
+            return f(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
+
+
+def client_ip():
+    return request.remote_addr
+
+
+def submitted_username():
+    data = request.get_json(silent=True)
+    username = data.get('username') if isinstance(data, dict) else None
+    return username.strip().lower() if isinstance(username, str) and username else None
+
+
+def create_store(config):
+    backend = config.get('RATE_LIMIT_BACKEND', 'memory')
+    if backend == 'memory':
+        return MemoryStore(config.get('RATE_LIMIT_MAX_KEYS', 100000))
+    if backend == 'redis':
+        import redis  # Optional dependency, only needed when several workers share limits
+
+        return RedisStore(redis.Redis.from_url(config.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')))
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+def init_app(app):
+    if app.config.get('RATE_LIMIT_BACKEND', 'memory') == 'none':
+        return
+    app.extensions['rate_limit_store'] = create_store(app.config)
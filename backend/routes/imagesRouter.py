@@ -0,0 +1,36 @@
+from flask import Blueprint, jsonify, redirect, send_file
+import sqlite3
+
+from database.connection import get_db
+from services.images import get_store, source_key, ImageUnavailable, THUMBNAIL_CONTENT_TYPE
+
+images_bp = Blueprint('images', __name__)
+
+# The URL embeds a hash of the photo URL, so a given thumbnail URL never changes content
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+# Thumbnail of a post's photo (public, like the original photo)
+@images_bp.route('/posts/<int:id>/<string:key>', methods=['GET'])
+def post_thumbnail(id, key):
+    conn = get_db()
+    try:
+        post = conn.execute('SELECT photo FROM posts WHERE id = ?', (id,)).fetchone()
+        if not post or source_key(post['photo']) != key:
+            return jsonify({"error": "Image Not Found"}), 404
+
+        store = get_store()
+        if store is None:
+            return redirect(post['photo'])  # Thumbnails disabled (no Pillow)
+
+        digest = store.get(conn, post['photo'])
+
+    except ImageUnavailable as e:
+        return jsonify({"error": str(e)}), 502
+    except sqlite3.Error as e:
+        return jsonify({"error": str(e)}), 500
+
+    response = send_file(store.path(digest), mimetype=THUMBNAIL_CONTENT_TYPE, etag=digest,
+                         max_age=IMMUTABLE_MAX_AGE, conditional=True)
+    response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return response
@@ -0,0 +1,26 @@
+from flask import Blueprint, current_app
+
+from services.metrics import registry, counter_lines
+
+metrics_bp = Blueprint('metrics', __name__) # Prometheus scrape endpoint
+
+
+# Metrics (Prometheus text format)
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    body = registry.render()
+
+    cache = current_app.extensions.get('response_cache')
+    if cache is not None:
+        stats = cache.stats()
+        body += '\n'.join(
+            counter_lines('response_cache_hits_total', "Response cache hits.", stats['hits'])
+            + counter_lines('response_cache_misses_total', "Response cache misses.", stats['misses'])
+            + counter_lines('response_cache_evictions_total', "Response cache LRU evictions.", stats['evictions'])
+        ) + '\n'
+
+    scheduler = current_app.extensions.get('maintenance')
+    if scheduler is not None:
+        body += '\n'.join(scheduler.metric_lines()) + '\n'
+
+    return current_app.response_class(body, mimetype='text/plain; version=0.0.4')
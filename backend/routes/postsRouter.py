@@ -1,188 +1,348 @@
-from flask import Blueprint, jsonify, request # Flask
+from flask import Blueprint, current_app, jsonify, request # Flask
 import sqlite3 # SQL
 import json  # Required for JSON serialization
 from datetime import datetime  # For timestamp handling
-import jwt  # For JWT handling
 
 
-from middleware.checkAuthentication import check_authentication
+from middleware.checkAuthentication import check_authentication, current_user_id
+from database.connection import get_db, get_read_db
+from database.queries import POST_BY_ID_SQL, attach_reviews, parse_fields, project, load_reviews, fetch_feed_page, iter_feed, feed_key_types, FEED_SORTS, POST_BY_TITLE_SQL, search_sql, build_match_query, highlight_snippet, FEED_REVIEW_COLUMNS, DETAIL_REVIEW_COLUMNS, REVIEW_RESPONSE_COLUMNS, REVIEW_UPSERT_SQL, posts_by_ids_sql, user_ratings_sql, post_stats_sql, top_posts_sql, post_reviews_sql
+from database.stats import apply_rating_change, apply_rating_changes
+from database.writer import write
+from database.versions import get_data_version, get_post_version, get_post_version_by_id
+from services.conditional import conditional
+from services.responseCache import cached_json, invalidate
+from services.streaming import stream_format, streamed_response
+from services.images import prefetch
+from services.encoding import render, wants_msgpack
+from services.events import TooManySubscribers, event_stream, get_broker, publish
+from database.pagination import encode_cursor, decode_cursor, parse_limit, InvalidCursor, ROW_ID, SCORE, TIMESTAMP
 
-# .env
-import os
-from dotenv import load_dotenv
+posts_bp = Blueprint('posts', __name__)
 
+# Most reviews accepted by one /reviews/batch request
+REVIEW_BATCH_MAX = 500
 
-load_dotenv(dotenv_path='../.env')
-SECRET_KEY = os.getenv('SECRET_KEY')
-ALGORITHM = os.getenv('ALGORITHM')
 
-def get_db_connection(): # Connect to SQLite database
-    conn = sqlite3.connect('database/app.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+# ETag / Last-Modified for conditional GETs, from trigger-maintained version counters
+def feed_validators():
+    version, last_modified = get_data_version(get_read_db())
+    fmt = stream_format() or ('msgpack' if wants_msgpack() else None)
+    return f'feed-{version}' + (f'-{fmt}' if fmt else ''), last_modified
+
+
+def post_validators(title):
+    conn = get_read_db()
+    post_version = get_post_version(conn, title)
+    if post_version is None:
+        return None  # Let the view answer 404
+    _, last_modified = get_data_version(conn)
+    return f'post-{post_version[0]}-{post_version[1]}', last_modified
+
+
+def post_reviews_validators(id):
+    post_version = get_post_version_by_id(get_read_db(), id)
+    if post_version is None:
+        return None  # Let the view answer 404
+    return f'reviews-{id}-{post_version}', None
 
-posts_bp = Blueprint('posts', __name__)
 
-# Get All Posts
+# Get All Posts (keyset paginated: ?limit=&cursor=&sort=newest|top-rated|most-reviewed)
+# ?stream=1 (JSON array) or Accept: application/x-ndjson streams every post from the cursor on
+# ?fields=id,title,... selects post fields; ?reviews=summary returns only the rating aggregates
+# Accept: application/msgpack returns MessagePack (when installed)
 @posts_bp.route('/all', methods=['GET'])
 @check_authentication # Authentication Middleware
+@conditional(lambda: feed_validators())
+@cached_json(lambda: f"feed:{sorted(request.args.items(multi=True))}:{stream_format()}", lambda: ('feed',))
 def get_posts():
-    conn = get_db_connection()
+    sort = request.args.get('sort', 'newest')
+    if sort not in FEED_SORTS:
+        return jsonify({"error": f"Invalid sort. Use one of: {', '.join(FEED_SORTS)}"}), 400
+
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # Review lists are only read when they will be sent
+    summary = request.args.get('reviews') == 'summary' or (fields is not None and 'reviews' not in fields)
+
+    limit = parse_limit(request.args.get('limit'))
+    cursor = request.args.get('cursor')
+
+    try:
+        after = decode_cursor(cursor, sort, feed_key_types(sort)) if cursor else None
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_read_db()
+
+    fmt = stream_format()
+    if fmt:
+        return streamed_response(iter_feed(conn, sort, after, summary, fields), fmt)
+
     try:
-        # Modified query to include reviews with the posts
-        posts = conn.execute('''
-            SELECT p.*, u.username
-            FROM posts p
-            LEFT JOIN users u ON p.userId = u.id
-        ''').fetchall()
-
-        if not posts:
+        # Fetch one extra row to know whether another page exists
+        posts, keys = fetch_feed_page(conn, sort, limit + 1, after)
+
+        if not posts and not cursor:
             return jsonify({"message": "No posts found"}), 404
 
-        posts_list = []
-        for post in posts:
-            post_data = dict(post)
+        next_cursor = encode_cursor(sort, keys[limit - 1]) if len(posts) > limit else None
 
-            # Fetch reviews for this post
-            reviews = conn.execute('''
-                SELECT r.rating, r.userId, u.username, r.content
-                FROM reviews r
-                JOIN users u ON r.userId = u.id
-                WHERE r.postId = ?
-            ''', (post_data['id'],)).fetchall()
+        # Reviews and their aggregates for every post are loaded in one batch
+        posts_list = project(attach_reviews(conn, posts[:limit], FEED_REVIEW_COLUMNS, summary), fields)
 
-            # Calculate average rating
-            ratings = [review['rating'] for review in reviews]
-            post_data['reviews'] = {
-                'ratings': [dict(r) for r in reviews],
-                'average': sum(ratings) / len(ratings) if ratings else 0,
-                'count': len(ratings)
-            }
+        return render({
+            "posts": posts_list,
+            "next_cursor": next_cursor
+        })
 
-            posts_list.append(post_data)
+    except sqlite3.Error as e:
+        return jsonify({"error": str(e)}), 500
 
-        return jsonify(posts_list)
+# Top-rated posts, overall or in one location (?location=&limit=), best first.
+# Ranked by the Bayesian score maintained in post_rankings; takes ?fields= and ?reviews=summary like the feed
+@posts_bp.route('/top', methods=['GET'])
+@check_authentication # Authentication Middleware
+@conditional(lambda: feed_validators())
+@cached_json(lambda: f"top:{sorted(request.args.items(multi=True))}", lambda: ('feed',))
+def top_posts():
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    summary = request.args.get('reviews') == 'summary' or (fields is not None and 'reviews' not in fields)
+
+    limit = parse_limit(request.args.get('limit'))
+    location = request.args.get('location', '').strip()
+
+    conn = get_read_db()
+    try:
+        params = (location, limit) if location else (limit,)
+        posts = conn.execute(top_posts_sql(bool(location)), params).fetchall()
+
+        return render({
+            "location": location or None,
+            "posts": project(attach_reviews(conn, posts, FEED_REVIEW_COLUMNS, summary), fields)
+        })
+
+    except sqlite3.Error as e:
+        return jsonify({"error": str(e)}), 500
+
+# Live feed changes as Server-Sent Events: post-created (the post), post-deleted ({id}),
+# post-rating ({id, average, count}) and resync (refetch the feed). Resumes from Last-Event-ID.
+@posts_bp.route('/events', methods=['GET'])
+@check_authentication # Authentication Middleware
+def post_events():
+    broker = get_broker()
+    if broker is None:
+        return jsonify({"error": "Live updates are disabled"}), 404
+
+    try:
+        subscription = broker.subscribe(request.headers.get('Last-Event-ID'))
+    except TooManySubscribers:
+        # Every open stream holds a worker thread; clients fall back to refetching
+        response = jsonify({"error": "Too many live connections"})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+
+    config = current_app.config
+    response = current_app.response_class(
+        event_stream(subscription, config.get('EVENTS_HEARTBEAT', 15), config.get('EVENTS_MAX_AGE', 300)),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Keep reverse proxies from buffering the stream
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    return response
+
+# Full-text search over title, description and location (?q=&limit=&cursor=)
+@posts_bp.route('/search', methods=['GET'])
+@check_authentication # Authentication Middleware
+def search_posts():
+    match = build_match_query(request.args.get('q', ''))
+    if not match:
+        return jsonify({"error": "Search query is required"}), 400
+
+    limit = parse_limit(request.args.get('limit'))
+    cursor = request.args.get('cursor')
+
+    try:
+        after = decode_cursor(cursor, 'search', (SCORE, ROW_ID)) if cursor else None
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_read_db()
+    try:
+        params = (match, *after, limit + 1) if after else (match, limit + 1)
+        rows = [dict(row) for row in conn.execute(search_sql(after is not None), params).fetchall()]
+
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor('search', (rows[limit - 1]['score'], rows[limit - 1]['id']))
+            rows = rows[:limit]
+
+        for row in rows:
+            del row['score']
+            row['snippet'] = highlight_snippet(row['snippet'])
+
+        return jsonify({
+            "posts": attach_reviews(conn, rows, FEED_REVIEW_COLUMNS),
+            "next_cursor": next_cursor
+        })
 
     except sqlite3.Error as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
 
 # Create Post
+def insert_post(conn, user_id, data, created_at):
+    cursor = conn.execute('''
+        INSERT INTO posts 
+        (userId, title, description, createdAt, photo, location)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (
+        user_id,  # Use the userId from the token
+        data['title'],
+        data['description'],
+        created_at,  # Server-generated timestamp
+        data['photo'],
+        data['location']
+    ))
+    return cursor.lastrowid
+
+
 @posts_bp.route('/create', methods=['POST'])
 @check_authentication # Authentication Middleware
 def createPost():
-    conn = None
     try:
         data = request.get_json()
 
         # Validate required fields (excluding userId and reviews)
         required_fields = ['title', 'description', 'photo', 'location']
-        if not all(field in data for field in required_fields):
+        if not all(data.get(field) for field in required_fields):
             return jsonify({"error": "Missing required fields"}), 400
 
-        # Retrieve token from cookie
-        token = request.cookies.get('authCookie')
-        if not token:
-            return jsonify({"error": "Token is missing"}), 401
-
-        try:
-            # Decode the JWT and get the userId from the token
-            payloadJWT = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            user_id = payloadJWT.get("user_id")
-        except jwt.ExpiredSignatureError:
-            return jsonify({"error": "Token has expired"}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({"error": "Invalid token"}), 401
-
-        # Check if the user exists
-        conn = get_db_connection()
-        user = conn.execute('SELECT id FROM users WHERE id = ?', (user_id,)).fetchone()
-        if not user:
-            return jsonify({"error": "User not found"}), 404
-
-        # Insert post with the userId from the token
-        if data['title'] != "" and data['description'] != "" and data['photo'] != "" and data['location'] != "":
-            cursor = conn.execute('''
-                INSERT INTO posts 
-                (userId, title, description, createdAt, photo, location)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                user_id,  # Use the userId from the token
-                data['title'],
-                data['description'],
-                datetime.utcnow().isoformat(),  # Server-generated timestamp
-                data['photo'],
-                data['location']
-            ))
-
-        conn.commit()
+        # The middleware already verified the token; tokens are only issued to existing users at login
+        user_id = current_user_id()
+
+        # Insert post with the userId from the token, through the writer queue
+        post_id = write(insert_post, user_id, data, datetime.utcnow().isoformat())
+
+        invalidate('feed', f"title:{data['title']}")
+        prefetch(data['photo'])  # Thumbnail ready before the first feed view
+
+        if get_broker() is not None:
+            # Live clients get the post in its feed shape, ready to insert
+            conn = get_db()
+            post = attach_reviews(conn, [conn.execute(POST_BY_ID_SQL, (post_id,)).fetchone()], FEED_REVIEW_COLUMNS)[0]
+            publish('post-created', post)
 
         return jsonify({
             "message": "Post created successfully",
-            "post_id": cursor.lastrowid
+            "post_id": post_id
         }), 201
 
     except sqlite3.Error as e:
         return jsonify({"error": f"Database error: {str(e)}"}), 500
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
-    finally:
-        if conn:
-            conn.close()
 
 # Get Post By Title
 @posts_bp.route('/<string:title>', methods=['GET'])
 @check_authentication # Authentication Middleware
+@conditional(lambda title: post_validators(title))
+@cached_json(lambda title: f"post:{title}", lambda title: (f'title:{title}',))
 def get_post_by_title(title):
-    conn = get_db_connection()
+    conn = get_read_db()
 
     try:
-        post = conn.execute('''
-            SELECT p.*, u.username 
-            FROM posts p
-            JOIN users u ON p.userId = u.id
-            WHERE p.title = ?
-        ''', (title,)).fetchone()
+        post = conn.execute(POST_BY_TITLE_SQL, (title,)).fetchone()
 
         if not post:
             return jsonify({"error": "Post Not Found"}), 404
 
-        post_data = dict(post)
-
-        # Fetch reviews for this post
-        reviews = conn.execute('''
-            SELECT r.id, r.rating, r.userId, r.createdAt, u.username
-            FROM reviews r
-            JOIN users u ON r.userId = u.id
-            WHERE r.postId = ?
-        ''', (post_data['id'],)).fetchall()
-
-        # Calculate average rating
-        ratings = [review['rating'] for review in reviews]
-        post_data['reviews'] = {
-            'ratings': [dict(r) for r in reviews],
-            'average': sum(ratings) / len(ratings) if ratings else 0,
-            'count': len(ratings)
-        }
+        post_data = attach_reviews(conn, [post], DETAIL_REVIEW_COLUMNS)[0]
 
         return jsonify(post_data), 200
 
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
-    finally:
-        if conn:
-            conn.close()
 
+# A post's reviews, newest first (keyset paginated: ?limit=&cursor=)
+@posts_bp.route('/<int:id>/reviews', methods=['GET'])
+@check_authentication # Authentication Middleware
+@conditional(lambda id: post_reviews_validators(id))
+def get_post_reviews(id):
+    limit = parse_limit(request.args.get('limit'))
+    cursor = request.args.get('cursor')
+
+    try:
+        after = decode_cursor(cursor, 'reviews', (TIMESTAMP, ROW_ID)) if cursor else None
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_read_db()
+    try:
+        stats = conn.execute(post_stats_sql(1), (id,)).fetchone()
+        if not stats:
+            return jsonify({"error": "Post Not Found"}), 404
+
+        params = (id, *after, limit + 1) if after else (id, limit + 1)
+        reviews = [dict(row) for row in conn.execute(post_reviews_sql(after is not None), params).fetchall()]
+
+        next_cursor = None
+        if len(reviews) > limit:
+            next_cursor = encode_cursor('reviews', (reviews[limit - 1]['createdAt'], reviews[limit - 1]['id']))
+            reviews = reviews[:limit]
+
+        return jsonify({
+            "postId": id,
+            "average": stats['average'],
+            "count": stats['count'],
+            "reviews": reviews,
+            "next_cursor": next_cursor
+        }), 200
+
+    except sqlite3.Error as e:
+        return jsonify({"error": str(e)}), 500
 
-#
 
 # Add a Review
+def save_review(conn, post_id, user_id, rating, content):
+    # Returns (title, message), or None if the post does not exist
+    post = conn.execute('SELECT id, title FROM posts WHERE id = ?', (post_id,)).fetchone()
+    if not post:
+        return None
+
+    # Check if user has a review to update
+    existing_review = conn.execute(
+        'SELECT id, rating FROM reviews WHERE userId = ? AND postId = ?',
+        (user_id, post_id)
+    ).fetchone()
+
+    if not existing_review:
+        # Instead of returning an error, create a new review
+        conn.execute(
+            'INSERT INTO reviews (userId, postId, rating, content, createdAt) VALUES (?, ?, ?, ?, ?)',
+            (user_id, post_id, rating, content, datetime.utcnow().isoformat())
+        )
+        apply_rating_change(conn, post_id, None, rating)
+        return post['title'], "Review created successfully"
+
+    # Update the existing review - ONLY for the current user
+    conn.execute(
+        'UPDATE reviews SET rating = ?, content = ? WHERE userId = ? AND postId = ?',
+        (rating, content, user_id, post_id)
+    )
+    apply_rating_change(conn, post_id, existing_review['rating'], rating)
+    return post['title'], "Review updated successfully"
+
+
 @posts_bp.route('/review/<int:id>', methods=['PUT'])
 @check_authentication
 def update_post_review(id):
-    conn = get_db_connection()
     try:
         data = request.get_json()
         if 'rating' not in data:
@@ -195,56 +355,20 @@ def update_post_review(id):
         # Check if content field exists, set default if not
         content = data.get('content', '')  # Default empty string if not provided
 
-        # Get post to verify it exists
-        post = conn.execute('SELECT id FROM posts WHERE id = ?', (id,)).fetchone()
-        if not post:
+        # Retrieve user ID from the auth context
+        user_id = current_user_id()
+
+        # The writer serializes review writes, so the aggregate delta is based on the current rating
+        saved = write(save_review, id, user_id, data['rating'], content)
+        if saved is None:
             return jsonify({"error": "Post Not Found"}), 404
+        title, message = saved
 
-        # Retrieve user ID from token
-        token = request.cookies.get('authCookie')
-        payloadJWT = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payloadJWT.get("user_id")
-
-        # Check if user has a review to update
-        existing_review = conn.execute(
-            'SELECT id FROM reviews WHERE userId = ? AND postId = ?',
-            (user_id, id)
-        ).fetchone()
-
-        conn.execute('BEGIN TRANSACTION')
-
-        if not existing_review:
-            # Instead of returning an error, create a new review
-            conn.execute(
-                'INSERT INTO reviews (userId, postId, rating, content, createdAt) VALUES (?, ?, ?, ?, ?)',
-                (user_id, id, data['rating'], content, datetime.utcnow().isoformat())
-            )
-            message = "Review created successfully"
-        else:
-            # Update the existing review - ONLY for the current user
-            conn.execute(
-                'UPDATE reviews SET rating = ?, content = ? WHERE userId = ? AND postId = ?',
-                (data['rating'], content, user_id, id)
-            )
-            message = "Review updated successfully"
-
-        conn.execute('COMMIT')
-
-        # Get all reviews for this post to return
-        reviews = conn.execute('''
-            SELECT r.id, r.rating, r.userId, r.content, r.createdAt, u.username
-            FROM reviews r
-            JOIN users u ON r.userId = u.id
-            WHERE r.postId = ?
-        ''', (id,)).fetchall()
-
-        # Calculate average rating
-        ratings = [review['rating'] for review in reviews]
-        review_data = {
-            'ratings': [dict(r) for r in reviews],
-            'average': sum(ratings) / len(ratings) if ratings else 0,
-            'count': len(ratings)
-        }
+        invalidate('feed', f"title:{title}")
+
+        # Get all reviews for this post to return (committed, so the primary has them)
+        review_data = load_reviews(get_db(), [id], REVIEW_RESPONSE_COLUMNS)[id]
+        publish('post-rating', {"id": id, "average": review_data['average'], "count": review_data['count']})
 
         return jsonify({
             "message": message,
@@ -252,49 +376,129 @@ def update_post_review(id):
         }), 200
 
     except sqlite3.Error as e:
-        if conn:
-            conn.execute('ROLLBACK')
         return jsonify({"error": f"Database error: {str(e)}"}), 500
     except Exception as e:
-        if conn:
-            conn.execute('ROLLBACK')
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
-    finally:
-        if conn:
-            conn.close()
-            
-            
+
+
+def validate_review_item(item):
+    # Returns an error message for one batch item, or None
+    if not isinstance(item, dict):
+        return "Each review must be an object"
+    if not isinstance(item.get('postId'), int) or isinstance(item.get('postId'), bool):
+        return "postId must be an integer"
+    rating = item.get('rating')
+    if not isinstance(rating, int) or isinstance(rating, bool) or not (1 <= rating <= 5):
+        return "Rating must be an integer between 1 and 5"
+    if not isinstance(item.get('content', ''), str):
+        return "content must be a string"
+    return None
+
+
+def save_reviews(conn, user_id, reviews, created_at):
+    # reviews maps postId -> (rating, content); returns (missing postIds, titles, number updated)
+    post_ids = list(reviews)
+
+    titles = {row['id']: row['title'] for row in conn.execute(posts_by_ids_sql(len(post_ids)), post_ids)}
+    missing = [post_id for post_id in post_ids if post_id not in titles]
+    if missing:
+        return missing, titles, 0
+
+    existing = {
+        row['postId']: row['rating']
+        for row in conn.execute(user_ratings_sql(len(post_ids)), (user_id, *post_ids))
+    }
+
+    conn.executemany(REVIEW_UPSERT_SQL, [
+        (user_id, post_id, rating, content, created_at)
+        for post_id, (rating, content) in reviews.items()
+    ])
+    apply_rating_changes(conn, [
+        (post_id, existing.get(post_id), rating)
+        for post_id, (rating, _) in reviews.items()
+    ])
+    return [], titles, len(existing)
+
+
+# Add or update many reviews at once: [{postId, rating, content}, ...] or {"reviews": [...]}
+@posts_bp.route('/reviews/batch', methods=['POST'])
+@check_authentication
+def batch_reviews():
+    try:
+        data = request.get_json(silent=True)
+        items = data.get('reviews') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "A non-empty list of reviews is required"}), 400
+        if len(items) > REVIEW_BATCH_MAX:
+            return jsonify({"error": f"At most {REVIEW_BATCH_MAX} reviews per batch"}), 400
+
+        # Validate everything before touching the database; the batch is all or nothing
+        errors = []
+        for index, item in enumerate(items):
+            error = validate_review_item(item)
+            if error:
+                errors.append({"index": index, "error": error})
+        if errors:
+            return jsonify({"error": "Invalid reviews", "details": errors}), 400
+
+        # A post listed twice keeps its last review
+        reviews = {item['postId']: (item['rating'], item.get('content', '')) for item in items}
+        post_ids = list(reviews)
+
+        user_id = current_user_id()
+        created_at = datetime.utcnow().isoformat()
+
+        missing, titles, updated = write(save_reviews, user_id, reviews, created_at)
+        if missing:
+            return jsonify({"error": "Post Not Found", "postIds": missing}), 404
+
+        invalidate('feed', *(f"title:{title}" for title in set(titles.values())))
+
+        # Updated aggregates of every affected post in one query
+        stats = [dict(row) for row in get_db().execute(post_stats_sql(len(post_ids)), post_ids)]
+        for row in stats:
+            publish('post-rating', {"id": row['postId'], "average": row['average'], "count": row['count']})
+
+        return jsonify({
+            "message": "Reviews saved successfully",
+            "created": len(post_ids) - updated,
+            "updated": updated,
+            "posts": stats
+        }), 200
+
+    except sqlite3.Error as e:
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+    except Exception as e:
+        return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
+
+
+def remove_post(conn, post_id, user_id):
+    # Returns the deleted post's title, or None if the user has no such post
+    # The title is needed to invalidate the cached post detail
+    post = conn.execute('SELECT title FROM posts WHERE id = ? AND userId = ?', (post_id, user_id)).fetchone()
+    if not post:
+        return None
+
+    # Now, use the user_id in your DELETE query
+    conn.execute('DELETE FROM posts WHERE id = ? AND userId = ?', (post_id, user_id))
+
+    # The post's reviews (and with the row, its rating aggregates) go in the same transaction
+    conn.execute('DELETE FROM reviews WHERE postId = ?', (post_id,))
+    return post['title']
+
+
 @posts_bp.route('/delete/<int:id>', methods=['DELETE'])
 @check_authentication
 def delete_Post(id):
-    conn = get_db_connection()
     try:
-        token = request.cookies.get('authCookie')
-        if not token:
-            conn.close()
-            return jsonify({"error": "Token is missing"}), 401
-
-        try:
-            payloadJWT = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            user_id = payloadJWT.get("user_id")
-            if user_id is None:
-                conn.close()
-                return jsonify({"error": "Invalid token"}), 401
-        except jwt.ExpiredSignatureError:
-            conn.close()
-            return jsonify({"error": "Token has expired"}), 401
-        except jwt.InvalidTokenError:
-            conn.close()
-            return jsonify({"error": "Invalid token"}), 401
-
-        # Now, use the user_id in your DELETE query
-        cursor = conn.execute('DELETE FROM posts WHERE id = ? AND userId = ?', (id, user_id))
-
-        if cursor.rowcount == 0:
-            conn.close()
+        user_id = current_user_id()
+
+        title = write(remove_post, id, user_id)
+        if title is None:
             return jsonify({"error": "Post Not Found or You Don't Own It"}), 404
 
-        conn.commit()
+        invalidate('feed', f"title:{title}")
+        publish('post-deleted', {"id": id})
         return jsonify({"message": "Post deleted successfully"}), 200
 
     except sqlite3.Error as e:
@@ -302,7 +506,3 @@ def delete_Post(id):
 
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
-
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
@@ -1,35 +1,38 @@
-from flask import Blueprint, jsonify, request, make_response
+from flask import Blueprint, jsonify, request, make_response, current_app
 import sqlite3
-from werkzeug.security import generate_password_hash, check_password_hash
 
 import json
 import jwt
 import datetime
 import uuid
-
-# .env 
-from dotenv import load_dotenv
-import os
-
-load_dotenv(dotenv_path='../.env')
-SECRET_KEY = os.getenv('SECRET_KEY')
-ALGORITHM = os.getenv('ALGORITHM')
+import hashlib
+
+from database.connection import get_db, get_read_db
+from middleware.checkAuthentication import check_authentication, current_user_id, verify_token
+from middleware.rateLimit import rate_limit, client_ip, submitted_username
+from services.passwords import get_hasher, HashingBusy
+from database.versions import get_data_version
+from services.conditional import not_modified, with_validators
+from services.streaming import stream_format, streamed_response
+from database.queries import attach_reviews, iter_posts, profile_posts_sql, PROFILE_REVIEW_COLUMNS
+from database.pagination import encode_cursor, decode_cursor, parse_limit, InvalidCursor, ROW_ID, TIMESTAMP
 
 user_bp = Blueprint('user', __name__) # Blueprint for user-related routes
 
 
-def get_db_connection(): # Database connection function
-    conn = sqlite3.connect('database/app.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
 def generate_user_id():
     return str(uuid.uuid4())
 
+
+def busy_response(error):
+    response = jsonify({"error": str(error)})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 # Register
 @user_bp.route('/register', methods=['POST'])
 def register():
-    conn = get_db_connection()
+    conn = get_db()
     try:
         data = request.get_json()
 
@@ -55,15 +58,15 @@ def register():
         if len(password) > 50:
             return jsonify({"error": "Password Cannot Be Longer Than 50 Characters"}), 400
 
-        # Hash the password
-        hashed_password = generate_password_hash(password)
-
-        # Check for existing username
+        # Check for existing username (before spending a hash on it)
         existing_user = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
 
         if existing_user:
             return jsonify({"error": "Username already exists"}), 409
 
+        # Hash the password (in the hashing worker pool)
+        hashed_password = get_hasher().hash(password)
+
         # Generate user ID
         user_id = generate_user_id()  # Generate random UUID
 
@@ -76,18 +79,19 @@ def register():
 
         return jsonify({"message": "User registered successfully", "user_id": user_id}), 201
 
+    except HashingBusy as e:
+        return busy_response(e)
     except sqlite3.Error as e:
         return jsonify({"error": f"Database error: {str(e)}"}), 500
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
-    finally:
-        if conn:
-            conn.close()
 
-# Login
+# Login (rate limited per client IP and per username)
 @user_bp.route('/login', methods=['POST'])
+@rate_limit('login-ip', client_ip, 'LOGIN_RATE_PER_IP')
+@rate_limit('login-user', submitted_username, 'LOGIN_RATE_PER_USERNAME')
 def login():
-    conn = get_db_connection()
+    conn = get_db()
     try:
         data = request.get_json()
         if not data or 'username' not in data or 'password' not in data:
@@ -98,15 +102,21 @@ def login():
 
         # Look up the user
         user = conn.execute('SELECT id, password FROM users WHERE username = ?', (username,)).fetchone()
-        if user is None or not check_password_hash(user['password'], password):
+        hasher = get_hasher()
+        if user is None or not hasher.check(user['password'], password):
             return jsonify({"error": "Invalid credentials"}), 401
 
+        # Upgrade hashes made with an older KDF setting while the password is at hand
+        if hasher.needs_rehash(user['password']):
+            conn.execute('UPDATE users SET password = ? WHERE id = ?', (hasher.hash(password), user['id']))
+            conn.commit()
+
         # Create a JWT payload with an expiration time (6 Hours)
         payloadJWT = {
             'user_id': user['id'],
             'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=6)
         }
-        token = jwt.encode(payloadJWT, SECRET_KEY, algorithm=ALGORITHM)
+        token = jwt.encode(payloadJWT, current_app.config['SECRET_KEY'], algorithm=current_app.config['ALGORITHM'])
 
         # Build the response
         response = make_response(jsonify({
@@ -126,30 +136,37 @@ def login():
 
         return response
 
+    except HashingBusy as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
 
 
+# Profile: the user and a page of their posts with rating aggregates (?limit=&cursor=);
+# ?include=reviews adds each post's reviews, loaded in one batch for the page.
+# Full review lists are paginated separately at /posts/<id>/reviews
 @user_bp.route('/profile', methods=['GET'])
+@check_authentication # Authentication Middleware
 def profile():
-    conn = get_db_connection()
-    # Retrieve token from cookie
-    token = request.cookies.get('authCookie')
-    if not token:
-        return jsonify({"error": "Token is missing"}), 401
+    user_id = current_user_id()
+    include_reviews = 'reviews' in request.args.get('include', '').split(',')
+    limit = parse_limit(request.args.get('limit'))
+    cursor = request.args.get('cursor')
 
     try:
-        payloadJWT = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]) # Decode the token and verify its signature and expiration
-        user_id = payloadJWT.get("user_id")
+        after = decode_cursor(cursor, 'profile', (TIMESTAMP, ROW_ID)) if cursor else None
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
 
-    except jwt.ExpiredSignatureError:
-        return jsonify({"error": "Token has expired"}), 401
-
-    except jwt.InvalidTokenError:
-        return jsonify({"error": "Invalid token"}), 401
+    conn = get_read_db()
 
+    # Conditional GET: the ETag is per user (hashed), per global data version and per representation
+    version, last_modified = get_data_version(conn)
+    fmt = stream_format()
+    etag = f"profile-{hashlib.sha256(str(user_id).encode()).hexdigest()[:16]}-{version}" + (f"-{fmt}" if fmt else "")
+    unchanged = not_modified(etag, last_modified)
+    if unchanged is not None:
+        return unchanged
 
     try:
         user = conn.execute('SELECT id, username FROM users WHERE id = ?', (user_id,)).fetchone() # Get User Info
@@ -157,52 +174,33 @@ def profile():
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        # Get User Posts with reviews
-        posts = conn.execute('''
-            SELECT p.*
-            FROM posts p
-            WHERE p.userId = ?
-        ''', (user_id,)).fetchall()
-
-        if not posts:
-            return jsonify({
-                "id": user['id'],
-                "username": user['username'],
-                "posts": []
-            }), 200
-
-        posts_list = []
-        for post in posts:
-            post_data = dict(post)
-
-            # Get reviews for this post
-            reviews = conn.execute('''
-                SELECT r.rating, r.userId, u.username
-                FROM reviews r
-                JOIN users u ON r.userId = u.id
-                WHERE r.postId = ?
-            ''', (post_data['id'],)).fetchall()
-
-            # Calculate average rating
-            ratings = [review['rating'] for review in reviews]
-            post_data['reviews'] = {
-                'ratings': [dict(r) for r in reviews],
-                'average': sum(ratings) / len(ratings) if ratings else 0,
-                'count': len(ratings)
-            }
-
-            posts_list.append(post_data)
-
-        return jsonify({
-            "id": user['id'],
-            "username": user['username'],
-            "posts": posts_list
-        }), 200
+        user_data = {"id": user['id'], "username": user['username']}
+        sql = profile_posts_sql(after is not None)
+        params = (user_id, *after) if after else (user_id,)
+
+        # Large profiles can be streamed from the cursor on (?stream=1 or Accept: application/x-ndjson)
+        if fmt:
+            posts = iter_posts(conn, conn.execute(sql, (*params, -1)), PROFILE_REVIEW_COLUMNS, summary=not include_reviews)
+            prefix = current_app.json.dumps(user_data)[:-1] + ',"posts":['
+            response = streamed_response(posts, fmt, prefix=prefix, suffix=']}', head=user_data)
+            return with_validators(response, etag, last_modified), 200
+
+        # Fetch one extra row to know whether another page exists
+        posts = conn.execute(sql, (*params, limit + 1)).fetchall()
+
+        next_cursor = None
+        if len(posts) > limit:
+            next_cursor = encode_cursor('profile', (posts[limit - 1]['createdAt'], posts[limit - 1]['id']))
+            posts = posts[:limit]
+
+        return with_validators(jsonify({
+            **user_data,
+            "posts": attach_reviews(conn, posts, PROFILE_REVIEW_COLUMNS, summary=not include_reviews),
+            "next_cursor": next_cursor
+        }), etag, last_modified), 200
 
     except sqlite3.Error as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
 
 
 # Logout
@@ -221,7 +219,7 @@ def check_status():
         return jsonify({"logged_in": False}), 200
 
     try:
-        payloadJWT = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payloadJWT = verify_token(token)
         user_id = payloadJWT.get("user_id")
         return jsonify({"logged_in": True, "user_id": user_id}), 200
     except jwt.ExpiredSignatureError:
@@ -0,0 +1,58 @@
+from functools import wraps
+
+from flask import current_app, g, request
+
+from services.encoding import representation_etags
+
+# Conditional GET support: views declare how to compute their validators cheaply,
+# and unchanged resources are answered with an empty 304 before any heavy work.
+
+
+def not_modified(etag, last_modified=None):
+    # Returns a 304 response if the client's copy is current, otherwise None
+    if request.if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+        if not any(request.if_none_match.contains(candidate) for candidate in representation_etags(etag)):
+            return None
+    elif not (last_modified and request.if_modified_since and last_modified <= request.if_modified_since):
+        return None
+
+    response = current_app.response_class(status=304)
+    return with_validators(response, etag, last_modified)
+
+
+def with_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Authenticated content: browsers may keep it, but must revalidate every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    response.vary.add('Accept')  # JSON vs NDJSON representations
+    return response
+
+
+def conditional(validators_func):
+    # validators_func receives the view arguments and returns (etag, last_modified) or None
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            validators = validators_func(*args, **kwargs)
+            if validators is None:
+                return f(*args, **kwargs)
+
+            etag, last_modified = validators
+            response = not_modified(etag, last_modified)
+            if response is not None:
+                return response
+
+            # Lets the response cache key its entries by the same version
+            g.etag = etag
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                with_validators(response, etag, last_modified)
+            return response
+
+        return decorated_function
+
+    return decorator
@@ -0,0 +1,120 @@
+import zlib
+
+from flask import current_app, jsonify, request
+
+# Response encodings: optional MessagePack bodies (Accept: application/msgpack) and
+# gzip/brotli content coding negotiated from Accept-Encoding. Compressed representations
+# get their own ETag (the plain ETag plus '-gzip' / '-br').
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, 'application/x-msgpack')
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', MSGPACK_MIMETYPE}
+
+# Content codings in server preference order; brotli only when the module is installed
+ENCODINGS = ('br', 'gzip')
+
+
+def _msgpack():
+    try:
+        import msgpack  # Optional dependency
+    except ImportError:
+        return None
+    return msgpack
+
+
+def _brotli():
+    try:
+        import brotli  # Optional dependency
+    except ImportError:
+        return None
+    return brotli
+
+
+def wants_msgpack():
+    best = request.accept_mimetypes.best_match(['application/json', *MSGPACK_MIMETYPES])
+    return best in MSGPACK_MIMETYPES and _msgpack() is not None
+
+
+def render(payload, status=200):
+    # jsonify, or MessagePack when the client prefers it
+    if wants_msgpack():
+        body = _msgpack().packb(payload, use_bin_type=True)
+        return current_app.response_class(body, status=status, mimetype=MSGPACK_MIMETYPE)
+    return jsonify(payload), status
+
+
+def negotiate_encoding():
+    available = [encoding for encoding in ENCODINGS if encoding != 'br' or _brotli() is not None]
+    # Highest client quality wins; ties go to the server's preference order
+    best = max(available, key=lambda encoding: request.accept_encodings[encoding])
+    return best if request.accept_encodings[best] > 0 else None
+
+
+def _compressor(encoding):
+    config = current_app.config
+    if encoding == 'br':
+        brotli = _brotli()
+        compressor = brotli.Compressor(quality=config.get('BROTLI_QUALITY', 5))
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(config.get('GZIP_LEVEL', 6), zlib.DEFLATED, 31)  # 31: gzip container
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _compress_stream(chunks, compressor):
+    compress, flush, finish = compressor
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        # Flushed per chunk so every streamed chunk reaches the client right away
+        data = compress(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+def compress_response(response):
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES and response.status_code != 304:
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = negotiate_encoding()
+    if encoding is None or 'Content-Encoding' in response.headers:
+        return response
+
+    etag, weak = response.get_etag()
+
+    if response.status_code == 304:
+        # Name the representation the client already has
+        if etag and request.if_none_match.contains(f'{etag}-{encoding}'):
+            response.set_etag(f'{etag}-{encoding}', weak)
+        return response
+
+    if response.status_code != 200 or response.direct_passthrough:
+        return response
+
+    if response.is_streamed:
+        # The compressor is built now: the body is generated after the app context is gone
+        response.response = _compress_stream(response.response, _compressor(encoding))
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config.get('COMPRESS_MIN_SIZE', 1024):
+            return response
+        compress, _, finish = _compressor(encoding)
+        response.set_data(compress(data) + finish())
+
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+
+def representation_etags(etag):
+    # Every ETag a client may hold for this resource version
+    return [etag] + [f'{etag}-{encoding}' for encoding in ENCODINGS]
+
+
+def init_app(app):
+    if app.config.get('COMPRESSION_ENABLED', True):
+        app.after_request(compress_response)
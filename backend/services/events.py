@@ -0,0 +1,221 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from flask import current_app
+
+# Server-Sent Events for feed changes (GET /posts/events).
+#
+# Write routes publish compact events (post-created, post-deleted, post-rating) to a broker
+# that fans them out to every open stream. Each subscriber has a bounded buffer: a client
+# too slow to keep up is never allowed to hold up publishers or grow memory; its buffer is
+# dropped and it gets a 'resync' event instead, telling it to refetch the feed. The last
+# EVENTS_HISTORY events are kept in a ring buffer, so a reconnecting client (Last-Event-ID)
+# gets what it missed replayed, or a 'resync' when it has been gone too long.
+#
+# Event ids are '<stream>-<sequence>'. The memory broker's stream id changes on restart,
+# so ids from before a restart resync instead of silently skipping events. With several
+# worker processes use EVENTS_BACKEND=redis: events then go through a Redis channel and
+# every process delivers all of them.
+
+RESYNC = 'event: resync\ndata: {}\n\n'
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, max_pending):
+        self.max_pending = max_pending
+        self.overflowed = False
+        self._events = deque()
+        self._ready = threading.Condition()
+
+    def push(self, text):
+        with self._ready:
+            if self.overflowed:
+                return
+            if len(self._events) >= self.max_pending:
+                # Slow consumer: everything buffered is superseded by a resync
+                self._events.clear()
+                self.overflowed = True
+            else:
+                self._events.append(text)
+            self._ready.notify()
+
+    def resync(self):
+        with self._ready:
+            self._events.clear()
+            self.overflowed = True
+            self._ready.notify()
+
+    def get(self, timeout):
+        # Returns the buffered event texts (possibly just RESYNC), or [] after timeout
+        with self._ready:
+            self._ready.wait_for(lambda: self._events or self.overflowed, timeout)
+            if self.overflowed:
+                self.overflowed = False
+                return [RESYNC]
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+
+class EventBroker:
+    def __init__(self, history=1000, max_pending=256, max_subscribers=8):
+        self.max_pending = max_pending
+        self.max_subscribers = max_subscribers
+        self.stream = uuid.uuid4().hex[:8]
+
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history)  # (sequence, text), oldest first
+        self._sequence = 0
+        self._subscribers = set()
+
+    def publish(self, event, data):
+        with self._lock:
+            self._sequence += 1
+            self._deliver(self._sequence, format_event(f'{self.stream}-{self._sequence}', event, data))
+
+    def _deliver(self, sequence, text):
+        # Caller holds self._lock, so replay in subscribe() and live delivery never overlap
+        self._history.append((sequence, text))
+        for subscription in self._subscribers:
+            subscription.push(text)
+
+    def subscribe(self, last_event_id=None):
+        subscription = Subscription(self.max_pending)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers()
+
+            if last_event_id:
+                after = self._resume_point(last_event_id)
+                if after is None:
+                    subscription.resync()
+                else:
+                    for sequence, text in self._history:
+                        if sequence > after:
+                            subscription.push(text)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def _resume_point(self, last_event_id):
+        # Sequence to replay after, or None when the client missed more than the history holds
+        stream, _, sequence = last_event_id.rpartition('-')
+        if stream != self.stream or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        oldest = self._history[0][0] if self._history else self._sequence + 1
+        if sequence > self._sequence or sequence < oldest - 1:
+            return None
+        return sequence
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+
+class RedisBroker(EventBroker):
+    # Publishes through a Redis channel; each process relays the channel to its own subscribers
+    def __init__(self, client, channel='maseixame:events', **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+        self.channel = channel
+        self.stream = 'r'  # Sequences come from one Redis counter, shared by every process
+        self._pid = None
+        self._started = threading.Lock()
+
+    def publish(self, event, data):
+        import redis
+
+        try:
+            sequence = self.client.incr(f'{self.channel}:sequence')
+            self.client.publish(self.channel, json.dumps({'sequence': sequence, 'event': event, 'data': data}))
+        except redis.RedisError as e:
+            # The write itself succeeded; its event is lost and clients catch up on their next fetch
+            current_app.logger.warning("Could not publish %s event: %s", event, e)
+
+    def subscribe(self, last_event_id=None):
+        self._ensure_listening()
+        return super().subscribe(last_event_id)
+
+    def _ensure_listening(self):
+        if self._pid != os.getpid():
+            with self._started:
+                if self._pid != os.getpid():
+                    threading.Thread(target=self._listen, name='events-relay', daemon=True).start()
+                    self._pid = os.getpid()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    event = json.loads(message['data'])
+                    text = format_event(f"{self.stream}-{event['sequence']}", event['event'], event['data'])
+                    with self._lock:
+                        self._sequence = max(self._sequence, event['sequence'])
+                        self._deliver(event['sequence'], text)
+            except Exception:
+                # Whatever was published meanwhile is lost: every subscriber has to resync
+                with self._lock:
+                    for subscription in self._subscribers:
+                        subscription.resync()
+                time.sleep(1)
+
+
+def format_event(event_id, event, data):
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+def event_stream(subscription, heartbeat=15, max_age=300, retry=3000):
+    # SSE body: events as they come, a comment line every `heartbeat` seconds so dead
+    # connections are noticed, and an end after `max_age` seconds; the browser then
+    # reconnects (after `retry` ms) with Last-Event-ID and gets the gap replayed.
+    # Unsubscribing is left to the response's close, which also runs if this never starts.
+    deadline = time.monotonic() + max_age
+    yield f'retry: {retry}\n\n'
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        events = subscription.get(min(heartbeat, remaining))
+        yield ''.join(events) if events else ': keepalive\n\n'
+
+
+def get_broker():
+    return current_app.extensions.get('event_broker')
+
+
+def publish(event, data):
+    broker = get_broker()
+    if broker is not None:
+        broker.publish(event, data)
+
+
+def create_broker(config):
+    backend = config.get('EVENTS_BACKEND', 'memory')
+    options = {
+        'history': config.get('EVENTS_HISTORY', 1000),
+        'max_pending': config.get('EVENTS_MAX_PENDING', 256),
+        'max_subscribers': config.get('EVENTS_MAX_SUBSCRIBERS', 8),
+    }
+    if backend == 'memory':
+        return EventBroker(**options)
+    if backend == 'redis':
+        import redis  # Optional dependency, only needed when several workers share events
+
+        return RedisBroker(redis.Redis.from_url(config.get('EVENTS_REDIS_URL', 'redis://localhost:6379/0')), **options)
+    raise ValueError(f"Unknown events backend: {backend}")
+
+
+def init_app(app):
+    if app.config.get('EVENTS_BACKEND', 'memory') == 'none':
+        return
+    app.extensions['event_broker'] = create_broker(app.config)
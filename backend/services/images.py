@@ -0,0 +1,298 @@
+import hashlib
+import http.client
+import importlib.util
+import io
+import ipaddress
+import os
+import socket
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from database.writer import write
+
+# Thumbnails of post photos, served by the backend instead of the third-party originals.
+#
+# A photo URL is fetched once (right after the post is created, or on the first request)
+# and scaled to fit THUMBNAIL_SIZE. Thumbnails are stored under THUMBNAIL_DIR named by the
+# SHA-256 of their bytes, so identical images share a file. The image_cache table maps
+# each source URL to its file; least recently used entries are evicted once the files
+# exceed THUMBNAIL_CACHE_BYTES. Changes to image_cache go through the writer queue. Pillow
+# is optional: without it the thumbnail URL redirects to the original photo.
+
+THUMBNAIL_CONTENT_TYPE = 'image/jpeg'
+
+# accessedAt is refreshed at most this often, so a cache hit is usually read-only
+TOUCH_INTERVAL = 3600
+
+
+class ImageUnavailable(Exception):
+    pass
+
+
+def touch_entry(conn, key, accessed_at):
+    conn.execute('UPDATE image_cache SET accessedAt = ? WHERE sourceKey = ?', (accessed_at, key))
+
+
+def save_entry(conn, key, digest, size, accessed_at):
+    conn.execute(
+        'INSERT OR REPLACE INTO image_cache (sourceKey, digest, size, accessedAt) VALUES (?, ?, ?, ?)',
+        (key, digest, size, accessed_at)
+    )
+
+
+def evict_entries(conn, max_bytes):
+    # Drops least recently used entries down to 90% of max_bytes once it is exceeded; returns
+    # the digests no entry refers to any more, whose files can go
+    total = conn.execute(
+        'SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM image_cache GROUP BY digest)'
+    ).fetchone()[0]
+    if total <= max_bytes:
+        return []
+
+    target = max_bytes * 0.9
+    evicted = []
+    for row in conn.execute('SELECT sourceKey, digest, size FROM image_cache ORDER BY accessedAt'):
+        if total <= target:
+            break
+        evicted.append(row)
+        total -= row['size']
+
+    conn.executemany('DELETE FROM image_cache WHERE sourceKey = ?', [(row['sourceKey'],) for row in evicted])
+    return [digest for digest in {row['digest'] for row in evicted}
+            if conn.execute('SELECT 1 FROM image_cache WHERE digest = ?', (digest,)).fetchone() is None]
+
+
+def public_addresses(host, port):
+    # Resolves a photo host, refusing it if any address is private, loopback, link-local...
+    try:
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise ImageUnavailable("Photo host not found")
+    for address in addresses:
+        if not ipaddress.ip_address(address[4][0]).is_global:
+            raise ImageUnavailable("Photo host is not public")
+    return addresses
+
+
+def connect_public(address, timeout, source_address=None):
+    # Connects to the addresses that were just checked, never to a second lookup of the name,
+    # so a host cannot pass the check with a public address and then rebind to a private one
+    host, port = address
+    error = None
+    for *_, sockaddr in public_addresses(host, port):
+        try:
+            return socket.create_connection((sockaddr[0], port), timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+# The name stays the connection's host, so the Host header, SNI and certificate check use it
+class PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connect_public
+
+
+class PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connect_public
+
+
+class PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(PublicHTTPConnection, req)
+
+
+class PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(PublicHTTPSConnection, req, context=self._context)
+
+
+def source_key(url):
+    # Stable id of a source URL; part of the thumbnail URL, so it changes when the photo does
+    return hashlib.sha256(url.encode()).hexdigest()[:32]
+
+
+def is_supported_url(url):
+    parsed = urllib.parse.urlsplit(url)
+    return parsed.scheme in ('http', 'https') and bool(parsed.hostname)
+
+
+def thumbnail_url(post_id, photo):
+    # None when the photo could never be fetched, so no post links to a thumbnail that fails
+    if not is_supported_url(photo):
+        return None
+    return f'/images/posts/{post_id}/{source_key(photo)}'
+
+
+class ImageStore:
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, size=400, quality=80,
+                 timeout=5, max_source_bytes=10 * 1024 * 1024, allow_private_hosts=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = size
+        self.quality = quality
+        self.timeout = timeout
+        self.max_source_bytes = max_source_bytes
+        self.allow_private_hosts = allow_private_hosts
+
+        # One ingest per source at a time; concurrent requests for it wait and reuse the result
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest[:2], f'{digest}.jpg')
+
+    def lookup(self, conn, key):
+        row = conn.execute('SELECT digest, accessedAt FROM image_cache WHERE sourceKey = ?', (key,)).fetchone()
+        if row is None or not os.path.exists(self.path(row['digest'])):
+            return None
+
+        now = int(time.time())
+        if now - row['accessedAt'] > TOUCH_INTERVAL:
+            write(touch_entry, key, now)
+        return row['digest']
+
+    def get(self, conn, url):
+        # Returns the thumbnail digest for a source URL, ingesting it if needed
+        key = source_key(url)
+        digest = self.lookup(conn, key)
+        if digest is not None:
+            return digest
+
+        with self._locks_guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            try:
+                digest = self.lookup(conn, key)  # Ingested while we waited
+                if digest is None:
+                    digest = self._ingest(key, url)
+                return digest
+            finally:
+                with self._locks_guard:
+                    self._locks.pop(key, None)
+
+    def _ingest(self, key, url):
+        data = self._render(self._fetch(url))
+        digest = hashlib.sha256(data).hexdigest()
+        self._write(digest, data)
+
+        write(save_entry, key, digest, len(data), int(time.time()))
+        self._evict()
+        return digest
+
+    def _check_host(self, url):
+        if not is_supported_url(url):
+            raise ImageUnavailable("Unsupported photo URL")
+        if self.allow_private_hosts:
+            return
+
+        # Keep user-supplied URLs from reaching internal services. Checked again on connecting
+        # (see connect_public), as the name may resolve differently by then
+        parsed = urllib.parse.urlsplit(url)
+        public_addresses(parsed.hostname, parsed.port)
+
+    def _fetch(self, url):
+        self._check_host(url)
+        store = self
+
+        class CheckedRedirects(urllib.request.HTTPRedirectHandler):
+            # A public URL must not be able to redirect the fetch to a private one
+            def redirect_request(self, req, fp, code, msg, headers, newurl):
+                store._check_host(newurl)
+                return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+        handlers = [CheckedRedirects]
+        if not self.allow_private_hosts:
+            # Direct connections only: through a proxy, the address checked would be the proxy's
+            handlers += [urllib.request.ProxyHandler({}), PublicHTTPHandler, PublicHTTPSHandler]
+        opener = urllib.request.build_opener(*handlers)
+        request = urllib.request.Request(url, headers={'User-Agent': 'maseixame-thumbnailer'})
+        try:
+            with opener.open(request, timeout=self.timeout) as response:
+                data = response.read(self.max_source_bytes + 1)
+        except (OSError, ValueError) as e:
+            raise ImageUnavailable(f"Could not fetch photo: {e}")
+        if len(data) > self.max_source_bytes:
+            raise ImageUnavailable("Photo is too large")
+        return data
+
+    def _render(self, data):
+        from PIL import Image, ImageOps  # Optional dependency; see init_app
+
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.draft('RGB', (self.size, self.size))  # Lets JPEG decode at reduced scale
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((self.size, self.size))
+                output = io.BytesIO()
+                image.convert('RGB').save(output, 'JPEG', quality=self.quality, optimize=True)
+                return output.getvalue()
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            raise ImageUnavailable(f"Photo is not a usable image: {e}")
+
+    def _write(self, digest, data):
+        path = self.path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name and renamed, so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _evict(self):
+        for digest in write(evict_entries, self.max_bytes):
+            try:
+                os.remove(self.path(digest))
+            except FileNotFoundError:
+                pass
+
+
+def get_store():
+    return current_app.extensions.get('image_store')
+
+
+def prefetch(url):
+    # Ingests a new post's photo in the background, so the first feed view finds it ready
+    app = current_app._get_current_object()
+    executor = app.extensions.get('image_prefetch')
+    if executor is None or not is_supported_url(url):
+        return
+
+    def run():
+        from database.connection import get_db
+
+        with app.app_context():
+            try:
+                get_store().get(get_db(), url)
+            except ImageUnavailable:
+                pass  # Retried (and reported) when the thumbnail is requested
+
+    executor.submit(run)
+
+
+def init_app(app):
+    if importlib.util.find_spec('PIL') is None:  # Checked without importing it; it loads on the first thumbnail
+        app.logger.warning("Pillow is not installed; thumbnail URLs will redirect to the original photos")
+        return
+
+    app.extensions['image_store'] = ImageStore(
+        os.path.abspath(app.config.get('THUMBNAIL_DIR', 'media/thumbnails')),  # send_file resolves relative paths against the app root
+        max_bytes=app.config.get('THUMBNAIL_CACHE_BYTES', 512 * 1024 * 1024),
+        size=app.config.get('THUMBNAIL_SIZE', 400),
+        timeout=app.config.get('IMAGE_FETCH_TIMEOUT', 5),
+        max_source_bytes=app.config.get('IMAGE_MAX_BYTES', 10 * 1024 * 1024),
+        allow_private_hosts=app.config.get('IMAGE_ALLOW_PRIVATE_HOSTS', False)
+    )
+    if app.config.get('THUMBNAIL_PREFETCH', True):
+        app.extensions['image_prefetch'] = ThreadPoolExecutor(max_workers=2, thread_name_prefix='thumbnails')
@@ -0,0 +1,84 @@
+import threading
+
+# In-process metrics registry rendered in the Prometheus text exposition format
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labels=('route', 'method')):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for label_values, series in items:
+            labels = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{labels}}} {series[-2]}')
+            lines.append(f'{self.name}_count{{{labels}}} {series[-1]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = []
+        self.collectors = []  # Callables returning extra exposition lines (e.g. cache counters)
+
+    def histogram(self, *args, **kwargs):
+        histogram = Histogram(*args, **kwargs)
+        self.histograms.append(histogram)
+        return histogram
+
+    def render(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+def counter_lines(name, help_text, value):
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} counter', f'{name} {value}']
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    'http_request_duration_seconds', "Request latency by route.",
+    (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+request_queries = registry.histogram(
+    'http_request_sql_queries', "SQL statements issued per request by route.",
+    (0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+request_db_time = registry.histogram(
+    'http_request_sql_duration_seconds', "Time spent in SQLite per request by route.",
+    (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+job_duration = registry.histogram(
+    'maintenance_job_duration_seconds', "Background maintenance job run time by job and outcome.",
+    (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300), labels=('job', 'status')
+)
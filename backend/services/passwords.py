@@ -0,0 +1,130 @@
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+# Password hashing off the request threads. The KDF runs in a small process pool, so a
+# burst of logins costs at most PASSWORD_WORKERS cores and never holds the GIL of the
+# process serving the feed. Callers beyond PASSWORD_MAX_PENDING are turned away.
+#
+# PASSWORD_HASH_METHOD is any werkzeug method string, e.g. 'scrypt:32768:8:1' or
+# 'pbkdf2:sha256:600000'. Stored hashes carry their own parameters, so changing it
+# only affects new hashes (and rehashes on the next successful login).
+#
+# multiprocessing and the process pool are imported on first use: a worker that only
+# serves the feed never loads them.
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+# werkzeug's costs for a bare 'scrypt' (n, r, p); a bare 'pbkdf2' is sha256 with DEFAULT_PBKDF2_ITERATIONS
+SCRYPT_DEFAULTS = (32768, 8, 1)
+
+
+def parse_method(method):
+    # 'pbkdf2:sha256:600000' -> ('pbkdf2', ('sha256', 600000)), so costs compare as numbers
+    name, *params = method.split(':')
+    return name, tuple(int(param) if param.isdigit() else param for param in params)
+
+
+def normalize_method(method):
+    # A configured method as werkzeug records it in the hashes it makes, defaults filled in
+    name, params = parse_method(method)
+    if name == 'scrypt' and not params:
+        params = SCRYPT_DEFAULTS
+    elif name == 'pbkdf2':
+        params += ('sha256', DEFAULT_PBKDF2_ITERATIONS)[len(params):]
+    return name, params
+
+
+class HashingBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, method=DEFAULT_METHOD, workers=2, max_pending=64, timeout=10):
+        self.method = method
+        self._normalized_method = normalize_method(method)
+        self.workers = workers
+        self.timeout = timeout
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created on first use, i.e. inside the serving process (after any fork by the server).
+        # By then the process runs other threads (writer, maintenance, request threads), and a
+        # child forked from it can inherit a lock one of them held and hang on it. Workers are
+        # therefore started by a forkserver (a fresh single-threaded process), or spawned. Both
+        # import the main module, so a script that creates the app must guard its entry point
+        # with `if __name__ == '__main__'` (index.py does); with a forkserver that happens once.
+        with self._lock:
+            if self._executor is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload(['werkzeug.security'])  # Not re-imported per worker
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._executor
+
+    def _run(self, func, *args):
+        if self.workers <= 0:
+            return func(*args)  # Inline (development / tests)
+
+        if not self._pending.acquire(blocking=False):
+            raise HashingBusy("Too many password operations in progress")
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._pending.release()
+            raise
+        # The slot is freed when the work is done, not when the caller stops waiting for it,
+        # so PASSWORD_MAX_PENDING bounds what the workers really have queued
+        future.add_done_callback(lambda _: self._pending.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()  # Frees the slot now if no worker has started it yet
+            raise HashingBusy("Password hashing timed out")
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def warm(self):
+        # Starts the hashing workers now rather than on the first login
+        if self.workers <= 0:
+            return
+        from concurrent.futures import wait
+
+        executor = self._get_executor()
+        wait([executor.submit(int) for _ in range(self.workers)])
+
+    def needs_rehash(self, password_hash):
+        # Stored hashes start with the full method, e.g. 'scrypt:32768:8:1$salt$hash'
+        return parse_method(password_hash.split('$', 1)[0]) != self._normalized_method
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def get_hasher():
+    return current_app.extensions['password_hasher']
+
+
+def init_app(app):
+    app.extensions['password_hasher'] = PasswordHasher(
+        method=app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+        workers=app.config.get('PASSWORD_WORKERS', 2),
+        max_pending=app.config.get('PASSWORD_MAX_PENDING', 64),
+        timeout=app.config.get('PASSWORD_TIMEOUT', 10)
+    )
@@ -0,0 +1,197 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g
+
+# Response cache for read-heavy endpoints.
+# Entries are stored under a key that embeds the current generation of each of their tags;
+# writes bump a tag's generation, which makes every entry under the old generation unreachable.
+# Unreachable entries simply age out through TTL / LRU eviction.
+
+
+class CacheBackend:
+    # Minimal store interface; any Redis-compatible client can back it (see RedisBackend)
+    evictions = 0
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def counter(self, key):
+        raise NotImplementedError
+
+    def incr(self, key):
+        raise NotImplementedError
+
+
+class MemoryBackend(CacheBackend):
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._counters = {}  # Tag generations live outside the LRU so they are never evicted
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def counter(self, key):
+        return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend(CacheBackend):
+    # Shares entries and tag generations between workers; eviction is left to the server
+    def __init__(self, client, prefix='maseixame:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def counter(self, key):
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl=30):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # Request threads update the counters concurrently
+
+    def key(self, key, tags):
+        # Resolve the tag generations once per request: a response built from rows read
+        # before an invalidation is stored under the old generation and never served
+        generations = '.'.join(str(self.backend.counter(f'tag:{tag}')) for tag in tags)
+        return f'{key}|{generations}'
+
+    def get(self, versioned_key):
+        value = self.backend.get(versioned_key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, versioned_key, value):
+        self.backend.set(versioned_key, value, self.ttl)
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.incr(f'tag:{tag}')
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": self.backend.evictions
+        }
+
+
+def get_cache():
+    return current_app.extensions.get('response_cache')
+
+
+def invalidate(*tags):
+    cache = get_cache()
+    if cache is not None:
+        cache.invalidate(*tags)
+
+
+def cached_json(key_func, tags_func):
+    # Caches successful JSON responses of a view; key_func/tags_func receive the view arguments
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            cache = get_cache()
+            if cache is None:
+                return f(*args, **kwargs)
+
+            key = key_func(*args, **kwargs)
+            if 'etag' in g:
+                # Set by @conditional: never pair a cached body with a newer ETag
+                key = f'{key}|{g.etag}'
+
+            versioned_key = cache.key(key, tags_func(*args, **kwargs))
+            body = cache.get(versioned_key)
+            if body is not None:
+                return current_app.response_class(body, mimetype='application/json')
+
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code == 200 and response.mimetype == 'application/json' and not response.is_streamed:
+                cache.set(versioned_key, response.get_data())
+            return response
+
+        return decorated_function
+
+    return decorator
+
+
+def create_backend(config):
+    backend = config.get('CACHE_BACKEND', 'memory')
+    if backend == 'memory':
+        return MemoryBackend(config.get('CACHE_MAX_ENTRIES', 1024))
+    if backend == 'redis':
+        import redis  # Optional dependency, only needed for shared caches
+
+        return RedisBackend(redis.Redis.from_url(config.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')))
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+def init_app(app):
+    if app.config.get('CACHE_BACKEND', 'memory') == 'none':
+        return
+    app.extensions['response_cache'] = ResponseCache(
+        create_backend(app.config),
+        ttl=app.config.get('CACHE_TTL', 30)
+    )
@@ -0,0 +1,59 @@
+from flask import current_app, request, stream_with_context
+
+# Streaming responses for large result sets: rows are serialized as they are read,
+# so memory stays flat and the first byte goes out before the query is exhausted.
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Serialized items are coalesced into chunks of about this size before being written
+CHUNK_BYTES = 64 * 1024
+
+
+def stream_format():
+    # 'ndjson' if the client prefers NDJSON, 'json' for ?stream=1, otherwise None
+    if request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE:
+        return 'ndjson'
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return 'json'
+    return None
+
+
+def _coalesce(parts):
+    buffer, size = [], 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= CHUNK_BYTES:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _json_array(items, prefix, suffix):
+    dumps = current_app.json.dumps
+    yield prefix
+    separator = ''
+    for item in items:
+        yield separator + dumps(item)
+        separator = ','
+    yield suffix
+
+
+def _ndjson(items, head):
+    dumps = current_app.json.dumps
+    if head is not None:
+        yield dumps(head) + '\n'
+    for item in items:
+        yield dumps(item) + '\n'
+
+
+def streamed_response(items, fmt, prefix='[', suffix=']', head=None):
+    # JSON: prefix + comma-separated items + suffix; NDJSON: optional head line, then one line per item
+    if fmt == 'ndjson':
+        parts, mimetype = _ndjson(items, head), NDJSON_MIMETYPE
+    else:
+        parts, mimetype = _json_array(items, prefix, suffix), 'application/json'
+
+    # Keeps the request (and its pooled connection) alive until the generator finishes
+    return current_app.response_class(stream_with_context(_coalesce(parts)), mimetype=mimetype)
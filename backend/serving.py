@@ -0,0 +1,75 @@
+import os
+import time
+
+from config import load_env
+
+# Settings shared by the production entry points:
+#
+#   gunicorn -c gunicorn.conf.py            (multi-process, threaded WSGI)
+#   python asgi.py  /  uvicorn asgi:application --workers 4   (ASGI)
+#
+# WEB_CONCURRENCY is the number of worker processes and WEB_THREADS the number of
+# requests each process runs at once. SQLite and the password KDF release the GIL,
+# so threads overlap their I/O and hashing; processes scale past one core.
+
+load_env()  # So .env can set these too
+
+WORKERS = int(os.getenv('WEB_CONCURRENCY', min(2 * (os.cpu_count() or 1) + 1, 8)))
+THREADS = int(os.getenv('WEB_THREADS', 16))
+BIND = os.getenv('BIND', '0.0.0.0:5000')
+
+# Every request thread may hold a pooled connection, so the pool matches the thread count
+os.environ.setdefault('DB_POOL_SIZE', str(THREADS))
+
+
+def load_app():
+    from index import create_app
+    from database.connection import get_pool
+
+    app = create_app()
+
+    # Connections opened at import (migrations) must not be inherited by forked workers;
+    # each worker reopens its own lazily
+    get_pool(app).close_all()
+    for name in ('db_read_pool', 'db_write_pool'):
+        if name in app.extensions:
+            app.extensions[name].close_all()
+    return app
+
+
+def warm_app(app):
+    # With PREWARM, a worker does its one-time setup before taking traffic instead of on its
+    # first requests: it starts the hashing workers, opens its pooled connections, starts the
+    # writer (and replica) threads and requests PREWARM_PATHS once, which fills the response
+    # cache, SQLite's statement cache and the OS page cache. Call it in the worker, after any fork.
+    if not app.config.get('PREWARM'):
+        return
+    started = time.perf_counter()
+
+    # Hashing workers take longest to start (a forkserver or spawned interpreters)
+    app.extensions['password_hasher'].warm()
+
+    replica = app.extensions.get('db_replica')
+    for name in ('db_pool', 'db_read_pool'):
+        pool = app.extensions.get(name)
+        if pool is None:
+            continue
+        if name == 'db_read_pool' and replica is not None and not replica.ready():
+            continue  # No replica copy yet; requests read the primary until there is
+        pool.warm()
+    if 'db_writer' in app.extensions:
+        app.extensions['db_writer'].start()
+
+    with app.test_client() as client:
+        # The feed routes need a signed-in user; this token only ever exists inside this process
+        import jwt
+
+        token = jwt.encode({'user_id': 'prewarm', 'exp': time.time() + 60},
+                           app.config['SECRET_KEY'], algorithm=app.config['ALGORITHM'])
+        client.set_cookie('authCookie', token)
+        for path in app.config.get('PREWARM_PATHS', []):
+            status = client.get(path).status_code
+            if status != 200:
+                app.logger.warning("Pre-warm request %s answered %s", path, status)
+
+    app.logger.info("Pre-warmed in %.0f ms", (time.perf_counter() - started) * 1000)
@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import sys
+import time
+
+import jwt
+import pytest
+
+# The backend modules import each other from the backend directory (index, database, services)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SECRET_KEY = 'test-secret-key-' + 'x' * 16
+
+
+@pytest.fixture
+def app_config():
+    # Extra settings for the app fixture; override it in a test module to change them
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, app_config):
+    from index import create_app
+
+    app = create_app({
+        'TESTING': True,
+        'SECRET_KEY': SECRET_KEY,
+        'ALGORITHM': 'HS256',
+        'DATABASE': str(tmp_path / 'app.db'),
+        'THUMBNAIL_DIR': str(tmp_path / 'thumbnails'),
+        'THUMBNAIL_PREFETCH': False,
+        'MAINTENANCE_ENABLED': False,
+        'RATE_LIMIT_BACKEND': 'none',
+        'PASSWORD_WORKERS': 0,
+        **app_config,
+    })
+    yield app
+
+    for name in ('db_pool', 'db_read_pool', 'db_write_pool'):
+        if name in app.extensions:
+            app.extensions[name].close_all()
+
+
+@pytest.fixture
+def db(app):
+    # A connection of the test's own, for arranging rows and checking what the app wrote
+    conn = sqlite3.connect(app.config['DATABASE'])
+    conn.row_factory = sqlite3.Row
+    yield conn
+    conn.close()
+
+
+def sign_in(client, user_id, expires_in=3600):
+    token = jwt.encode({'user_id': user_id, 'exp': time.time() + expires_in}, SECRET_KEY, algorithm='HS256')
+    client.set_cookie('authCookie', token)
+    return token
+
+
+@pytest.fixture
+def make_user(db):
+    def make_user(username):
+        user_id = f'user-{username}'
+        db.execute('INSERT INTO users (id, username, password) VALUES (?, ?, ?)', (user_id, username, 'unused'))
+        db.commit()
+        return user_id
+    return make_user
+
+
+@pytest.fixture
+def make_post(db):
+    def make_post(user_id, title, created_at='2024-01-01T00:00:00', **columns):
+        values = {'description': 'A description', 'photo': 'https://example.com/photo.jpg', 'location': 'Lisbon',
+                  **columns, 'userId': user_id, 'title': title, 'createdAt': created_at}
+        cursor = db.execute(
+            f"INSERT INTO posts ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})", tuple(values.values())
+        )
+        db.commit()
+        return cursor.lastrowid
+    return make_post
+
+
+@pytest.fixture
+def make_client(app, make_user):
+    # A test client signed in as a new user; its id is client.user_id
+    def make_client(username):
+        client = app.test_client()
+        client.user_id = make_user(username)
+        sign_in(client, client.user_id)
+        return client
+    return make_client
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client('alice')
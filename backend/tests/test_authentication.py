@@ -0,0 +1,63 @@
+import time
+
+import jwt
+import pytest
+
+from conftest import SECRET_KEY
+from middleware.checkAuthentication import TokenCache
+
+
+def token(user_id='user-alice', expires_in=3600, key=SECRET_KEY):
+    return jwt.encode({'user_id': user_id, 'exp': time.time() + expires_in}, key, algorithm='HS256')
+
+
+def test_token_cache_drops_expired_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('middleware.checkAuthentication.time.time', lambda: now[0])
+    cache = TokenCache()
+    cache.set(b'digest', 1010, {'user_id': 'a'})
+    assert cache.get(b'digest') == {'user_id': 'a'}
+    now[0] = 1010
+    assert cache.get(b'digest') is None
+
+
+def test_token_cache_is_bounded():
+    cache = TokenCache(max_entries=2)
+    for digest in (b'a', b'b', b'c'):
+        cache.set(digest, time.time() + 60, {'user_id': digest})
+    assert cache.get(b'a') is None
+    assert cache.get(b'c') == {'user_id': b'c'}
+
+
+def test_token_is_verified_once(app, client, monkeypatch):
+    calls = []
+    decode = jwt.decode
+    monkeypatch.setattr('middleware.checkAuthentication.jwt.decode', lambda *a, **k: calls.append(1) or decode(*a, **k))
+
+    client.set_cookie('authCookie', token(client.user_id))
+    for _ in range(3):
+        assert client.get('/user/profile').status_code == 200
+    assert len(calls) == 1
+
+
+def test_cached_token_still_expires(app, client):
+    client.set_cookie('authCookie', token(client.user_id, expires_in=1))
+    assert client.get('/user/profile').status_code == 200
+    time.sleep(1.1)
+    response = client.get('/user/profile')
+    assert response.status_code == 401
+    assert response.get_json()['error'] == "Authentication failed. Token has expired"
+
+
+@pytest.mark.parametrize('cookie, error', [
+    (None, "Authentication required. Token is missing"),
+    (token(key='another-key-' + 'y' * 20), "Authentication failed. Invalid token"),
+    (jwt.encode({'exp': time.time() + 60}, SECRET_KEY, algorithm='HS256'), "Invalid token format"),
+])
+def test_rejected_tokens(app, cookie, error):
+    client = app.test_client()
+    if cookie:
+        client.set_cookie('authCookie', cookie)
+    response = client.get('/user/profile')
+    assert response.status_code == 401
+    assert response.get_json()['error'] == error
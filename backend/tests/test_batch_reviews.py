@@ -0,0 +1,76 @@
+import pytest
+
+from database.stats import find_mismatches
+from routes.postsRouter import REVIEW_BATCH_MAX
+
+
+@pytest.fixture
+def post_ids(make_user, make_post):
+    owner = make_user('bob')
+    return [make_post(owner, f'Post {i}') for i in range(3)]
+
+
+def review_rows(db):
+    return [tuple(row) for row in db.execute('SELECT userId, postId, rating, content FROM reviews ORDER BY postId')]
+
+
+def test_batch_creates_and_updates(client, db, post_ids):
+    first, second, third = post_ids
+    client.put(f'/posts/review/{first}', json={'rating': 1, 'content': 'meh'})
+
+    response = client.post('/posts/reviews/batch', json={'reviews': [
+        {'postId': first, 'rating': 4, 'content': 'better'},
+        {'postId': second, 'rating': 5},
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['created'], body['updated']) == (1, 1)
+    assert {row['postId']: (row['average'], row['count']) for row in body['posts']} == {first: (4.0, 1), second: (5.0, 1)}
+
+    assert review_rows(db) == [(client.user_id, first, 4, 'better'), (client.user_id, second, 5, '')]
+    assert tuple(db.execute('SELECT rating_sum, rating_count FROM posts WHERE id = ?', (third,)).fetchone()) == (0, 0)
+    assert find_mismatches(db) == []
+
+
+def test_plain_list_and_duplicates_keep_the_last(client, db, post_ids):
+    response = client.post('/posts/reviews/batch', json=[
+        {'postId': post_ids[0], 'rating': 2},
+        {'postId': post_ids[0], 'rating': 3, 'content': 'second thoughts'},
+    ])
+    assert response.status_code == 200
+    assert review_rows(db) == [(client.user_id, post_ids[0], 3, 'second thoughts')]
+    assert find_mismatches(db) == []
+
+
+@pytest.mark.parametrize('bad_item, error', [
+    ({'postId': 'x', 'rating': 3}, "postId must be an integer"),
+    ({'postId': True, 'rating': 3}, "postId must be an integer"),
+    ({'rating': 3}, "postId must be an integer"),
+    ({'postId': 1, 'rating': 6}, "Rating must be an integer between 1 and 5"),
+    ({'postId': 1, 'rating': True}, "Rating must be an integer between 1 and 5"),
+    ({'postId': 1, 'rating': 3, 'content': 5}, "content must be a string"),
+    ('review', "Each review must be an object"),
+])
+def test_one_bad_item_rejects_the_whole_batch(client, db, post_ids, bad_item, error):
+    response = client.post('/posts/reviews/batch', json=[{'postId': post_ids[0], 'rating': 4}, bad_item])
+    assert response.status_code == 400
+    assert response.get_json()['details'] == [{"index": 1, "error": error}]
+    assert review_rows(db) == []
+
+
+def test_missing_post_rejects_the_whole_batch(client, db, post_ids):
+    response = client.post('/posts/reviews/batch', json=[{'postId': post_ids[0], 'rating': 4}, {'postId': 999, 'rating': 4}])
+    assert response.status_code == 404
+    assert response.get_json()['postIds'] == [999]
+    assert review_rows(db) == []
+    assert find_mismatches(db) == []
+
+
+@pytest.mark.parametrize('payload', [[], {}, {'reviews': 'x'}, None])
+def test_batch_needs_a_list(client, payload):
+    assert client.post('/posts/reviews/batch', json=payload).status_code == 400
+
+
+def test_batch_size_is_capped(client, post_ids):
+    items = [{'postId': post_ids[0], 'rating': 3}] * (REVIEW_BATCH_MAX + 1)
+    assert client.post('/posts/reviews/batch', json=items).status_code == 400
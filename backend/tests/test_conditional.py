@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+import pytest
+
+
+@pytest.fixture
+def posts(client, make_user, make_post):
+    other = make_user('bob')
+    return make_post(client.user_id, 'Mine'), make_post(other, 'Theirs')
+
+
+def test_feed_answers_304_until_the_data_changes(client, posts):
+    first = client.get('/posts/all')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    again = client.get('/posts/all', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.get_data() == b''
+    assert again.headers['ETag'] == etag
+
+    client.put(f'/posts/review/{posts[1]}', json={'rating': 4})
+    changed = client.get('/posts/all', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_if_modified_since(client, posts):
+    first = client.get('/posts/all')
+    last_modified = first.last_modified
+    assert last_modified is not None
+
+    assert client.get('/posts/all', headers={'If-Modified-Since': first.headers['Last-Modified']}).status_code == 304
+    earlier = (last_modified - timedelta(seconds=5)).strftime('%a, %d %b %Y %H:%M:%S GMT')
+    assert client.get('/posts/all', headers={'If-Modified-Since': earlier}).status_code == 200
+
+
+def test_if_none_match_takes_precedence(client, posts):
+    first = client.get('/posts/all')
+    response = client.get('/posts/all', headers={
+        'If-None-Match': '"something-else"',
+        'If-Modified-Since': first.headers['Last-Modified'],
+    })
+    assert response.status_code == 200
+
+
+def test_post_etag_follows_its_own_version(client, posts):
+    mine, theirs = posts
+    etag = client.get('/posts/Mine').headers['ETag']
+
+    client.put(f'/posts/review/{theirs}', json={'rating': 2})
+    assert client.get('/posts/Mine', headers={'If-None-Match': etag}).status_code == 304
+
+    client.put(f'/posts/review/{mine}', json={'rating': 2})
+    assert client.get('/posts/Mine', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_missing_post_is_not_a_304(client, posts):
+    assert client.get('/posts/Nothing', headers={'If-None-Match': '*'}).status_code == 404
+
+
+def test_profile_etag_is_per_representation(client, posts):
+    etag = client.get('/user/profile').headers['ETag']
+    assert client.get('/user/profile', headers={'If-None-Match': etag}).status_code == 304
+    streamed = client.get('/user/profile?stream=1', headers={'If-None-Match': etag})
+    assert streamed.status_code == 200
+    assert streamed.headers['ETag'] != etag
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from services.events import RESYNC, EventBroker, TooManySubscribers
+
+
+@pytest.fixture
+def app_config():
+    return {'EVENTS_HEARTBEAT': 0.1, 'EVENTS_MAX_AGE': 1, 'EVENTS_MAX_SUBSCRIBERS': 2}
+
+
+def parse(texts):
+    # (id, event, data) of each event text; RESYNC has no id
+    events = []
+    for text in ''.join(texts).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in text.splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields.get('id'), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_replays_what_a_client_missed():
+    broker = EventBroker()
+    for n in range(3):
+        broker.publish('post-deleted', {'id': n})
+    assert broker.subscribe().get(0) == []  # A new subscriber gets nothing from before it subscribed
+
+    subscription = broker.subscribe(f'{broker.stream}-1')
+    assert [(event, data) for _, event, data in parse(subscription.get(0))] == [
+        ('post-deleted', {'id': 1}), ('post-deleted', {'id': 2}),
+    ]
+
+    broker.publish('post-deleted', {'id': 3})
+    assert parse(subscription.get(0)) == [(f'{broker.stream}-4', 'post-deleted', {'id': 3})]
+
+
+def test_up_to_date_client_gets_no_replay():
+    broker = EventBroker()
+    broker.publish('post-deleted', {'id': 1})
+    assert broker.subscribe(f'{broker.stream}-1').get(0) == []
+
+
+@pytest.mark.parametrize('last_event_id', [
+    'another-1',  # From before a restart
+    'STREAM-1',  # Older than the history holds
+    'STREAM-9',  # From the future
+    'STREAM-x',
+])
+def test_resyncs_when_the_gap_cannot_be_replayed(last_event_id):
+    broker = EventBroker(history=2)
+    for n in range(4):
+        broker.publish('post-deleted', {'id': n})
+    subscription = broker.subscribe(last_event_id.replace('STREAM', broker.stream))
+    assert subscription.get(0) == [RESYNC]
+    assert subscription.get(0) == []
+
+
+def test_slow_subscriber_is_resynced():
+    broker = EventBroker(max_pending=2)
+    subscription = broker.subscribe()
+    for n in range(5):
+        broker.publish('post-deleted', {'id': n})
+    assert subscription.get(0) == [RESYNC]
+
+    broker.publish('post-deleted', {'id': 5})
+    assert [data for _, _, data in parse(subscription.get(0))] == [{'id': 5}]
+
+
+def test_subscribers_are_capped():
+    broker = EventBroker(max_subscribers=1)
+    subscription = broker.subscribe()
+    with pytest.raises(TooManySubscribers):
+        broker.subscribe()
+    broker.unsubscribe(subscription)
+    broker.subscribe()
+
+
+def read_stream(response):
+    # The whole body of a stream that ends after EVENTS_MAX_AGE
+    try:
+        return [chunk.decode() for chunk in response.response]
+    finally:
+        response.close()
+
+
+def test_stream_replays_from_last_event_id(app, client, make_post):
+    post_id = make_post(client.user_id, 'Reviewed')
+    broker = app.extensions['event_broker']
+    broker.publish('post-deleted', {'id': 999})
+    client.put(f'/posts/review/{post_id}', json={'rating': 4})
+
+    response = client.get('/posts/events', headers={'Last-Event-ID': f'{broker.stream}-1'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    body = read_stream(response)
+    assert body[0] == 'retry: 3000\n\n'
+    assert parse(body) == [(f'{broker.stream}-2', 'post-rating', {'id': post_id, 'average': 4.0, 'count': 1})]
+    assert broker._subscribers == set()  # Closing the response unsubscribed it
+
+
+def test_stream_resyncs_a_stale_client(app, client):
+    body = read_stream(client.get('/posts/events', headers={'Last-Event-ID': 'gone-42'}))
+    assert RESYNC in body
+
+
+def test_too_many_streams_is_503(app, client):
+    open_streams = [client.get('/posts/events') for _ in range(2)]
+    response = client.get('/posts/events')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '30'
+    for stream in open_streams:
+        stream.close()
+    response = client.get('/posts/events')
+    assert response.status_code == 200
+    response.close()
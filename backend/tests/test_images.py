@@ -0,0 +1,218 @@
+import io
+import ipaddress
+import os
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('PIL')
+from PIL import Image
+
+from database.connection import get_db
+from services.images import ImageStore, ImageUnavailable, source_key, thumbnail_url
+
+# Thumbnail cache against a local stand-in for the photo hosts. The store refuses private
+# hosts, so these stores allow them, except where refusing them is what is tested.
+
+
+def png(color, size=(600, 400)):
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, 'PNG')
+    return output.getvalue()
+
+
+PHOTOS = {
+    '/red.png': png((200, 30, 30)),
+    '/green.png': png((30, 200, 30)),
+    '/blue.png': png((30, 30, 200)),
+}
+
+
+@pytest.fixture
+def origin():
+    requests, hosts = [], []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            hosts.append(self.headers['Host'])
+            if self.path == '/moved.png':
+                self.send_response(302)
+                self.send_header('Location', '/red.png')
+                self.end_headers()
+                return
+            body = PHOTOS.get(self.path)
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    server.requests = requests
+    server.hosts = hosts
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def store(app):
+    store = app.extensions['image_store']
+    store.allow_private_hosts = True
+    return store
+
+
+def cache_rows(conn):
+    return {row['sourceKey']: row for row in conn.execute('SELECT * FROM image_cache')}
+
+
+def test_ingest_stores_thumbnail(app, store, origin):
+    url = origin.url + '/red.png'
+    with app.app_context():
+        digest = store.get(get_db(), url)
+
+        assert os.path.exists(store.path(digest))
+        with Image.open(store.path(digest)) as image:
+            assert image.format == 'JPEG'
+            assert max(image.size) == store.size
+        row = cache_rows(get_db())[source_key(url)]
+        assert row['digest'] == digest
+        assert row['size'] == os.path.getsize(store.path(digest))
+    assert origin.requests == ['/red.png']
+
+
+def test_cache_hit_does_not_refetch(app, store, origin):
+    url = origin.url + '/green.png'
+    with app.app_context():
+        first = store.get(get_db(), url)
+        second = store.get(get_db(), url)
+    assert first == second
+    assert origin.requests == ['/green.png']
+
+
+def test_thumbnail_route(app, store, origin):
+    url = origin.url + '/blue.png'
+    with app.app_context():
+        conn = get_db()
+        conn.execute(
+            "INSERT INTO posts (userId, title, description, photo, location) VALUES ('u1', 'Blue', 'd', ?, 'here')",
+            (url,)
+        )
+        conn.commit()
+        post_id = conn.execute("SELECT id FROM posts WHERE title = 'Blue'").fetchone()[0]
+
+    client = app.test_client()
+    response = client.get(thumbnail_url(post_id, url))
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert client.get(f'/images/posts/{post_id}/{source_key("http://elsewhere/")}').status_code == 404
+    response.close()
+
+
+def test_eviction_drops_least_recently_used(app, store, origin):
+    old, recent, new = (origin.url + path for path in ('/red.png', '/green.png', '/blue.png'))
+    with app.app_context():
+        conn = get_db()
+        for url, age in ((old, 300), (recent, 200)):
+            store.get(conn, url)
+            # Older access times than a cache hit would refresh, oldest first
+            conn.execute('UPDATE image_cache SET accessedAt = accessedAt - ? WHERE sourceKey = ?',
+                         (age, source_key(url)))
+            conn.commit()
+        rows = cache_rows(conn)
+        old_digest = rows[source_key(old)]['digest']
+        sizes = [row['size'] for row in rows.values()]
+
+        # Eviction goes down to 90% of the budget; this one leaves room for two thumbnails
+        store.max_bytes = int(2 * max(sizes) / 0.9) + 1
+        store.get(conn, new)
+
+        rows = cache_rows(conn)
+        assert set(rows) == {source_key(recent), source_key(new)}
+        assert not os.path.exists(store.path(old_digest))
+        assert all(os.path.exists(store.path(row['digest'])) for row in rows.values())
+        assert sum(row['size'] for row in rows.values()) <= store.max_bytes
+
+
+def test_rejects_private_hosts(app, origin, tmp_path):
+    store = ImageStore(str(tmp_path / 'private'))
+    with app.app_context():
+        with pytest.raises(ImageUnavailable, match="not public"):
+            store.get(get_db(), origin.url + '/red.png')
+        assert cache_rows(get_db()) == {}
+    assert origin.requests == []
+
+
+def test_rejects_redirect_to_private_host(app, origin):
+    # Allowed for the first hop only, as a public host that redirects inward would be
+    class FirstHopOnly(ImageStore):
+        checked = 0
+
+        def _check_host(self, url):
+            self.checked += 1
+            if self.checked > 1:
+                raise ImageUnavailable("Photo host is not public")
+
+    store = FirstHopOnly(app.extensions['image_store'].directory, allow_private_hosts=True)
+    with app.app_context():
+        with pytest.raises(ImageUnavailable, match="not public"):
+            store.get(get_db(), origin.url + '/moved.png')
+    assert origin.requests == ['/moved.png']
+
+
+def resolve_as(monkeypatch, *answers):
+    # Each lookup of a name answers with the next address, the last one from then on
+    answers = list(answers)
+    lookups = []
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        lookups.append(host)
+        ip = answers.pop(0) if len(answers) > 1 else answers[0]
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (ip, port or 80))]
+
+    monkeypatch.setattr('services.images.socket.getaddrinfo', getaddrinfo)
+    return lookups
+
+
+def test_rejects_host_rebound_to_private_address(app, origin, monkeypatch, tmp_path):
+    # Public when checked, loopback when connecting
+    lookups = resolve_as(monkeypatch, '93.184.216.34', '127.0.0.1')
+    store = ImageStore(str(tmp_path / 'rebinding'))
+    port = origin.server_address[1]
+    with app.app_context():
+        with pytest.raises(ImageUnavailable, match="not public"):
+            store.get(get_db(), f'http://photos.example:{port}/red.png')
+    assert lookups == ['photos.example', 'photos.example']
+    assert origin.requests == []
+
+
+def test_connects_to_the_checked_address(app, origin, monkeypatch, tmp_path):
+    # photos.example resolves to the local origin, taken for a public address
+    resolve_as(monkeypatch, '127.0.0.1')
+    monkeypatch.setattr('services.images.ipaddress.ip_address', lambda ip: ipaddress.IPv4Address('93.184.216.34'))
+    store = ImageStore(str(tmp_path / 'pinned'))
+    port = origin.server_address[1]
+    with app.app_context():
+        store.get(get_db(), f'http://photos.example:{port}/red.png')
+    assert origin.requests == ['/red.png']
+    assert origin.hosts == [f'photos.example:{port}']
+
+
+@pytest.mark.parametrize('photo', ['asddasdasdas', 'ftp://example.com/a.png', 'file:///etc/passwd', 'http:///a.png'])
+def test_rejects_unsupported_urls(app, store, photo):
+    assert thumbnail_url(1, photo) is None
+    with app.app_context():
+        with pytest.raises(ImageUnavailable, match="Unsupported"):
+            store.get(get_db(), photo)
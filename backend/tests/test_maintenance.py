@@ -0,0 +1,105 @@
+import pytest
+
+from database.maintenance import Scheduler, claim_job, job_due, release_job
+from database.stats import find_mismatches
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('database.maintenance.time.time', lambda: now[0])
+    return now
+
+
+def job_row(db, name):
+    return db.execute('SELECT * FROM job_locks WHERE name = ?', (name,)).fetchone()
+
+
+def test_one_owner_holds_a_job_until_it_releases_it(db, clock):
+    assert claim_job(db, 'optimize', 'a', 0, 60)
+    assert not claim_job(db, 'optimize', 'b', 0, 60)
+    assert not job_due(db, 'optimize', 0)
+
+    release_job(db, 'optimize', 'b', 'ok', 0.1)  # Not the owner: changes nothing
+    assert job_row(db, 'optimize')['owner'] == 'a'
+    assert not claim_job(db, 'optimize', 'b', 0, 60)
+
+    release_job(db, 'optimize', 'a', 'ok', 0.1)
+    assert job_row(db, 'optimize')['lastStatus'] == 'ok'
+    assert job_due(db, 'optimize', 0)
+    assert claim_job(db, 'optimize', 'b', 0, 60)
+
+
+def test_lease_expires(db, clock):
+    assert claim_job(db, 'optimize', 'a', 0, 60)
+    clock[0] += 59
+    assert not claim_job(db, 'optimize', 'b', 0, 60)
+    clock[0] += 2
+    assert job_due(db, 'optimize', 0)
+    assert claim_job(db, 'optimize', 'b', 0, 60)
+    assert job_row(db, 'optimize')['owner'] == 'b'
+
+
+def test_job_waits_for_its_interval(db, clock):
+    assert job_due(db, 'optimize', 3600)
+    assert claim_job(db, 'optimize', 'a', 3600, 60)
+    release_job(db, 'optimize', 'a', 'ok', 0.1)
+
+    clock[0] += 3599
+    assert not job_due(db, 'optimize', 3600)
+    assert not claim_job(db, 'optimize', 'b', 3600, 60)
+    clock[0] += 1
+    assert job_due(db, 'optimize', 3600)
+    assert claim_job(db, 'optimize', 'b', 3600, 60)
+
+
+def test_scheduler_runs_a_job_once_per_interval(app, db):
+    runs = []
+    scheduler = Scheduler(app, [])
+    assert scheduler.run('counted', 3600, lambda: runs.append(1) or 7) == 7
+    assert scheduler.run('counted', 3600, lambda: runs.append(1) or 7) is None
+    assert runs == [1]
+
+    row = job_row(db, 'counted')
+    assert (row['owner'], row['lockedUntil'], row['lastStatus']) == (None, None, 'ok')
+
+
+def test_scheduler_skips_a_job_held_elsewhere(app, db):
+    claim_job(db, 'held', 'elsewhere', 0, 600)
+    db.commit()
+    assert Scheduler(app, []).run('held', 0, lambda: pytest.fail("ran a held job")) is None
+
+
+def test_failed_job_releases_its_lease(app, db):
+    def broken():
+        raise RuntimeError("boom")
+
+    scheduler = Scheduler(app, [])
+    assert scheduler.run('broken', 0, broken) is None
+    row = job_row(db, 'broken')
+    assert (row['owner'], row['lastStatus']) == (None, 'error')
+    assert 'maintenance_job_failures_total{job="broken"} 1' in scheduler.metric_lines()
+
+
+def test_jobs_run_repairs_rating_stats(app, db, make_user, make_post):
+    make_post(make_user('bob'), 'Drifted', rating_sum=12, rating_count=3)
+    runner = app.test_cli_runner()
+    with app.app_context():
+        result = runner.invoke(args=['jobs', 'run', 'rating-stats'])
+        assert result.exit_code == 0, result.output
+        assert result.output == "rating-stats: 1 items\n"
+        assert find_mismatches(db) == []
+
+        result = runner.invoke(args=['jobs', 'list'])
+        assert "rating-stats: every 21600s, last ok at" in result.output
+
+
+def test_jobs_run_refuses_held_and_unknown_jobs(app, db):
+    claim_job(db, 'optimize', 'elsewhere', 0, 600)
+    db.commit()
+    runner = app.test_cli_runner()
+    with app.app_context():
+        result = runner.invoke(args=['jobs', 'run', 'optimize'])
+        assert result.exit_code == 1
+        assert "did not run" in result.output
+        assert "Unknown job" in runner.invoke(args=['jobs', 'run', 'nothing']).output
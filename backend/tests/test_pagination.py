@@ -0,0 +1,118 @@
+import base64
+import json
+
+import pytest
+
+from database.pagination import ROW_ID, SCORE, TIMESTAMP, InvalidCursor, decode_cursor, encode_cursor
+
+
+def raw_cursor(values):
+    # A cursor as a client could forge it
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).rstrip(b'=').decode()
+
+
+def test_cursor_round_trip():
+    key = (4.5, '2024-01-01T00:00:00', 12)
+    cursor = encode_cursor('top-rated', key)
+    assert decode_cursor(cursor, 'top-rated', (SCORE, TIMESTAMP, ROW_ID)) == key
+
+
+@pytest.mark.parametrize('values', [
+    ['newest', [1], {}],
+    ['newest', '2024-01-01', '7'],
+    ['newest', 7, 7],
+    ['newest', '2024-01-01', True],
+    ['newest', '2024-01-01', 1.5],
+    ['newest', None, 7],
+    ['newest', '2024-01-01'],
+    ['top-rated', '2024-01-01', 7],
+    {'sort': 'newest'},
+])
+def test_decode_rejects_malformed_keys(values):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(raw_cursor(values), 'newest', (TIMESTAMP, ROW_ID))
+
+
+def test_decode_rejects_garbage():
+    with pytest.raises(InvalidCursor):
+        decode_cursor('not a cursor!', 'newest', (TIMESTAMP, ROW_ID))
+
+
+def test_score_accepts_whole_numbers():
+    assert decode_cursor(raw_cursor(['search', -3, 9]), 'search', (SCORE, ROW_ID)) == (-3, 9)
+
+
+def read_all_pages(client, path, limit=4, items='posts', **params):
+    ids, cursor = [], None
+    while True:
+        response = client.get(path, query_string={**params, 'limit': limit, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        ids += [item['id'] for item in body[items]]
+        cursor = body['next_cursor']
+        if cursor is None:
+            return ids
+
+
+@pytest.fixture
+def feed(client, make_post):
+    # Ties on every sort key except the id, so pages only stay stable if the keyset is unique
+    posts = []
+    for i in range(11):
+        created_at = f'2024-01-0{1 + i % 3}T00:00:00'
+        rating_count = i % 4
+        post_id = make_post(client.user_id, f'Post {i}', created_at,
+                            rating_sum=rating_count * (3 + i % 2), rating_count=rating_count)
+        posts.append({'id': post_id, 'createdAt': created_at,
+                      'rating_avg': (3 + i % 2) if rating_count else 0, 'rating_count': rating_count})
+    return posts
+
+
+@pytest.mark.parametrize('sort, rank', [('newest', None), ('top-rated', 'rating_avg'), ('most-reviewed', 'rating_count')])
+def test_feed_pages_cover_every_post_once_in_order(client, feed, sort, rank):
+    def key(post):
+        return ((post[rank],) if rank else ()) + (post['createdAt'], post['id'])
+
+    expected = [post['id'] for post in sorted(feed, key=key, reverse=True)]
+    assert read_all_pages(client, '/posts/all', sort=sort) == expected
+
+
+def test_profile_pages_cover_the_users_posts_once_in_order(client, feed, make_user, make_post):
+    other = make_user('bob')
+    make_post(other, 'Not mine', '2024-01-02T00:00:00')
+    expected = [post['id'] for post in sorted(feed, key=lambda post: (post['createdAt'], post['id']), reverse=True)]
+    assert read_all_pages(client, '/user/profile', limit=3) == expected
+
+
+def test_review_pages_cover_every_review_once_in_order(client, db, feed, make_user):
+    post_id = feed[0]['id']
+    reviews = []
+    for i in range(9):
+        created_at = f'2024-02-0{1 + i % 2}T00:00:00'
+        cursor = db.execute('INSERT INTO reviews (userId, postId, rating, content, createdAt) VALUES (?, ?, 3, ?, ?)',
+                            (make_user(f'reviewer{i}'), post_id, '', created_at))
+        reviews.append((created_at, cursor.lastrowid))
+    db.commit()
+
+    expected = [review_id for _, review_id in sorted(reviews, reverse=True)]
+    assert read_all_pages(client, f'/posts/{post_id}/reviews', limit=2, items='reviews') == expected
+
+
+@pytest.mark.parametrize('path', [
+    '/posts/all',
+    '/posts/all?stream=1',
+    '/posts/all?sort=top-rated',
+    '/posts/search?q=post',
+    '/user/profile',
+    '/user/profile?stream=1',
+    '/posts/{post_id}/reviews',
+])
+def test_forged_cursor_is_a_bad_request(client, feed, path):
+    path = path.format(post_id=feed[0]['id'])
+    separator = '&' if '?' in path else '?'
+    for values in (['newest', [1], {}], ['search', [1], {}], ['profile', {}, 1], ['reviews', 1, 'x'],
+                   ['top-rated', 'x', '2024', 1]):
+        response = client.get(f'{path}{separator}cursor={raw_cursor(values)}')
+        assert response.status_code == 400
+        assert response.get_json() == {"error": response.get_json()['error']}
+        assert 'binding' not in response.get_json()['error']
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
+
+from services.passwords import HashingBusy, PasswordHasher
+
+
+@pytest.mark.parametrize('method, stored, expected', [
+    ('scrypt:32768:8:1', 'scrypt:32768:8:1', False),
+    ('scrypt', 'scrypt:32768:8:1', False),
+    ('scrypt:16384:8:1', 'scrypt:32768:8:1', True),
+    ('pbkdf2', f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}', False),
+    ('pbkdf2:sha256', f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}', False),
+    ('pbkdf2:sha256:600000', 'pbkdf2:sha256:600000', False),
+    ('pbkdf2:sha256:600000', f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}', True),
+    ('pbkdf2:sha512', f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}', True),
+    ('pbkdf2:sha256', 'pbkdf2:sha256', True),  # Iterations not recorded: an old default
+    ('scrypt', f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}', True),
+])
+def test_needs_rehash(method, stored, expected):
+    assert PasswordHasher(method, workers=0).needs_rehash(f'{stored}$salt$hash') is expected
+
+
+def test_fresh_hash_needs_no_rehash():
+    hasher = PasswordHasher('pbkdf2:sha256', workers=0)
+    password_hash = hasher.hash('secret1')
+    assert hasher.check(password_hash, 'secret1')
+    assert not hasher.needs_rehash(password_hash)
+
+
+@pytest.fixture
+def slow_hasher():
+    # One worker, one pending operation, and "hashing" that takes 1.5 s
+    class SlowHasher(PasswordHasher):
+        def hash(self, password):
+            return self._run(time.sleep, 1.5)
+
+    hasher = SlowHasher(workers=1, max_pending=1, timeout=0.3)
+    hasher.warm()
+    yield hasher
+    hasher.shutdown()
+
+
+def test_timeout_is_busy_and_keeps_the_slot(slow_hasher):
+    with pytest.raises(HashingBusy, match="timed out"):
+        slow_hasher.hash('secret1')
+    # The worker is still on it, so the one pending slot is still taken
+    with pytest.raises(HashingBusy, match="Too many"):
+        slow_hasher.hash('secret1')
+
+    time.sleep(1.5)
+    assert slow_hasher._run(int, '7') == 7
+
+
+def test_register_answers_503_when_hashing_times_out(app, slow_hasher):
+    app.extensions['password_hasher'] = slow_hasher
+    response = app.test_client().post('/user/register', json={'username': 'dora', 'password': 'secret1'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
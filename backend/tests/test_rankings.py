@@ -0,0 +1,69 @@
+import pytest
+
+from database.stats import RANKING_PRIOR_MEAN, RANKING_PRIOR_WEIGHT, rebuild_rankings
+
+
+def expected_score(rating_sum, rating_count):
+    return (rating_sum + RANKING_PRIOR_WEIGHT * RANKING_PRIOR_MEAN) / (rating_count + RANKING_PRIOR_WEIGHT)
+
+
+def rankings(db):
+    return {row['postId']: (row['locationKey'], row['score']) for row in db.execute('SELECT * FROM post_rankings')}
+
+
+def top_ids(client, **params):
+    response = client.get('/posts/top', query_string=params)
+    assert response.status_code == 200
+    return [post['id'] for post in response.get_json()['posts']]
+
+
+@pytest.fixture
+def posts(client, make_post):
+    # One 5-star review, fifty averaging 4.8, and none, in two places
+    return {
+        'lucky': make_post(client.user_id, 'Lucky', location='Lisbon', rating_sum=5, rating_count=1),
+        'loved': make_post(client.user_id, 'Loved', location='Porto', rating_sum=240, rating_count=50),
+        'new': make_post(client.user_id, 'New', location=' lisbon '),
+    }
+
+
+def test_triggers_rank_new_posts(db, posts):
+    assert rankings(db) == {
+        posts['lucky']: ('lisbon', pytest.approx(expected_score(5, 1))),
+        posts['loved']: ('porto', pytest.approx(expected_score(240, 50))),
+        posts['new']: ('lisbon', pytest.approx(RANKING_PRIOR_MEAN)),
+    }
+
+
+def test_many_good_reviews_outrank_one_perfect_one(client, posts):
+    assert top_ids(client) == [posts['loved'], posts['lucky'], posts['new']]
+    assert top_ids(client, limit=1) == [posts['loved']]
+
+
+def test_location_ignores_case_and_spaces(client, posts):
+    assert top_ids(client, location='LISBON') == [posts['lucky'], posts['new']]
+    assert top_ids(client, location='Faro') == []
+
+
+def test_rankings_follow_reviews_moves_and_deletes(client, db, posts):
+    client.put(f"/posts/review/{posts['new']}", json={'rating': 5})
+    assert rankings(db)[posts['new']][1] == pytest.approx(expected_score(5, 1))
+    client.put(f"/posts/review/{posts['new']}", json={'rating': 2})
+    assert rankings(db)[posts['new']][1] == pytest.approx(expected_score(2, 1))
+
+    db.execute("UPDATE posts SET location = 'Porto' WHERE id = ?", (posts['lucky'],))
+    db.commit()
+    assert top_ids(client, location='porto') == [posts['loved'], posts['lucky']]
+
+    assert client.delete(f"/posts/delete/{posts['loved']}").status_code == 200
+    assert posts['loved'] not in rankings(db)
+    assert top_ids(client, location='porto') == [posts['lucky']]
+
+
+def test_rebuild_rankings_repairs_the_table(db, posts):
+    expected = rankings(db)
+    db.execute('DELETE FROM post_rankings WHERE postId = ?', (posts['lucky'],))
+    db.execute('UPDATE post_rankings SET score = 0')
+    assert rebuild_rankings(db) == 3
+    db.commit()
+    assert rankings(db) == expected
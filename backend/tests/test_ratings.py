@@ -0,0 +1,68 @@
+import pytest
+
+from database.stats import find_mismatches
+
+
+def aggregates(db, post_id):
+    row = db.execute('SELECT rating_sum, rating_count, rating_avg FROM posts WHERE id = ?', (post_id,)).fetchone()
+    return tuple(row)
+
+
+@pytest.fixture
+def post_id(client, make_user, make_post):
+    return make_post(make_user('bob'), 'Rated')
+
+
+def review(client, post_id, rating, content=''):
+    response = client.put(f'/posts/review/{post_id}', json={'rating': rating, 'content': content})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_new_review_adds_to_the_aggregates(client, db, post_id):
+    body = review(client, post_id, 4)
+    assert body['message'] == "Review created successfully"
+    assert aggregates(db, post_id) == (4, 1, 4.0)
+    assert (body['reviews']['average'], body['reviews']['count']) == (4.0, 1)
+
+
+def test_updated_review_moves_the_sum_only(client, db, post_id, make_client):
+    review(make_client('carol'), post_id, 2)
+
+    review(client, post_id, 5)
+    body = review(client, post_id, 1)
+    assert body['message'] == "Review updated successfully"
+    assert aggregates(db, post_id) == (3, 2, 1.5)
+
+    review(client, post_id, 1)  # Same rating: nothing to change
+    assert aggregates(db, post_id) == (3, 2, 1.5)
+    assert find_mismatches(db) == []
+
+
+def test_review_of_missing_post_changes_nothing(client, db, post_id):
+    assert client.put('/posts/review/999', json={'rating': 3}).status_code == 404
+    assert aggregates(db, post_id) == (0, 0, 0)
+
+
+def test_deleting_a_post_deletes_its_reviews(client, db, make_post):
+    post_id = make_post(client.user_id, 'Mine')
+    review(client, post_id, 3)
+    assert client.delete(f'/posts/delete/{post_id}').status_code == 200
+    assert db.execute('SELECT COUNT(*) FROM reviews WHERE postId = ?', (post_id,)).fetchone()[0] == 0
+    assert find_mismatches(db) == []
+
+
+def test_rating_stats_command_reports_and_repairs_drift(app, client, db, post_id):
+    review(client, post_id, 4)
+    db.execute('UPDATE posts SET rating_sum = 40, rating_count = 7 WHERE id = ?', (post_id,))
+    db.commit()
+
+    runner = app.test_cli_runner()
+    with app.app_context():  # `flask` pushes one for every command
+        result = runner.invoke(args=['rating-stats'])
+        assert result.exit_code != 0
+        assert f"Post {post_id}: stored 40/7, actual 4/1" in result.output
+
+        assert runner.invoke(args=['rating-stats', '--repair']).exit_code == 0
+        assert aggregates(db, post_id) == (4, 1, 4.0)
+        assert runner.invoke(args=['rating-stats']).output.strip() == "Rating aggregates are consistent"
@@ -0,0 +1,75 @@
+import sqlite3
+import time
+
+import pytest
+
+from database.connection import get_db, get_read_db
+from database.replica import ReadReplica
+
+# Reads from a copy of the database, refreshed every 0.1 s by the replica thread, unless a
+# test sets another DB_READ_MODE
+
+
+@pytest.fixture
+def app_config():
+    return {'DB_READ_MODE': 'replica', 'DB_REPLICA_INTERVAL': 0.1}
+
+
+def feed_titles(client):
+    return [post['title'] for post in client.get('/posts/all').get_json().get('posts', [])]
+
+
+def wait_for(condition, timeout=3):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def test_reads_use_the_replica_once_it_exists(app):
+    replica = app.extensions['db_replica']
+    with app.test_request_context():
+        assert get_read_db() is get_db()  # No copy yet: the request reads the primary
+    assert replica.ready(timeout=3)
+
+    with app.test_request_context():
+        conn = get_read_db()
+        assert conn is not get_db()
+        with pytest.raises(sqlite3.OperationalError, match="readonly"):
+            conn.execute("INSERT INTO users (id, username, password) VALUES ('x', 'x', 'x')")
+
+
+def test_replica_follows_the_primary(app, client, make_post):
+    assert app.extensions['db_replica'].ready(timeout=3)
+    make_post(client.user_id, 'Fresh')
+    assert wait_for(lambda: feed_titles(client) == ['Fresh'])
+
+
+def test_failed_refresh_is_retried(app, client, make_post, monkeypatch, caplog):
+    assert app.extensions['db_replica'].ready(timeout=3)
+    failures = []
+    refresh = ReadReplica.refresh
+
+    def flaky_refresh(self):
+        if not failures:
+            failures.append(1)
+            raise sqlite3.OperationalError("disk I/O error")
+        return refresh(self)
+
+    monkeypatch.setattr(ReadReplica, 'refresh', flaky_refresh)
+    make_post(client.user_id, 'After the failure')
+
+    assert wait_for(lambda: feed_titles(client) == ['After the failure'])
+    assert failures == [1]
+    assert "Could not refresh the read replica" in caplog.text
+
+
+@pytest.mark.parametrize('app_config', [{'DB_READ_MODE': 'wal'}])
+def test_wal_mode_reads_from_a_read_only_pool(app):
+    with app.test_request_context():
+        conn = get_read_db()
+        assert conn is not get_db()
+        with pytest.raises(sqlite3.OperationalError, match="readonly"):
+            conn.execute("INSERT INTO users (id, username, password) VALUES ('x', 'x', 'x')")
@@ -0,0 +1,78 @@
+import threading
+
+from services.responseCache import MemoryBackend, ResponseCache
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2)
+    backend.set('a', b'1')
+    backend.set('b', b'2')
+    backend.get('a')
+    backend.set('c', b'3')
+    assert backend.get('b') is None
+    assert (backend.get('a'), backend.get('c')) == (b'1', b'3')
+    assert backend.evictions == 1
+
+
+def test_memory_backend_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('services.responseCache.time.monotonic', lambda: now[0])
+    backend = MemoryBackend()
+    backend.set('a', b'1', ttl=30)
+    now[0] += 29
+    assert backend.get('a') == b'1'
+    now[0] += 2
+    assert backend.get('a') is None
+
+
+def test_invalidating_a_tag_changes_the_key():
+    cache = ResponseCache(MemoryBackend())
+    key = cache.key('detail', ('feed', 'title:A'))
+    cache.set(key, b'{}')
+    assert cache.get(cache.key('detail', ('feed', 'title:A'))) == b'{}'
+
+    cache.invalidate('title:B')
+    assert cache.get(cache.key('detail', ('feed', 'title:A'))) == b'{}'
+    cache.invalidate('title:A')
+    assert cache.get(cache.key('detail', ('feed', 'title:A'))) is None
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 1
+
+
+def test_counters_are_exact_under_concurrency():
+    cache = ResponseCache(MemoryBackend())
+    cache.set(cache.key('hit', ()), b'{}')
+
+    def run():
+        for _ in range(5000):
+            cache.get(cache.key('hit', ()))
+            cache.get(cache.key('miss', ()))
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.stats()['hits'] == cache.stats()['misses'] == 40000
+
+
+def test_feed_is_served_from_the_cache(app, client, make_post):
+    make_post(client.user_id, 'First')
+    cache = app.extensions['response_cache']
+
+    first = client.get('/posts/all')
+    second = client.get('/posts/all')
+    assert first.get_data() == second.get_data()
+    assert (cache.stats()['misses'], cache.stats()['hits']) == (1, 1)
+
+
+def test_writes_invalidate_the_feed_and_the_post(client, make_post):
+    post_id = make_post(client.user_id, 'Reviewed')
+    assert client.get('/posts/Reviewed').get_json()['reviews']['count'] == 0
+    assert len(client.get('/posts/all').get_json()['posts']) == 1
+
+    client.put(f'/posts/review/{post_id}', json={'rating': 5})
+    client.post('/posts/create', json={'title': 'Second', 'description': 'd',
+                                       'photo': 'https://example.com/p.jpg', 'location': 'Porto'})
+
+    assert client.get('/posts/Reviewed').get_json()['reviews']['count'] == 1
+    assert [post['title'] for post in client.get('/posts/all').get_json()['posts']] == ['Second', 'Reviewed']
@@ -0,0 +1,74 @@
+import pytest
+
+from database.queries import build_match_query
+
+
+def search(client, q, **params):
+    response = client.get('/posts/search', query_string={'q': q, **params})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+@pytest.mark.parametrize('text, query', [
+    ('coffee', '"coffee"*'),
+    ('good coffee', '"good" "coffee"*'),
+    ('title: "x" OR NEAR(a b) -c', '"title" "x" "OR" "NEAR" "a" "b" "c"*'),
+    ('!!!', None),
+    ('', None),
+])
+def test_match_query_quotes_every_word(text, query):
+    assert build_match_query(text) == query
+
+
+def test_match_query_is_capped():
+    assert build_match_query(' '.join(f'w{i}' for i in range(40))).count('"') == 32
+
+
+def test_search_matches_prefixes_and_ranks_titles_first(client, make_post):
+    in_description = make_post(client.user_id, 'Bakery', description='They also sell coffee')
+    in_title = make_post(client.user_id, 'Coffee corner', description='Pastries')
+    make_post(client.user_id, 'Tea house', description='Only tea')
+
+    assert [post['id'] for post in search(client, 'coff')['posts']] == [in_title, in_description]
+
+
+def test_fts_syntax_in_the_query_is_harmless(client, make_post):
+    post_id = make_post(client.user_id, 'Coffee corner')
+    # Operators are searched for as words: only the queries made of the post's words match
+    for q, expected in (('coffee"', [post_id]), ('NEAR(coffee', []), ('(corner', [post_id]),
+                        ('coffee AND', []), ('title:coffee', [])):
+        assert [post['id'] for post in search(client, q)['posts']] == expected, q
+    for q in ('*', '"', '()'):
+        assert client.get('/posts/search', query_string={'q': q}).status_code == 400
+
+
+def test_snippet_is_escaped_and_highlighted(client, make_post):
+    make_post(client.user_id, 'Review', description='<script>alert(1)</script> best espresso in town')
+    snippet = search(client, 'espresso')['posts'][0]['snippet']
+    assert '<script>' not in snippet
+    assert '&lt;script&gt;' in snippet
+    assert '<mark>espresso</mark>' in snippet
+
+
+def test_search_pages_through_equal_scores(client, make_post):
+    ids = {make_post(client.user_id, f'Same {i}', description='identical words') for i in range(7)}
+    seen, cursor = [], None
+    while True:
+        body = search(client, 'identical', limit=3, **({'cursor': cursor} if cursor else {}))
+        seen += [post['id'] for post in body['posts']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(ids)
+    assert len(seen) == len(ids)
+
+
+def test_index_follows_updates_and_deletes(client, db, make_post):
+    post_id = make_post(client.user_id, 'Old name')
+    db.execute("UPDATE posts SET title = 'New name' WHERE id = ?", (post_id,))
+    db.commit()
+    assert search(client, 'old')['posts'] == []
+    assert [post['id'] for post in search(client, 'new')['posts']] == [post_id]
+
+    assert client.delete(f'/posts/delete/{post_id}').status_code == 200
+    assert search(client, 'new')['posts'] == []
@@ -0,0 +1,85 @@
+import sqlite3
+import threading
+
+import pytest
+
+from database.writer import write
+
+
+def add_user(conn, username):
+    conn.execute('INSERT INTO users (id, username, password) VALUES (?, ?, ?)', (f'user-{username}', username, 'unused'))
+    return username
+
+
+def add_user_then_fail(conn, username):
+    add_user(conn, username)
+    raise ValueError(f"{username} failed")
+
+
+def usernames(db):
+    return [row[0] for row in db.execute('SELECT username FROM users ORDER BY username')]
+
+
+@pytest.fixture
+def writer(app):
+    return app.extensions['db_writer']
+
+
+@pytest.fixture
+def held_writer(writer):
+    # Keeps the writer busy until released, so what is submitted meanwhile makes one batch
+    started, release = threading.Event(), threading.Event()
+
+    def hold(conn):
+        started.set()
+        release.wait(5)
+
+    first = writer.submit(hold)
+    assert started.wait(5)
+    yield release
+    release.set()
+    first.result(5)
+
+
+def test_failed_operation_is_rolled_back_alone(app, db, writer, held_writer, monkeypatch):
+    batches = []
+    next_batch = writer._next_batch
+    monkeypatch.setattr(writer, '_next_batch', lambda pending: batches.append(next_batch(pending)) or batches[-1])
+
+    futures = [writer.submit(add_user, 'ana'), writer.submit(add_user_then_fail, 'bea'), writer.submit(add_user, 'cid')]
+    held_writer.set()
+
+    assert futures[0].result(5) == 'ana'
+    with pytest.raises(ValueError, match="bea failed"):
+        futures[1].result(5)
+    assert futures[2].result(5) == 'cid'
+    assert [len(batch) for batch in batches] == [3]
+    assert usernames(db) == ['ana', 'cid']
+
+
+@pytest.mark.parametrize('app_config', [{'DB_WRITE_MAX_PENDING': 1}])
+def test_queue_is_bounded(app, db, writer, held_writer):
+    queued = writer.submit(add_user, 'ana')
+    with pytest.raises(sqlite3.OperationalError, match="full"):
+        writer.submit(add_user, 'bea')
+    held_writer.set()
+    assert queued.result(5) == 'ana'
+    assert usernames(db) == ['ana']
+
+
+def test_write_returns_the_result_and_raises_the_error(app, db):
+    with app.app_context():
+        assert write(add_user, 'ana') == 'ana'
+        with pytest.raises(ValueError):
+            write(add_user_then_fail, 'bea')
+    assert usernames(db) == ['ana']
+
+
+@pytest.mark.parametrize('app_config', [{'DB_WRITE_QUEUE': False}])
+def test_direct_writes_without_the_queue(app, db):
+    assert 'db_writer' not in app.extensions
+    with app.app_context():
+        assert write(add_user, 'ana') == 'ana'
+        with pytest.raises(ValueError):
+            write(add_user_then_fail, 'bea')
+    assert usernames(db) == ['ana']
@@ -0,0 +1,4 @@
+from serving import load_app
+
+# WSGI entry point for gunicorn (see gunicorn.conf.py) or any other WSGI server
+app = load_app()
@@ -25,21 +25,40 @@ type Post = {
     title: string;
     description: string;
     location: string;
+    photo: string;
+    thumbnail?: string;
     username: string;
     userId: string;
     reviews: ReviewData;
 };
 
+type FeedPage = {
+    posts: Post[];
+    next_cursor: string | null;
+};
+
+type FeedSort = 'newest' | 'top-rated' | 'most-reviewed';
+
 type ReviewInput = {
     rating: number | '';
     content: string;
 };
 
+// Backoff (ms) for reopening the live updates stream after the server refused it
+const RECONNECT_MIN_DELAY = 5000;
+const RECONNECT_MAX_DELAY = 5 * 60 * 1000;
+
+// Posts whose photo the backend cannot thumbnail carry no thumbnail; show the photo
+// itself when the browser can load it
+const isWebUrl = (url: string) => /^https?:\/\/[^/]/i.test(url || '');
+
 const HomeScreen: React.FC = () => {
     const [posts, setPosts] = useState<Post[]>([]);
     const [reviewMap, setReviewMap] = useState<{ [key: number]: ReviewInput }>({});
     const [userReviews, setUserReviews] = useState<{ [key: number]: boolean }>({});
     const [currentUserId, setCurrentUserId] = useState<string | null>(null);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [sort, setSort] = useState<FeedSort>('newest');
 
     const errorContext = useContext(ErrorContext);
 
@@ -49,7 +68,8 @@ const HomeScreen: React.FC = () => {
 
     const { setError } = errorContext;
 
-    const fetchData = async () => {
+    // Loads one feed page; without a cursor the list is replaced, otherwise the page is appended
+    const fetchData = async (cursor: string | null = null) => {
         try {
             const statusResponse = await axios.get('http://localhost:5000/user/status', {
                 withCredentials: true
@@ -59,16 +79,19 @@ const HomeScreen: React.FC = () => {
             const userId = isLoggedIn ? statusResponse.data.user_id : null;
             setCurrentUserId(userId);
 
-            const response = await axios.get<Post[]>('http://localhost:5000/posts/all', {
+            const response = await axios.get<FeedPage>('http://localhost:5000/posts/all', {
                 withCredentials: true,
+                params: { sort, limit: 20, ...(cursor ? { cursor } : {}) },
             });
-            setPosts(response.data);
+            const pagePosts = response.data.posts;
+            setPosts(prevPosts => cursor ? [...prevPosts, ...pagePosts] : pagePosts);
+            setNextCursor(response.data.next_cursor);
 
             if (isLoggedIn && userId) {
                 const reviewedPosts: { [key: number]: boolean } = {};
                 const initialReviewMap: { [key: number]: ReviewInput } = {};
 
-                response.data.forEach(post => {
+                pagePosts.forEach(post => {
                     const userReview = post.reviews?.ratings?.find(
                         review => review.userId === userId
                     );
@@ -82,8 +105,8 @@ const HomeScreen: React.FC = () => {
                     };
                 });
 
-                setUserReviews(reviewedPosts);
-                setReviewMap(initialReviewMap);
+                setUserReviews(prev => ({ ...prev, ...reviewedPosts }));
+                setReviewMap(prev => ({ ...prev, ...initialReviewMap }));
             }
         } catch (error) {
             setError(new Error('Failed to fetch posts'));
@@ -138,10 +161,78 @@ const HomeScreen: React.FC = () => {
 
     useEffect(() => {
         fetchData().catch((err: Error): void => console.error("Error:", err));
-    }, []);
+    }, [sort]);
+
+    // Live updates: patch the loaded posts from server-sent events instead of refetching the feed
+    useEffect(() => {
+        if (typeof EventSource === 'undefined') {
+            return;
+        }
+        let source: EventSource;
+        let retryTimer: ReturnType<typeof setTimeout> | undefined;
+        let retryDelay = RECONNECT_MIN_DELAY;
+        let reconnecting = false;
+        let stopped = false;
+
+        const connect = () => {
+            source = new EventSource('http://localhost:5000/posts/events', { withCredentials: true });
+
+            source.onopen = () => {
+                retryDelay = RECONNECT_MIN_DELAY;
+                // A new stream does not replay what was missed while disconnected
+                if (reconnecting) {
+                    reconnecting = false;
+                    fetchData().catch((err: Error): void => console.error("Error:", err));
+                }
+            };
+            // EventSource retries dropped streams itself, but gives up for good on an error
+            // response, e.g. 503 when the server has too many live connections: retry later
+            source.onerror = () => {
+                if (source.readyState !== EventSource.CLOSED || stopped) {
+                    return;
+                }
+                reconnecting = true;
+                retryTimer = setTimeout(connect, retryDelay * (0.5 + Math.random()));
+                retryDelay = Math.min(retryDelay * 2, RECONNECT_MAX_DELAY);
+            };
+
+            source.addEventListener('post-created', (event) => {
+                const post: Post = JSON.parse((event as MessageEvent).data);
+                // Only the newest-first feed has an obvious place for a new post
+                if (sort === 'newest') {
+                    setPosts(prevPosts => prevPosts.some(p => p.id === post.id) ? prevPosts : [post, ...prevPosts]);
+                }
+            });
+            source.addEventListener('post-deleted', (event) => {
+                const { id } = JSON.parse((event as MessageEvent).data);
+                setPosts(prevPosts => prevPosts.filter(post => post.id !== id));
+            });
+            source.addEventListener('post-rating', (event) => {
+                const { id, average, count } = JSON.parse((event as MessageEvent).data);
+                setPosts(prevPosts =>
+                    prevPosts.map(post =>
+                        post.id === id
+                            ? { ...post, reviews: { ...post.reviews, average, count } }
+                            : post
+                    )
+                );
+            });
+            // Sent when events were missed (slow connection, long disconnect): start over
+            source.addEventListener('resync', () => {
+                fetchData().catch((err: Error): void => console.error("Error:", err));
+            });
+        };
+
+        connect();
+        return () => {
+            stopped = true;
+            clearTimeout(retryTimer);
+            source.close();
+        };
+    }, [sort]);
 
     const calculateAverageRating = (reviews: ReviewData | undefined) => {
-        if (!reviews || !reviews.ratings || reviews.ratings.length === 0) {
+        if (!reviews || !reviews.count) {
             return "No ratings yet";
         }
         return `${reviews.average.toFixed(1)} (${reviews.count} ${reviews.count === 1 ? 'review' : 'reviews'})`;
@@ -178,6 +269,18 @@ const HomeScreen: React.FC = () => {
 
     return (
         <div className="home-screen">
+            <div className="form-group">
+                <label className="form-label">Sort by:</label>
+                <select
+                    className="form-input"
+                    value={sort}
+                    onChange={(e) => setSort(e.target.value as FeedSort)}
+                >
+                    <option value="newest">Newest</option>
+                    <option value="top-rated">Top rated</option>
+                    <option value="most-reviewed">Most reviewed</option>
+                </select>
+            </div>
             {posts.length > 0 ? (
                 posts.map((post) => (
                     <div key={post.id} className="post-card">
@@ -185,6 +288,14 @@ const HomeScreen: React.FC = () => {
                         <p className="post-meta">By: <span className="post-author">{post.username}</span></p>
                         <p className="post-description">Description: {post.description}</p>
                         <p className="post-location">Location: {post.location}</p>
+                        {(post.thumbnail || isWebUrl(post.photo)) && (
+                            <img
+                                className="post-photo"
+                                src={post.thumbnail ? `http://localhost:5000${post.thumbnail}` : post.photo}
+                                alt={post.title}
+                                loading="lazy"
+                            />
+                        )}
 
                         <div className="reviews-section">
                             <h3 className="reviews-heading">Ratings: {calculateAverageRating(post.reviews)}</h3>
@@ -255,6 +366,11 @@ const HomeScreen: React.FC = () => {
             ) : (
                 <p className="loading-message">Loading posts...</p>
             )}
+            {nextCursor && (
+                <button className="submit-button" onClick={() => fetchData(nextCursor)}>
+                    Load more
+                </button>
+            )}
         </div>
     );
 };